@@ -3,14 +3,38 @@ ASGI config for Bloom project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests served through it use Bloom/asgi_urls.py, which routes the AJAX
+interaction endpoints (likes, joins, follows, club search / create) to the
+async views in app/async_views.py.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Bloom.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'Bloom.asgi_urls'
+
+
+class BloomASGIHandler(ASGIHandler):
+    """ASGIHandler that serves requests with the async-aware URLconf"""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+
+def get_bloom_asgi_application():
+    # Same as django.core.asgi.get_asgi_application, with our handler
+    django.setup(set_prefix=False)
+    return BloomASGIHandler()
+
+
+application = get_bloom_asgi_application()
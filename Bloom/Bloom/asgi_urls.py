@@ -0,0 +1,12 @@
+"""
+URL configuration used when running under ASGI (see asgi.py).
+
+The AJAX interaction endpoints resolve to their async versions first,
+everything else falls through to the regular URLconf.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('', include('app.async_urls')),
+    path('', include('Bloom.urls')),
+]
@@ -0,0 +1,57 @@
+"""
+SQLite connection profiles (picked with the BLOOM_DB_PROFILE environment variable).
+
+'production' is what the site should run with under concurrent traffic:
+- WAL journal: readers never block the writer and the writer doesn't block readers
+- synchronous=NORMAL: safe with WAL (a power cut can lose the last commits, never corrupt)
+- a busy timeout, so a writer waits for the lock instead of failing with "database is locked"
+- BEGIN IMMEDIATE for every transaction.atomic(): the write lock is taken up front, so two
+  read-then-write transactions can't deadlock on the lock upgrade (SQLite fails one of them
+  straight away, without waiting for the busy timeout)
+- bigger page cache, memory mapped reads and in-memory temp tables
+- persistent connections (the pragmas run once per connection, not per request)
+
+'default' is Django's stock SQLite setup, kept for comparisons (see `manage.py bench_sqlite_writes`).
+"""
+
+PROFILES = ('default', 'production')
+
+# Seconds a connection waits on a locked database before giving up
+BUSY_TIMEOUT = 20
+
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # negative = KiB, so ~20MB per connection
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# Set by whoever writes the file; a read replica's connections leave them alone
+WRITER_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def sqlite_database(name, profile='production', replica=False):
+    """settings.DATABASES entry for the SQLite file `name` with the given profile (`replica`: read-only use)"""
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown database profile {profile!r}, pick one of {", ".join(PROFILES)}')
+
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+    }
+    if profile == 'production':
+        pragmas = {key: value for key, value in PRODUCTION_PRAGMAS.items()
+                   if not (replica and key in WRITER_PRAGMAS)}
+        database.update({
+            'OPTIONS': {
+                'timeout': BUSY_TIMEOUT,
+                'init_command': ';'.join(f'PRAGMA {key}={value}' for key, value in pragmas.items()),
+            },
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        })
+        if not replica:
+            database['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    return database
@@ -1,5 +1,8 @@
+import os
 from pathlib import Path
 
+from Bloom.database import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,6 +40,8 @@ NPM_BIN_PATH = "C:/Program Files/nodejs/npm.cmd"
 
 
 MIDDLEWARE = [
+    'app.perf.PerformanceMiddleware',  # first, so its timing covers everything below
+    'app.db_routing.ReadReplicaMiddleware',  # before sessions, so the session read can use the replica
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,7 +55,7 @@ ROOT_URLCONF = 'Bloom.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'app.perf.TimedDjangoTemplates',  # DjangoTemplates plus render timing (app/perf.py)
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,13 +75,45 @@ WSGI_APPLICATION = 'Bloom.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL, busy timeout, BEGIN IMMEDIATE, persistent connections... (see Bloom/database.py).
+# BLOOM_DB_PROFILE=default switches back to Django's stock SQLite settings.
+
 DATABASES = {
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3', os.environ.get('BLOOM_DB_PROFILE', 'production')),
+}
+
+# Read replica (app/db_routing.py): BLOOM_READ_REPLICA=1 sends the reads of GET requests to a
+# second SQLite file, kept up to date by `manage.py replicate_db`. Clients that just wrote
+# something read from the primary for REPLICA_PIN_SECONDS (keep it above the replication lag).
+if os.environ.get('BLOOM_READ_REPLICA'):
+    DATABASES['replica'] = sqlite_database(
+        BASE_DIR / 'db.replica.sqlite3', os.environ.get('BLOOM_DB_PROFILE', 'production'), replica=True,
+    )
+    # No separate test replica; the router sends reads to the test primary
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['app.db_routing.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# Used for the club directory / membership caches (app/club_directory.py).
+# LocMemCache is per-process; with several worker processes use a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache) so invalidations reach every worker.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bloom',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Whole-response cache for club pages, club search and about us (app/http_cache.py)
+PAGE_CACHE_ENABLED = os.environ.get('BLOOM_PAGE_CACHE', '1') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +154,18 @@ STATICFILES_DIRS = [BASE_DIR / "static",]
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# In production collectstatic writes content-hashed copies plus .gz variants, and Bloom/urls.py
+# serves them as immutable (app/assets.py). In development files are served as they are.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'app.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Media files (user uploads like profile pictures)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -135,4 +184,57 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login' 
 
 # LOGIN_REDIRECT_URL: Where to send a user after a successful login.
-LOGIN_REDIRECT_URL = 'home'
\ No newline at end of file
+LOGIN_REDIRECT_URL = 'home'
+
+# ----------------------------------------------------------------------
+# PERFORMANCE INSTRUMENTATION (app/perf.py)
+# ----------------------------------------------------------------------
+
+# Server-Timing header (query count, db / template time): 'staff' sends it to staff users only
+# (to everyone when DEBUG is on), True to every visitor, False never
+PERF_SERVER_TIMING = 'staff'
+
+# Max SQL queries per request, by URL name: the most a request really runs, on_commit work included
+# (app.tests.RealQueryBudgetTests runs every one of these views outside a test transaction, cold).
+# A change that adds queries to one of these views raises its budget too. What happens when a view goes over:
+# 'warn' / 'error' log at that level, 'raise' throws QueryBudgetExceeded (handy in tests / CI)
+PERF_QUERY_BUDGETS = {
+    'home': 9,
+    'club_page': 8,
+    'load_more_posts': 4,
+    'search_posts': 8,
+    'search_clubs': 1,
+    'like_post': 8,
+    'batch_interactions': 23,
+}
+PERF_BUDGET_ACTION = 'warn'
+
+# One logfmt line per request on the 'app.perf' logger (view, status, queries, db / template / total ms)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'perf': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'perf_console': {'class': 'logging.StreamHandler', 'formatter': 'perf'},
+    },
+    'loggers': {
+        'app.perf': {
+            'handlers': ['perf_console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# ----------------------------------------------------------------------
+# WRITE-BEHIND LIKES (app/like_buffer.py)
+# ----------------------------------------------------------------------
+
+# Log like clicks to LIKE_LOG_DIR and write them to the database in bulk every
+# LIKE_FLUSH_INTERVAL seconds instead of one transaction per click
+LIKE_WRITE_BEHIND = os.environ.get('BLOOM_LIKE_WRITE_BEHIND', '') == '1'
+LIKE_LOG_DIR = BASE_DIR / 'var' / 'likes'
+LIKE_FLUSH_INTERVAL = 1.0
+LIKE_LOG_FSYNC = True
@@ -1,13 +1,25 @@
 from django.contrib import admin
+from django.db.models import Q
 from .models import Post, Comment, Like, Club, Profile
+from .post_search import fts_available, matching_ids
 
 # Register your models here.
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['user', 'content', 'date_posted', 'get_like_count', 'get_comment_count']
+    list_display = ['user', 'content', 'date_posted', 'like_count', 'comment_count']
     list_filter = ['date_posted']
     search_fields = ['content', 'user__username']
-    readonly_fields = ['date_posted', 'slug']
+    readonly_fields = ['date_posted', 'slug', 'like_count', 'comment_count']
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search title/content through the FTS5 index instead of LIKE scans (plus part of the username)"""
+        if not search_term or not fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        post_ids = matching_ids(search_term)
+        matches = Q(user__username__icontains=search_term.strip())
+        if post_ids is not None:
+            matches |= Q(pk__in=post_ids)
+        return queryset.filter(matches), False
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -0,0 +1,99 @@
+"""
+Static files in production: content-hashed names, gzip variants, cached by browsers for good.
+
+- CompressedManifestStaticFilesStorage (settings.STORAGES when DEBUG is off): collectstatic
+  copies every file under a name with its content hash (js/bloom.3f2a9c.js), records the
+  mapping in staticfiles.json for {% static %}, and writes a .gz next to each hashed text file
+- serve() (Bloom/urls.py when DEBUG is off) answers /static/ from STATIC_ROOT, with the .gz
+  when the client takes gzip. A hashed name never changes content, so those are sent as
+  immutable for a year; anything else must be revalidated.
+
+Run `python manage.py collectstatic` on every deploy.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Worth compressing (images other than SVG, fonts etc. already are)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# Keep the .gz only if it saves at least this much
+MIN_SAVING = 0.05
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes <hashed name>.gz for text files"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed[name] = hashed_name
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name, hashed_name in hashed.items():
+            if hashed_name.endswith(COMPRESSIBLE):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        """Write name.gz (mtime 0, so rebuilding the same file gives the same bytes). Returns whether it was kept"""
+        with self.open(name) as f:
+            content = f.read()
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) > len(content) * (1 - MIN_SAVING):
+            return False
+        with open(self.path(name + '.gz'), 'wb') as f:
+            f.write(compressed)
+        return True
+
+
+def _is_hashed(path):
+    """Whether `path` is a hashed name from the manifest (the reverse lookup is built once per manifest)"""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+    if not hashed_files:
+        return False
+    if getattr(_is_hashed, 'manifest', None) is not hashed_files:
+        _is_hashed.manifest, _is_hashed.names = hashed_files, frozenset(hashed_files.values())
+    return path in _is_hashed.names
+
+
+def serve(request, path):
+    """A file from STATIC_ROOT, gzipped if there's a .gz and the client takes it"""
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if os.path.isdir(fullpath) or not os.path.exists(fullpath):
+        raise Http404
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    gzipped = fullpath + '.gz'
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '') and os.path.exists(gzipped):
+        response = FileResponse(open(gzipped, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    if _is_hashed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,13 @@
+from django.urls import path
+from . import async_views
+
+# Same paths and names as app/urls.py; Bloom/asgi_urls.py puts these in front of the sync ones.
+# live/ only exists here: streaming needs the async server.
+urlpatterns = [
+    path('search-clubs/', async_views.search_clubs, name='search_clubs'),
+    path('create-club/', async_views.create_club, name='create_club'),
+    path('like-post/<slug:slug>/', async_views.like_post, name='like_post'),
+    path('join_club/', async_views.join_club, name='join_club'),
+    path('follow-club/<int:club_id>/', async_views.follow_club, name='follow_club'),
+    path('live/', async_views.live_events, name='live_events'),
+]
@@ -0,0 +1,192 @@
+"""
+Async versions of the chatty AJAX endpoints, served when running under ASGI (see Bloom/asgi.py).
+
+They return exactly the same JSON as their sync twins in views.py, but use the async ORM
+so a request waiting on the database doesn't hold a worker thread.
+
+live_events (the server-sent events stream) only exists here.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+
+from . import club_search, feed_versions, like_buffer, live
+from .club_directory import VERSION_KEY, directory_version, get_user_club_ids
+from .http_cache import cached_view
+from .models import Post, Club, Profile, Like
+
+# Send an SSE comment this often so proxies don't drop idle streams
+LIVE_HEARTBEAT = 20
+
+
+@login_required
+async def like_post(request, slug):
+    """AJAX endpoint to like or unlike a post"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    post = await aget_object_or_404(Post, slug=slug)
+    user = await request.auser()
+
+    if like_buffer.enabled():
+        # Write-behind (see like_buffer.py); the lookup and the log append are blocking
+        buffer = await sync_to_async(like_buffer.get_buffer)()
+        liked, like_count = await sync_to_async(buffer.toggle)(post.id, user.id, post.like_count)
+        # Cached pages / feed ETags move now rather than when the buffer flushes
+        await sync_to_async(feed_versions.touch)([post.club_id])
+        return JsonResponse({'liked': liked, 'like_count': like_count})
+
+    # Try the unlike first: one DELETE tells us whether the like existed
+    deleted, _ = await Like.objects.filter(post=post, user=user).adelete()
+    if deleted:
+        liked = False
+    else:
+        try:
+            await Like.objects.acreate(post=post, user=user)
+        except IntegrityError:
+            # A concurrent click already created it
+            pass
+        liked = True
+
+    # The counter was bumped by the Like signals, just re-read the column
+    like_count = await Post.objects.filter(pk=post.pk).values_list('like_count', flat=True).aget()
+    return JsonResponse({
+        'liked': liked,
+        'like_count': like_count
+    })
+
+
+@login_required
+async def join_club(request):
+    """AJAX endpoint to join or leave a club"""
+    if request.method == 'POST':
+        club_id = request.POST.get('club_id')
+
+        try:
+            club = await Club.objects.aget(id=club_id)
+        except Club.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Club not found'})
+
+        user = await request.auser()
+        profile, _ = await Profile.objects.aget_or_create(user=user)
+
+        if await profile.clubs.filter(pk=club.pk).aexists():
+            # Leave the club
+            await profile.clubs.aremove(club)
+            return JsonResponse({'success': True, 'action': 'left', 'message': f'Left club {club.name}'})
+        # Join the club
+        await profile.clubs.aadd(club)
+        return JsonResponse({'success': True, 'action': 'joined', 'message': f'Joined club {club.name}'})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@login_required
+async def follow_club(request, club_id):
+    """AJAX endpoint to follow or unfollow a club"""
+    if request.method == 'POST':
+        club = await aget_object_or_404(Club, id=club_id)
+        user = await request.auser()
+        profile_obj, _ = await Profile.objects.aget_or_create(user=user)
+
+        if await profile_obj.clubs.filter(pk=club.pk).aexists():
+            # Unfollow
+            await profile_obj.clubs.aremove(club)
+            is_following = False
+        else:
+            # Follow
+            await profile_obj.clubs.aadd(club)
+            is_following = True
+
+        return JsonResponse({
+            'success': True,
+            'is_following': is_following
+        })
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@cached_view(60 * 5, versions=lambda request: [directory_version()], no_cache=True)
+async def search_clubs(request):
+    """AJAX endpoint for searching clubs"""
+    query = request.GET.get('q', '').strip().lower()
+
+    # Fast path: the in-memory index is current, so searching is pure CPU (no thread hop)
+    if club_search.index.version is not None and club_search.index.version == await cache.aget(VERSION_KEY):
+        club_list = club_search.index.search(query, limit=10)
+    else:
+        club_list = await sync_to_async(club_search.search)(query, limit=10)
+    return JsonResponse({'clubs': club_list})
+
+
+@login_required
+async def create_club(request):
+    """AJAX endpoint to create a new club"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            club_name = data.get('name', '').strip()
+
+            if not club_name:
+                return JsonResponse({'success': False, 'error': 'Club name is required'})
+
+            # Check if club already exists (case-insensitive)
+            if await Club.objects.filter(name__iexact=club_name).aexists():
+                return JsonResponse({'success': False, 'error': 'Name already taken'})
+
+            club = await Club.objects.acreate(name=club_name)
+            return JsonResponse({
+                'success': True,
+                'club': {
+                    'id': club.id,
+                    'name': club.name
+                }
+            })
+        except IntegrityError:
+            # Catch database-level uniqueness constraint violation
+            return JsonResponse({'success': False, 'error': 'Name already taken'})
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid request data'})
+        except Exception:
+            return JsonResponse({'success': False, 'error': 'An error occurred while creating the club'})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@login_required
+async def live_events(request):
+    """
+    Server-sent events for the clubs the user follows (or just ?club=<id>).
+    Pushes `post` events for new posts and `counts` events when likes / comments change.
+    """
+    user = await request.auser()
+    club_ids = await sync_to_async(get_user_club_ids)(user.id)
+    club_id = request.GET.get('club')
+    if club_id:
+        club_ids = [int(club_id)] if club_id.isdigit() else []
+    channels = [live.club_channel(club_id) for club_id in club_ids]
+
+    async def stream():
+        subscription = live.get_broker().subscribe(channels)
+        try:
+            # Reconnect after 5s if the connection drops
+            yield 'retry: 5000\n\n'
+            while True:
+                item = await subscription.get(timeout=LIVE_HEARTBEAT)
+                if item is None:
+                    yield ': ping\n\n'
+                    continue
+                _, event = item
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
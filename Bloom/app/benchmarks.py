@@ -0,0 +1,228 @@
+"""
+Helpers for the in-process HTTP benchmarks (the bench_* management commands).
+
+Requests go through Django's real WSGIHandler / ASGI application, with the full
+middleware stack, so the numbers compare the two code paths without the noise of
+a particular server (gunicorn, uvicorn, ...) in front of them.
+"""
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.crypto import get_random_string
+
+from Bloom.database import sqlite_database
+from . import like_buffer
+
+HOST = 'localhost'
+
+
+@contextmanager
+def benchmark_database(profile=None):
+    """
+    Run against a throwaway, fully migrated SQLite file (never the real database).
+    A file rather than :memory: so every worker thread sees the same data.
+    `profile` swaps in one of the Bloom/database.py connection profiles for the run.
+    """
+    # Every thread's connection is built from this very dict, so changing it in place reaches them all
+    database = settings.DATABASES['default']
+    saved = dict(database)
+    if profile is not None:
+        for key in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS'):
+            database.pop(key, None)
+        database.update(sqlite_database(database['NAME'], profile))
+        database.setdefault('OPTIONS', {})
+        database.setdefault('CONN_MAX_AGE', 0)
+        database.setdefault('CONN_HEALTH_CHECKS', False)
+        connection.close()
+
+    directory = tempfile.mkdtemp(prefix='bloom-bench-')
+    database.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        # Buffered likes of the throwaway database must never be replayed into the real one
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=[HOST, 'testserver'],
+                               LIKE_LOG_DIR=os.path.join(directory, 'likes')):
+            try:
+                yield
+            finally:
+                like_buffer.shutdown()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory)  # with the WAL / shared memory files
+        database.clear()
+        database.update(saved)
+
+
+class Session:
+    """Cookies and CSRF header for one logged-in user"""
+
+    def __init__(self, user):
+        client = Client()
+        client.force_login(user)
+        self.csrf_token = get_random_string(32)
+        session_cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={session_cookie}; {settings.CSRF_COOKIE_NAME}={self.csrf_token}'
+
+
+class Call:
+    """One request to make: method, path, optional query/form/JSON body, extra headers and the session to send it as"""
+
+    def __init__(self, method, path, session=None, query=None, data=None, json_body=None, extra_headers=None):
+        self.method = method
+        self.path = path
+        self.session = session
+        self.extra_headers = extra_headers or {}
+        self.query_string = urlencode(query or {})
+        if json_body is not None:
+            self.body = json.dumps(json_body).encode()
+            self.content_type = 'application/json'
+        elif data is not None:
+            self.body = urlencode(data).encode()
+            self.content_type = 'application/x-www-form-urlencoded'
+        else:
+            self.body = b''
+            self.content_type = ''
+
+    def headers(self):
+        headers = {'host': HOST, **self.extra_headers}
+        if self.session:
+            headers['cookie'] = self.session.cookie
+            headers['x-csrftoken'] = self.session.csrf_token
+        if self.body:
+            headers['content-type'] = self.content_type
+            headers['content-length'] = str(len(self.body))
+        return headers
+
+
+def _wsgi_environ(call):
+    environ = {
+        'REQUEST_METHOD': call.method,
+        'PATH_INFO': call.path,
+        'QUERY_STRING': call.query_string,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(call.body),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in call.headers().items():
+        key = name.upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        environ[key] = value
+    return environ
+
+
+def run_wsgi(calls, concurrency, handler=None):
+    """Send `calls` through a WSGIHandler from `concurrency` threads. Returns (latencies, statuses, wall time)"""
+    handler = handler or WSGIHandler()
+
+    def one(call):
+        status = []
+        start = time.perf_counter()
+        response = handler(_wsgi_environ(call), lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+        for _ in response:
+            pass
+        response.close()
+        return time.perf_counter() - start, status[0]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, calls))
+    wall = time.perf_counter() - start
+    return [r[0] for r in results], [r[1] for r in results], wall
+
+
+def asgi_scope(call):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': call.method,
+        'scheme': 'http',
+        'path': call.path,
+        'raw_path': call.path.encode(),
+        'query_string': call.query_string.encode(),
+        'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in call.headers().items()],
+        'client': ('127.0.0.1', 50000),
+        'server': (HOST, 80),
+    }
+
+
+async def _asgi_one(application, call):
+    body_sent = False
+    status = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': call.body, 'more_body': False}
+        # The client never disconnects
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    start = time.perf_counter()
+    await application(asgi_scope(call), receive, send)
+    return time.perf_counter() - start, status[0]
+
+
+def run_asgi(calls, concurrency, application):
+    """Send `calls` through an ASGI application with at most `concurrency` in flight. Returns (latencies, statuses, wall time)"""
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def bounded(call):
+            async with limit:
+                return await _asgi_one(application, call)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded(call) for call in calls))
+        return results, time.perf_counter() - start
+
+    results, wall = asyncio.run(main())
+    return [r[0] for r in results], [r[1] for r in results], wall
+
+
+def summarize(latencies, statuses, wall):
+    """requests/second, latency percentiles (ms) and error count for one run"""
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(0.50), 2),
+        'p95_ms': round(percentile(0.95), 2),
+        'p99_ms': round(percentile(0.99), 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'errors': sum(1 for status in statuses if status >= 400),
+    }
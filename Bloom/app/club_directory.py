@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Club, Profile
+
+# The directory key embeds a version number, so bumping the version is all it
+# takes to invalidate it (the old entry just expires on its own)
+VERSION_KEY = 'clubs:directory:version'
+DIRECTORY_TIMEOUT = 60 * 60
+MEMBERSHIP_TIMEOUT = 60 * 10
+
+
+def _start_version():
+    # If the version key gets evicted, start from a fresh number so we can never
+    # land back on a version that still has an old directory cached under it
+    cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def directory_version():
+    """Current version of the club directory (changes every time clubs change)"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        _start_version()
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_directory_version():
+    """Invalidate the cached club directory (call whenever a club is created, changed or deleted). Returns the new version"""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (first run or evicted)
+        _start_version()
+        return None
+
+
+def get_directory():
+    """Every club as {'id', 'name'}, ordered by name"""
+    key = f'clubs:directory:{directory_version()}'
+    directory = cache.get(key)
+    if directory is None:
+        # Cache fills read the primary: a lagging replica must never end up cached for everyone
+        directory = list(Club.objects.using(DEFAULT_DB_ALIAS).order_by('name').values('id', 'name'))
+        cache.set(key, directory, DIRECTORY_TIMEOUT)
+    return directory
+
+
+def _membership_key(user_id):
+    return f'clubs:members:{user_id}'
+
+
+def get_user_club_ids(user_id):
+    """Set of ids of the clubs a user has joined"""
+    key = _membership_key(user_id)
+    club_ids = cache.get(key)
+    if club_ids is None:
+        # Read straight from the m2m table, no need to load (or create) the profile
+        club_ids = frozenset(
+            Profile.clubs.through.objects.using(DEFAULT_DB_ALIAS)
+            .filter(profile__user_id=user_id).values_list('club_id', flat=True)
+        )
+        cache.set(key, club_ids, MEMBERSHIP_TIMEOUT)
+    return club_ids
+
+
+def invalidate_user_club_ids(user_ids):
+    """Forget the cached memberships of `user_ids` (call when Profile.clubs changes)"""
+    cache.delete_many([_membership_key(user_id) for user_id in user_ids])
@@ -0,0 +1,236 @@
+import bisect
+import re
+import threading
+from collections import Counter
+
+from .club_directory import directory_version, get_directory
+
+# Trigrams shared by more clubs than this (e.g. "clu", "lub") are too common to be
+# worth scanning for candidates; they still count when scoring a candidate
+MAX_POSTING_SIZE = 500
+
+# Minimum trigram similarity for a fuzzy (typo) match
+MIN_SIMILARITY = 0.3
+
+# Only the clubs sharing the most trigrams with the query get a full similarity score
+MAX_FUZZY_CANDIDATES = 50
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall(text.lower()))
+
+
+def trigrams(text):
+    """pg_trgm style trigrams: each word padded with two spaces in front and one behind"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _discard_sorted(entries, entry):
+    """Remove `entry` from a sorted list if it's there"""
+    i = bisect.bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+def _prefix_scan(entries, prefix):
+    """Yield the (key, id) entries of a sorted list whose key starts with `prefix`"""
+    for i in range(bisect.bisect_left(entries, (prefix,)), len(entries)):
+        if not entries[i][0].startswith(prefix):
+            break
+        yield entries[i]
+
+
+def _similarity(a, b):
+    """Jaccard similarity of two trigram sets"""
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class ClubSearchIndex:
+    """
+    Per-process search index over Club.name.
+
+    - prefix matches on the whole name and on every word (bisect over sorted lists)
+    - trigram similarity for substring matches and typos ("chses" -> "Chess Club")
+    - ranked: exact > name prefix > word prefix > substring > fuzzy
+
+    It's built from the cached club directory and kept current by the Club signals.
+    If another process changes clubs, the directory version moves and we rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self._clear()
+
+    def _clear(self):
+        self.names = {}        # id -> display name
+        self.normalized = {}   # id -> normalized name
+        self.grams = {}        # id -> trigram set of the whole name
+        self.word_grams = {}   # id -> trigram set of each word
+        self.by_name = []      # sorted [(normalized name, id)]
+        self.by_word = []      # sorted [(word, id)] for every word of every name
+        self.postings = {}     # trigram -> set of ids
+
+    # --- BUILDING ---
+
+    def _index(self, club_id, name):
+        """Fill the per-club maps and postings, returns the sorted-list entries to add"""
+        normalized = normalize(name)
+        words = set(normalized.split())
+        self.names[club_id] = name
+        self.normalized[club_id] = normalized
+        self.grams[club_id] = trigrams(name)
+        self.word_grams[club_id] = [trigrams(word) for word in words]
+        for gram in self.grams[club_id]:
+            self.postings.setdefault(gram, set()).add(club_id)
+        return (normalized, club_id), [(word, club_id) for word in words]
+
+    def _add(self, club_id, name):
+        name_entry, word_entries = self._index(club_id, name)
+        bisect.insort(self.by_name, name_entry)
+        for entry in word_entries:
+            bisect.insort(self.by_word, entry)
+
+    def _remove(self, club_id):
+        if club_id not in self.names:
+            return
+        normalized = self.normalized.pop(club_id)
+        del self.names[club_id]
+        del self.word_grams[club_id]
+        _discard_sorted(self.by_name, (normalized, club_id))
+        for word in set(normalized.split()):
+            _discard_sorted(self.by_word, (word, club_id))
+        for gram in self.grams.pop(club_id):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(club_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def rebuild(self, clubs, version=None):
+        """Replace the whole index with `clubs` (iterable of {'id', 'name'})"""
+        with self._lock:
+            self._clear()
+            # Build the sorted lists in one go instead of insort-ing every row
+            for club in clubs:
+                name_entry, word_entries = self._index(club['id'], club['name'])
+                self.by_name.append(name_entry)
+                self.by_word.extend(word_entries)
+            self.by_name.sort()
+            self.by_word.sort()
+            self.version = version
+
+    def sync(self, clubs, version=None):
+        """
+        Bring the index in line with `clubs` by applying only the differences.
+        Much cheaper than rebuild() when another process added or renamed a few clubs.
+        """
+        with self._lock:
+            if not self.names:
+                return self.rebuild(clubs, version)
+            current = {club['id']: club['name'] for club in clubs}
+            for club_id in self.names.keys() - current.keys():
+                self._remove(club_id)
+            for club_id, name in current.items():
+                if self.names.get(club_id) != name:
+                    self._remove(club_id)
+                    self._add(club_id, name)
+            self.version = version
+
+    def upsert(self, club_id, name, old_version=None, new_version=None):
+        """Add or rename one club (called from the Club post_save signal)"""
+        with self._lock:
+            self._remove(club_id)
+            self._add(club_id, name)
+            self._follow_version(old_version, new_version)
+
+    def remove(self, club_id, old_version=None, new_version=None):
+        """Drop one club (called from the Club post_delete signal)"""
+        with self._lock:
+            self._remove(club_id)
+            self._follow_version(old_version, new_version)
+
+    def _follow_version(self, old_version, new_version):
+        # Only skip the rebuild if our own change is the only thing that happened
+        if self.version is not None and self.version == old_version:
+            self.version = new_version
+
+    # --- SEARCHING ---
+
+    def _fuzzy(self, query, exclude, limit):
+        """Substring / typo matches as {id: score}, all scoring below any prefix match"""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return {}
+
+        # Count shared trigrams straight off the postings (skipping the very common ones)
+        shared = Counter()
+        for gram in query_grams:
+            ids = self.postings.get(gram)
+            if ids and len(ids) <= MAX_POSTING_SIZE:
+                shared.update(ids)
+        min_shared = max(1, int(len(query_grams) * MIN_SIMILARITY))
+
+        single_word = ' ' not in query
+        scores = {}
+        for club_id, _ in shared.most_common(MAX_FUZZY_CANDIDATES):
+            if club_id in exclude or shared[club_id] < min_shared:
+                continue
+            similarity = _similarity(query_grams, self.grams[club_id])
+            if single_word:
+                # Also compare against each word on its own, so "musc" still finds "Music Club"
+                similarity = max(similarity, *(_similarity(query_grams, grams) for grams in self.word_grams[club_id]))
+            if query in self.normalized[club_id]:
+                scores[club_id] = 1.0 + similarity
+            elif similarity >= MIN_SIMILARITY:
+                scores[club_id] = similarity
+        return scores
+
+    def search(self, query, limit=10):
+        """Ranked list of {'id', 'name'} for `query`"""
+        query = normalize(query)
+        with self._lock:
+            if not query:
+                return [self._result(club_id) for _, club_id in self.by_name[:limit]]
+
+            # Whole-name prefix matches come out of by_name already in name order (exact match first)
+            ranked = []
+            for _, club_id in _prefix_scan(self.by_name, query):
+                ranked.append(club_id)
+                if len(ranked) == limit:
+                    return [self._result(club_id) for club_id in ranked]
+
+            # Then clubs where a later word starts with the query
+            seen = set(ranked)
+            for _, club_id in _prefix_scan(self.by_word, query):
+                if club_id not in seen:
+                    seen.add(club_id)
+                    ranked.append(club_id)
+                    if len(ranked) == limit:
+                        return [self._result(club_id) for club_id in ranked]
+
+            # Only fall back to trigrams when prefixes didn't fill the page
+            scores = self._fuzzy(query, seen, limit)
+            ranked.extend(sorted(scores, key=lambda club_id: (-scores[club_id], self.normalized[club_id])))
+            return [self._result(club_id) for club_id in ranked[:limit]]
+
+    def _result(self, club_id):
+        return {'id': club_id, 'name': self.names[club_id]}
+
+
+index = ClubSearchIndex()
+
+
+def search(query, limit=10):
+    """Search clubs by name, rebuilding this process's index if clubs changed elsewhere"""
+    version = directory_version()
+    if index.version != version:
+        index.sync(get_directory(), version)
+    return index.search(query, limit)
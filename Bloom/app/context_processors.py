@@ -1,23 +1,49 @@
-from .models import Club, Profile
+from functools import lru_cache
+
+from .club_directory import get_directory, get_user_club_ids
+from .recommendations import recommend_clubs
+
 
 def clubs_context(request):
-    """Make clubs available in all templates"""
-    clubs_list = Club.objects.all().values_list('name', flat=True)
-    clubs_objects = Club.objects.all()
-    
-    # Get user's club IDs for membership checking
-    user_club_ids = []
-    if request.user.is_authenticated:
-        profile, _ = Profile.objects.get_or_create(user=request.user)
-        # Re-fetch the clubs relationship to ensure we get fresh data
-        # refresh_from_db() doesn't work for ManyToMany, so we need to re-query
-        user_club_ids = list(Profile.objects.filter(user=request.user).values_list('clubs__id', flat=True).distinct())
-        # Filter out None values in case user has no clubs
-        user_club_ids = [cid for cid in user_club_ids if cid is not None]
-    
+    """
+    Make clubs available in all templates.
+
+    Every value is a zero-argument function: the template engine calls it the first
+    time a template actually uses the variable, so pages that never show clubs
+    (login, signup, about us...) never touch the clubs tables. Results come from the
+    cache in club_directory.py.
+    """
+    # Memoized so a page that uses several of these only reads the cache once
+    directory = lru_cache(maxsize=None)(get_directory)
+
+    @lru_cache(maxsize=None)
+    def user_club_ids():
+        # List of club IDs the user is a member of
+        if not request.user.is_authenticated:
+            return frozenset()
+        return get_user_club_ids(request.user.id)
+
+    def clubs():
+        # Just the names, for JS
+        return [club['name'] for club in directory()]
+
+    def user_clubs():
+        # The user's own clubs (right bar)
+        joined = user_club_ids()
+        return [club for club in directory() if club['id'] in joined]
+
+    @lru_cache(maxsize=None)
+    def recommended_clubs():
+        # "Clubs you might like" (left bar), precomputed and cached in recommendations.py
+        if not request.user.is_authenticated:
+            return []
+        by_id = {club['id']: club for club in directory()}
+        return [by_id[club_id] for club_id in recommend_clubs(request.user.id) if club_id in by_id]
+
     return {
-        'clubs': list(clubs_list),  # For JSON script in navbar
-        'clubs_objects': clubs_objects,  # For displaying in templates
-        'user_club_ids': user_club_ids,  # List of club IDs the user is a member of
+        'clubs': clubs,
+        'clubs_objects': directory,  # For displaying in templates
+        'user_club_ids': user_club_ids,
+        'user_clubs': user_clubs,
+        'recommended_clubs': recommended_clubs,
     }
-
@@ -0,0 +1,253 @@
+"""
+Synthetic data at production-like scale (see `manage.py generate_data` and `manage.py bench_views`).
+
+Everything goes in with bulk inserts, so no signals fire: the post counters are
+computed up front, profiles are created explicitly, the following timelines
+are filled with one INSERT ... SELECT, and the trending scores and club
+recommendations are rebuilt at the end.
+
+Popularity is skewed the way real communities are: a few clubs have most of the
+members and posts, a few users write most of the posts, and like / comment counts
+follow a heavy-tailed (Pareto) distribution.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import recommendations, trending
+from .club_directory import bump_directory_version
+from .models import Club, Comment, Like, Post, Profile, TimelineEntry
+from .slugs import allocate_slugs
+from .timeline import TIMELINE_DEPTH
+
+SCALES = {
+    'tiny': dict(users=50, clubs=20, posts=500, likes_per_post=3, comments_per_post=1),
+    'small': dict(users=1_000, clubs=500, posts=20_000, likes_per_post=5, comments_per_post=1),
+    'medium': dict(users=10_000, clubs=2_000, posts=200_000, likes_per_post=5, comments_per_post=1),
+    'large': dict(users=100_000, clubs=5_000, posts=2_000_000, likes_per_post=5, comments_per_post=1),
+}
+
+BATCH_SIZE = 2000
+
+PARETO_ALPHA = 1.5  # mean of paretovariate(1.5) is 3
+
+TOPICS = [
+    'chess', 'music', 'jazz', 'guitar', 'piano', 'book', 'poetry', 'film', 'movie', 'anime',
+    'art', 'painting', 'photo', 'design', 'coding', 'python', 'robotics', 'security', 'math',
+    'physics', 'biology', 'history', 'language', 'spanish', 'french', 'debate', 'tennis',
+    'soccer', 'basketball', 'running', 'hiking', 'climbing', 'cycling', 'yoga', 'cooking',
+    'baking', 'coffee', 'gaming', 'boardgame', 'theatre', 'dance', 'volunteer', 'garden',
+    'startup', 'finance', 'study', 'lunch', 'travel', 'astronomy', 'environment',
+]
+ADJECTIVES = [
+    'campus', 'late night', 'weekend', 'casual', 'competitive', 'beginner', 'advanced',
+    'north', 'south', 'east', 'west', 'friday', 'morning', 'indie', 'classic', 'open',
+]
+KINDS = ['Club', 'Society', 'Group', 'Circle', 'Crew', 'Collective']
+WORDS = (
+    'the a and to of in is for on with this that at from we our new first great meeting '
+    'tonight tomorrow week practice session event anyone join come bring ready looking '
+    'forward thanks everyone today room library hall game match lesson notes question '
+    'idea project team share fun help free pizza snacks starting time place sign up'
+).split() + TOPICS
+
+
+def zipf_weights(n, s=1.1):
+    """Weights for ranks 1..n, so a few items get most of the picks"""
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def heavy_tail(rng, mean, cap):
+    """A Pareto-distributed count with roughly the given mean, at most `cap`"""
+    return min(cap, int(rng.paretovariate(PARETO_ALPHA) * mean / 3))
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create store our made-up dates instead of auto_now_add's 'now'"""
+    fields = [
+        Post._meta.get_field('date_posted'),
+        Like._meta.get_field('created_at'),
+        Comment._meta.get_field('date_commented'),
+        Club._meta.get_field('created_at'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Generator:
+    def __init__(self, users, clubs, posts, likes_per_post, comments_per_post, days=365,
+                 seed=0, prefix='gen', password='bloom-password', memberships_per_user=5,
+                 timeline_depth=TIMELINE_DEPTH, log=None):
+        self.counts = dict(users=users, clubs=clubs, posts=posts)
+        self.likes_per_post = likes_per_post
+        self.comments_per_post = comments_per_post
+        self.memberships_per_user = memberships_per_user
+        self.timeline_depth = timeline_depth
+        self.days = days
+        self.prefix = prefix
+        self.password = password
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.post_ids = None  # (first, last) id of the posts made by this run
+        self.profile_ids = {}  # user id -> profile id
+
+    def run(self):
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise ValueError(f'Users named {self.prefix}_* already exist, pick another prefix')
+
+        with explicit_timestamps(), transaction.atomic():
+            user_ids = self.make_users()
+            club_ids = self.make_clubs()
+            memberships = self.make_memberships(user_ids, club_ids)
+            totals = self.make_posts(user_ids, club_ids, memberships)
+            totals['timeline'] = self.make_timelines()
+            totals['trending'] = trending.rebuild()
+            totals['club pairs'] = recommendations.rebuild()
+
+        # Clubs were bulk inserted behind the directory cache's back
+        bump_directory_version()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return {'users': len(user_ids), 'clubs': len(club_ids),
+                'memberships': sum(map(len, memberships.values())), **totals}
+
+    def make_users(self):
+        password = make_password(self.password)  # hashing is slow, do it once
+        user_ids = []
+        for first in range(0, self.counts['users'], BATCH_SIZE):
+            users = User.objects.bulk_create([
+                User(username=f'{self.prefix}_{i}', password=password,
+                     date_joined=self.now - timedelta(days=self.days))
+                for i in range(first, min(first + BATCH_SIZE, self.counts['users']))
+            ])
+            profiles = Profile.objects.bulk_create([Profile(user_id=user.id) for user in users])
+            self.profile_ids.update((profile.user_id, profile.id) for profile in profiles)
+            user_ids.extend(user.id for user in users)
+        self.log(f'{len(user_ids)} users')
+        return user_ids
+
+    def make_clubs(self):
+        names = set()
+        while len(names) < self.counts['clubs']:
+            name = f'{self.rng.choice(ADJECTIVES).title()} {self.rng.choice(TOPICS).title()} {self.rng.choice(KINDS)}'
+            if name in names:
+                name = f'{name} {len(names)}'
+            names.add(name)
+        # Club names are unique, so rename the ones an earlier run (or a real club) already uses
+        taken = set(Club.objects.values_list('name', flat=True))
+        names = sorted(name if name not in taken else f'{name} ({self.prefix})' for name in names)
+        clubs = Club.objects.bulk_create(
+            [Club(name=name, created_at=self.now - timedelta(days=self.days)) for name in names],
+            batch_size=BATCH_SIZE,
+        )
+        club_ids = [club.id for club in clubs]
+        # The list order is the popularity rank
+        self.rng.shuffle(club_ids)
+        self.log(f'{len(club_ids)} clubs')
+        return club_ids
+
+    def make_memberships(self, user_ids, club_ids):
+        """{user id: [club ids]}, most users in a handful of clubs, popular clubs picked more often"""
+        weights = zipf_weights(len(club_ids))
+        through = Profile.clubs.through
+
+        memberships = {}
+        rows = []
+        for user_id in user_ids:
+            count = 1 + heavy_tail(self.rng, self.memberships_per_user, len(club_ids) - 1)
+            clubs = set(self.rng.choices(club_ids, weights, k=count))
+            memberships[user_id] = list(clubs)
+            rows.extend(through(profile_id=self.profile_ids[user_id], club_id=club_id) for club_id in clubs)
+        through.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        self.log(f'{len(rows)} memberships')
+        return memberships
+
+    def make_posts(self, user_ids, club_ids, memberships):
+        user_weights = zipf_weights(len(user_ids), s=0.8)
+        span = timedelta(days=self.days).total_seconds()
+        start = self.now - timedelta(days=self.days)
+        totals = {'posts': 0, 'likes': 0, 'comments': 0}
+
+        for first in range(0, self.counts['posts'], BATCH_SIZE):
+            last = min(first + BATCH_SIZE, self.counts['posts'])
+            authors = self.rng.choices(user_ids, user_weights, k=last - first)
+
+            posts, likers, commenters = [], [], []
+            for i, author in zip(range(first, last), authors):
+                content = sentence(self.rng, 5, 40)
+                clubs = memberships[author]
+                # Mostly in one of the author's clubs, sometimes a general post
+                club_id = self.rng.choice(clubs) if clubs and self.rng.random() < 0.9 else None
+                date_posted = start + timedelta(seconds=span * i / self.counts['posts'] + self.rng.random() * 60)
+                like_users = self.rng.sample(user_ids, heavy_tail(self.rng, self.likes_per_post, len(user_ids)))
+                comment_users = [self.rng.choice(user_ids)
+                                 for _ in range(heavy_tail(self.rng, self.comments_per_post, 500))]
+                posts.append(Post(
+                    user_id=author, club_id=club_id, content=content,
+                    title=sentence(self.rng, 2, 6) if self.rng.random() < 0.3 else None,
+                    date_posted=date_posted,
+                    like_count=len(like_users), comment_count=len(comment_users),
+                ))
+                likers.append(like_users)
+                commenters.append(comment_users)
+
+            for post, slug in zip(posts, allocate_slugs([post.content for post in posts])):
+                post.slug = slug
+            Post.objects.bulk_create(posts)
+            self.post_ids = (self.post_ids or (posts[0].id,))[:1] + (posts[-1].id,)
+            likes = [
+                Like(post_id=post.id, user_id=user_id, created_at=post.date_posted + timedelta(minutes=self.rng.randint(1, 600)))
+                for post, users in zip(posts, likers) for user_id in users
+            ]
+            comments = [
+                Comment(post_id=post.id, user_id=user_id, content=sentence(self.rng, 3, 20),
+                        date_commented=post.date_posted + timedelta(minutes=self.rng.randint(1, 600)))
+                for post, users in zip(posts, commenters) for user_id in users
+            ]
+            Like.objects.bulk_create(likes, batch_size=BATCH_SIZE)
+            Comment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+
+            totals['posts'] += len(posts)
+            totals['likes'] += len(likes)
+            totals['comments'] += len(comments)
+            if last % (BATCH_SIZE * 25) == 0 or last == self.counts['posts']:
+                self.log(f'{last} posts')
+        return totals
+
+    def make_timelines(self):
+        """Fan the newest `timeline_depth` posts of each club out to its members, in SQL"""
+        if not self.post_ids:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {TimelineEntry._meta.db_table} (user_id, post_id, club_id, date_posted)
+                SELECT pr.user_id, p.id, p.club_id, p.date_posted
+                FROM (
+                    SELECT id, club_id, date_posted,
+                           ROW_NUMBER() OVER (PARTITION BY club_id ORDER BY date_posted DESC) AS n
+                    FROM {Post._meta.db_table}
+                    WHERE club_id IS NOT NULL AND id BETWEEN %s AND %s
+                ) p
+                JOIN {Profile.clubs.through._meta.db_table} m ON m.club_id = p.club_id
+                JOIN {Profile._meta.db_table} pr ON pr.id = m.profile_id
+                WHERE p.n <= %s
+            ''', [self.post_ids[0], self.post_ids[1], self.timeline_depth])
+            rows = cursor.rowcount
+        self.log(f'{rows} timeline entries')
+        return rows
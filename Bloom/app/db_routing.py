@@ -0,0 +1,111 @@
+"""
+Read replica routing.
+
+Writes always go to the primary ('default'). Reads go to the 'replica' database
+(when one is configured, see BLOOM_READ_REPLICA in settings) only inside requests
+that ReadReplicaMiddleware lets through:
+
+- safe-method requests (GET / HEAD / OPTIONS) from a client that hasn't written lately
+- everything else (POST & co, management commands, background threads) reads the primary
+
+After an unsafe-method request the client gets a short-lived cookie that pins it to
+the primary for REPLICA_PIN_SECONDS, longer than the replication lag, so whoever just
+posted, liked or joined always sees their own write on the next pages.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+PIN_COOKIE = 'bloom_primary_until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_reads_from_replica = ContextVar('app_reads_from_replica', default=False)
+
+
+def replica_configured():
+    """A replica is set up, and is a different database (a test mirror of the primary doesn't count)"""
+    replica = settings.DATABASES.get(REPLICA_DB_ALIAS)
+    return replica is not None and replica['NAME'] != settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Send this block's reads to the replica (or, with enabled=False, back to the primary)"""
+    token = _reads_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _reads_from_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Rows already loaded from a database keep reading their relations from it
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _reads_from_replica.get() and replica_configured():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both sides
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication, like everything else
+        return db != REPLICA_DB_ALIAS
+
+
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReadReplicaMiddleware:
+    """Decide per request whether reads may go to the replica, and pin writers to the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.replica_allowed(request)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        with replica_reads(self.replica_allowed(request)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+    def replica_allowed(self, request):
+        return request.method in SAFE_METHODS and not is_pinned(request)
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and replica_configured():
+            until = time.time() + pin_seconds()
+            response.set_cookie(PIN_COOKIE, f'{until:.0f}', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
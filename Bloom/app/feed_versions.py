@@ -0,0 +1,104 @@
+"""
+Change stamps for the JSON feed API's conditional GETs (ETag / Last-Modified, see views.feed_api).
+
+Every feed scope has a stamp in the cache: the time (ns) anything in it last changed.
+
+- 'all' (also used by trending): any post created, edited or deleted, any like / comment
+- 'club:<id>': the same, for posts in that club. A following feed is the stamps of the
+  user's clubs (plus which clubs those are, so joining / leaving changes it too)
+- 'user:<id>': that user's profile (name, picture), for the cached pages that show it in
+  the navbar (see http_cache.py)
+
+Stamps are touched once the writing transaction commits. Working out a feed's ETag only
+reads the cache, so answering a poll with 304 Not Modified never runs the feed query.
+A missing stamp (evicted, cold cache) is created as "changed now", which costs clients
+one full response, never a stale 304.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .club_directory import get_user_club_ids
+from .models import Post
+
+ALL = 'all'
+
+
+def _key(scope):
+    return f'feed:stamp:{scope}'
+
+
+def club_scope(club_id):
+    return f'club:{club_id}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def _stamp(club_ids):
+    now = time.time_ns()
+    scopes = [ALL] + [club_scope(club_id) for club_id in set(club_ids) if club_id]
+    cache.set_many({_key(scope): now for scope in scopes}, timeout=None)
+
+
+def touch(club_ids=()):
+    """Mark the 'all' feed and the feeds of `club_ids` as changed, once the current transaction commits"""
+    club_ids = list(club_ids)
+    transaction.on_commit(lambda: _stamp(club_ids))
+
+
+def touch_user(user_id):
+    """Mark `user_id`'s profile as changed, once the current transaction commits"""
+    transaction.on_commit(lambda: cache.set(_key(user_scope(user_id)), time.time_ns(), timeout=None))
+
+
+def posts_changed(post_ids, club_ids=None):
+    """touch() the feeds showing `post_ids` (their counters moved). Pass their `club_ids` if known, saves a query"""
+    if club_ids is not None:
+        touch(club_ids)
+        return
+    post_ids = list(post_ids)
+
+    def stamp():
+        _stamp(Post.objects.filter(pk__in=post_ids).order_by().values_list('club_id', flat=True).distinct())
+
+    transaction.on_commit(stamp)
+
+
+def stamps(scopes):
+    """{scope: stamp}, creating the missing ones"""
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    for key, now in missing.items():
+        # Someone else may have just created it, theirs wins
+        if not cache.add(key, now, timeout=None):
+            found[key] = cache.get(key, now)
+        else:
+            found[key] = now
+    return {keys[key]: value for key, value in found.items()}
+
+
+def feed_state(user, feed_type='all', club_id=None, cursor=None):
+    """
+    (etag, last modified datetime) of a feed page, from the cache alone.
+    The ETag covers the viewer too: responses carry their own liked flags.
+    """
+    if club_id is not None:
+        scopes = [club_scope(club_id)]
+    elif feed_type == 'following':
+        scopes = [club_scope(club_id) for club_id in sorted(get_user_club_ids(user.id))]
+    else:
+        scopes = [ALL]
+    current = stamps(scopes) if scopes else {}
+
+    signature = '|'.join(
+        [str(user.id), feed_type, str(club_id), cursor or ''] + [f'{scope}={current[scope]}' for scope in scopes]
+    )
+    etag = hashlib.md5(signature.encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(max(current.values()) / 1e9, tz=timezone.utc) if current else None
+    return etag, last_modified
@@ -0,0 +1,191 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q, Value
+
+from .club_directory import get_user_club_ids
+from .models import Comment, Post, Like, TimelineEntry
+from .trending import TRENDING_LIMIT
+
+# How many posts a single feed page shows (first render and every "load more")
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 20)
+# How many comments an expanded thread shows per request
+COMMENT_PAGE_SIZE = getattr(settings, 'COMMENT_PAGE_SIZE', 10)
+
+
+def encode_cursor(date_posted, pk):
+    """Turn the (date_posted, id) of the last row of a page into an opaque cursor string"""
+    raw = f"{date_posted.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor string back into (date_posted, id). Raises ValueError if it's garbage"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date_part, id_part = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def encode_offset(offset):
+    """Cursor for offset-paged feeds (trending)"""
+    return base64.urlsafe_b64encode(f'offset|{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_offset(cursor):
+    """Turn an offset cursor back into an int. Raises ValueError if it's garbage"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        label, offset = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if label != 'offset' or int(offset) < 0:
+            raise ValueError(cursor)
+        return int(offset)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def with_card_data(posts, user):
+    """
+    Join in / annotate everything partials/post.html needs so a whole feed page
+    renders in a fixed number of queries instead of 5+ per post.
+    """
+    # like_count / comment_count are plain columns on Post, no aggregation needed
+    posts = posts.select_related('user', 'user__profile', 'club')
+    if user.is_authenticated:
+        liked = Like.objects.filter(post=OuterRef('pk'), user=user)
+        return posts.annotate(liked_by_me=Exists(liked))
+    return posts.annotate(liked_by_me=Value(False))
+
+
+def feed_queryset(user, club=None):
+    """Base queryset for the 'all' feed or a single club page"""
+    posts = with_card_data(Post.objects.exclude(slug__isnull=True).exclude(slug__exact=''), user)
+    if club is not None:
+        posts = posts.filter(club=club)
+    return posts
+
+
+def page_queryset(rows, cursor=None, page_size=FEED_PAGE_SIZE, key=('date_posted', 'id')):
+    """The query paginate() runs for one page (plus one extra row), unevaluated"""
+    date_field, id_field = key
+    rows = rows.order_by(f'-{date_field}', f'-{id_field}')
+
+    if cursor:
+        date_posted, row_id = decode_cursor(cursor)
+        # The redundant `<=` bound lets the database seek straight to the cursor in the
+        # (date, id) index instead of walking it from the newest row (the OR alone can't)
+        rows = rows.filter(
+            Q(**{f'{date_field}__lte': date_posted}),
+            Q(**{f'{date_field}__lt': date_posted}) |
+            Q(**{date_field: date_posted, f'{id_field}__lt': row_id})
+        )
+
+    # Grab one extra row so we know if there is another page without a COUNT(*)
+    return rows[:page_size + 1]
+
+
+def paginate(rows, cursor=None, page_size=FEED_PAGE_SIZE, key=('date_posted', 'id')):
+    """
+    Keyset pagination on (date_posted, id), newest first.
+    `key` names the two columns to page on, so it works for posts and timeline entries alike.
+    Returns (list of rows for this page, cursor for the next page or None).
+    """
+    date_field, id_field = key
+    page = list(page_queryset(rows, cursor, page_size, key))
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(getattr(page[-1], date_field), getattr(page[-1], id_field))
+
+    return page, next_cursor
+
+
+def following_page(user, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    One page of the "Groups you follow" feed.
+    Pages through the user's precomputed timeline (one index range scan) and then
+    loads just those posts by primary key.
+    Joining a club only copies its newest TIMELINE_DEPTH posts into the timeline (see
+    timeline.backfill), so once the timeline runs out the feed carries on from the clubs'
+    own posts, older than its last entry. Both page on (date_posted, post id), so a cursor
+    from either side works for the next page.
+    """
+    entries, next_cursor = paginate(
+        TimelineEntry.objects.filter(user=user), cursor, page_size, key=('date_posted', 'post_id')
+    )
+    post_ids = [entry.post_id for entry in entries]
+    posts = with_card_data(Post.objects.filter(pk__in=post_ids), user).in_bulk()
+    page = [posts[pk] for pk in post_ids if pk in posts]
+    if next_cursor is not None:
+        return page, next_cursor
+
+    # The timeline ran out: older club posts than anything in it were never copied there
+    last = encode_cursor(entries[-1].date_posted, entries[-1].post_id) if entries else cursor
+    club_posts = feed_queryset(user).filter(club_id__in=get_user_club_ids(user.id))
+    if len(page) < page_size:
+        older, next_cursor = paginate(club_posts, last, page_size - len(page))
+        return page + older, next_cursor
+    return page, last if page_queryset(club_posts, last, 0).exists() else None
+
+
+def trending_queryset(user, offset=0, page_size=FEED_PAGE_SIZE):
+    """One page (plus one extra row) of the trending feed, unevaluated: top hot_score first, off post_hot_idx"""
+    end = min(offset + page_size + 1, TRENDING_LIMIT)
+    posts = feed_queryset(user).filter(hot_score__gt=0).order_by('-hot_score', '-id')
+    return posts[offset:max(offset, end)]
+
+
+def trending_page(user, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    One page of the trending feed (see trending.py). Scores keep moving, so there's no stable
+    key to page on: the cursor is the offset, and the feed stops after TRENDING_LIMIT posts.
+    """
+    offset = decode_offset(cursor) if cursor else 0
+    page = list(trending_queryset(user, offset, page_size))
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_offset(offset + page_size)
+    return page, next_cursor
+
+
+def feed_page(user, feed_type='all', club=None, cursor=None, page_size=FEED_PAGE_SIZE):
+    """One page of whichever feed was asked for: (posts, next_cursor)"""
+    if club is None and feed_type == 'following':
+        return following_page(user, cursor, page_size)
+    if club is None and feed_type == 'trending':
+        return trending_page(user, cursor, page_size)
+    return paginate(feed_queryset(user, club=club), cursor, page_size)
+
+
+def comment_queryset(post_id):
+    """A post's comments with their authors (and avatars) joined in"""
+    return Comment.objects.filter(post_id=post_id).select_related('user', 'user__profile')
+
+
+def comment_page(post_id, cursor=None, page_size=COMMENT_PAGE_SIZE):
+    """One page of a post's comments, newest first: (comments, next_cursor). Never loads the whole thread"""
+    return paginate(comment_queryset(post_id), cursor, page_size, key=('date_commented', 'id'))
+
+
+def post_json(post):
+    """The compact form of a feed row the JSON feed API sends (flat, no markup)"""
+    profile = getattr(post.user, 'profile', None)
+    return {
+        'slug': post.slug,
+        'title': post.title,
+        'content': post.content,
+        'user': post.user.username,
+        'avatar': profile and profile.get_profile_picture_url(),
+        'club': post.club_id,
+        'club_name': post.club.name if post.club_id else None,
+        'date_posted': post.date_posted.isoformat(),
+        'like_count': post.like_count,
+        'comment_count': post.comment_count,
+        'liked': bool(getattr(post, 'liked_by_me', False)),
+    }
+
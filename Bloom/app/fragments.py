@@ -0,0 +1,97 @@
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.timesince import timesince
+
+CARD_TEMPLATE = 'partials/post.html'
+CARD_TIMEOUT = 60 * 60 * 24
+# Part of the key: bump it when post.html changes so cards cached by the old markup are dropped
+CARD_VERSION = 4
+
+# Holes left in the cached markup (written literally in post.html) and filled in per request.
+# They contain '<', which autoescaping turns into &lt; in user content, so a post can never fake one.
+LIKED_CLASS = '<!--@liked-class-->'
+LIKED = '<!--@liked-->'
+TIMESINCE = '<!--@timesince-->'
+
+HITS_KEY = 'postcards:hits'
+MISSES_KEY = 'postcards:misses'
+
+
+def card_key(post, current_club_id):
+    """
+    Cache key of a post's card. render_version moves on edits, likes and comments;
+    everything else the markup shows from other rows (author name / avatar, club name)
+    goes into the digest, so an avatar change or club rename re-renders without touching posts.
+    """
+    profile = getattr(post.user, 'profile', None)
+    show_club = bool(post.club_id and post.club_id != current_club_id)
+    signature = '|'.join([
+        post.user.username,
+        (profile and profile.get_profile_picture_url()) or '',
+        post.club.name if show_club else '',
+    ])
+    digest = hashlib.md5(signature.encode()).hexdigest()[:12]
+    return f'postcard:v{CARD_VERSION}:{post.pk}:{post.render_version}:{digest}'
+
+
+def _fill(card, post):
+    """Put the per-viewer / time dependent bits into a cached card"""
+    liked = getattr(post, 'liked_by_me', False)
+    return (
+        card.replace(LIKED_CLASS, ' text-blue-600' if liked else '')
+        .replace(LIKED, 'true' if liked else 'false')
+        .replace(TIMESINCE, timesince(post.date_posted))
+    )
+
+
+def _count(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # First one (or evicted)
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def render_cards(posts, current_club_id=None):
+    """Rendered cards for `posts`, reusing cached markup (one cache round trip for the lot)"""
+    keys = [card_key(post, current_club_id) for post in posts]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(CARD_TEMPLATE, {
+                'post': post,
+                'current_club_id': current_club_id,
+            })
+            missing[key] = card
+        cards.append(_fill(card, post))
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    _count(HITS_KEY, len(posts) - len(missing))
+    _count(MISSES_KEY, len(missing))
+    return cards
+
+
+def stats():
+    """Hit / miss counters of the post card cache"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,138 @@
+"""
+Server-side cache of whole responses, for pages many requests get the same answer to
+(club search results, about us, club pages). Use the cached_view decorator.
+
+- The key is the view, the full path (query string included), the versions of the data
+  on the page (worked out from the cache alone, e.g. the club directory version or a
+  club's feed stamp, see feed_versions.py) and, for per-user pages, the viewer. When the
+  data changes its version moves, the next request renders afresh and the old entry
+  just expires.
+- The viewer part of the key is the session plus the CSRF cookie: a cached page's CSRF
+  token has to match the cookie of whoever it's served to. Anonymous requests share entries.
+- Responses get a strong ETag (md5 of the body) and Cache-Control; a matching If-None-Match
+  gets a 304 straight from the cached entry. Per-user pages send Vary: Cookie, and are
+  private for logged-in viewers.
+- Put gzip_page under cached_view, so pages are compressed once, when they're stored.
+- Pages are rendered from the primary when they're going into the cache: a lagging replica
+  must never end up stored under the current versions and served to everyone.
+- Only GET / HEAD 200s that don't set cookies are stored: nothing rendered right after a new
+  CSRF token or a session change (login, messages) ends up in the cache.
+
+settings.PAGE_CACHE_ENABLED = False turns it off (see `manage.py bench_page_cache`).
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .db_routing import replica_reads
+
+# Headers worth keeping from the rendered response
+STORED_HEADERS = ('Content-Type', 'Content-Encoding', 'Content-Language', 'Vary', 'X-Frame-Options')
+
+
+def enabled():
+    return getattr(settings, 'PAGE_CACHE_ENABLED', True)
+
+
+def _viewer(request, user):
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'{user.pk}:{hashlib.md5(f"{session}|{csrf}".encode()).hexdigest()}'
+
+
+def _key(view, request, viewer, versions):
+    # Views under gzip_page answer differently depending on this
+    gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    parts = '|'.join([request.get_full_path(), viewer, str(gzip)] + [str(version) for version in versions])
+    return f'page:{view.__module__}.{view.__name__}:{hashlib.md5(parts.encode()).hexdigest()}'
+
+
+def _entry(request, response):
+    """What gets cached of a rendered response (None if it mustn't be)"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    # A new CSRF secret or a changed session: the page doesn't go with the request's cookies
+    # (a CSRF cookie that's merely being renewed is fine)
+    new_csrf = request.META.get('CSRF_COOKIE') != request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    session = getattr(request, 'session', None)
+    if (request.META.get('CSRF_COOKIE_NEEDS_UPDATE') and new_csrf) or (session is not None and session.modified):
+        return None
+    headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+    return {
+        'content': response.content,
+        'headers': headers,
+        'etag': f'"{hashlib.md5(response.content).hexdigest()}"',
+    }
+
+
+def _finish(request, entry, response, per_user, private, cache_control):
+    """Add validators / caching headers, answering 304 when the client has this version"""
+    if response is None:
+        response = HttpResponse(entry['content'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+    response['ETag'] = entry['etag']
+    if per_user:
+        patch_vary_headers(response, ['Cookie'])
+    patch_cache_control(response, **{'private' if private else 'public': True, **cache_control})
+    return get_conditional_response(request, etag=entry['etag'], response=response)
+
+
+def cached_view(timeout, versions=None, per_user=False, **cache_control):
+    """
+    Cache a view's GET responses for `timeout` seconds.
+    versions(request, *args, **kwargs): list of values that change whenever the page would
+    (read them from the cache, it runs on every request). per_user: the page shows who's looking
+    (navbar, membership buttons, liked posts), so every viewer gets their own entry.
+    The remaining keyword arguments go to Cache-Control (e.g. max_age=60, no_cache=True).
+    """
+    def decorator(view):
+        def prepare(request, user, args, kwargs):
+            private = per_user and user is not None and user.is_authenticated
+            key = _key(view, request, _viewer(request, user) if per_user else 'shared',
+                       versions(request, *args, **kwargs) if versions else [])
+            return key, private
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or not enabled():
+                    return await view(request, *args, **kwargs)
+                user = await request.auser() if per_user else None
+                key, private = prepare(request, user, args, kwargs)
+                entry = await cache.aget(key)
+                response = None
+                if entry is None:
+                    with replica_reads(False):
+                        response = await view(request, *args, **kwargs)
+                    entry = _entry(request, response)
+                    if entry is None:
+                        return response
+                    await cache.aset(key, entry, timeout)
+                return _finish(request, entry, response, per_user, private, cache_control)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or not enabled():
+                    return view(request, *args, **kwargs)
+                user = request.user if per_user else None
+                key, private = prepare(request, user, args, kwargs)
+                entry = cache.get(key)
+                response = None
+                if entry is None:
+                    with replica_reads(False):
+                        response = view(request, *args, **kwargs)
+                    entry = _entry(request, response)
+                    if entry is None:
+                        return response
+                    cache.set(key, entry, timeout)
+                return _finish(request, entry, response, per_user, private, cache_control)
+        return wrapper
+    return decorator
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+# Pixel sizes of the square derivatives (2x the CSS size so they stay sharp on retina screens).
+# Only add one here once a template actually shows the picture at that size.
+DERIVATIVE_SIZES = {
+    'avatar': 80,    # 40px avatars on posts and in the navbar
+}
+DERIVATIVE_DIR = 'profile_pictures/derived'
+WEBP_QUALITY = 80
+
+# One background worker is plenty for avatar uploads and keeps Pillow off the request threads
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-pictures')
+
+
+def make_derivative(image, size):
+    """Center-crop `image` to a `size` x `size` square and encode it as WebP with no metadata"""
+    image = ImageOps.exif_transpose(image)  # apply the camera rotation before EXIF is dropped
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    out = BytesIO()
+    # No exif / icc_profile arguments, so none of the original's metadata is carried over
+    image.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def _store(content, suffix):
+    """Save bytes under a content-hashed name (identical files are only stored once)"""
+    digest = hashlib.sha256(content).hexdigest()[:20]
+    name = f'{DERIVATIVE_DIR}/{digest}-{suffix}.webp'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def process_profile_picture(profile_id):
+    """Build every derivative for a profile's current picture and record them"""
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None or not profile.profile_picture:
+        return
+    source = profile.profile_picture.name
+    old_names = {profile.profile_picture_avatar.name}
+
+    with profile.profile_picture.open('rb') as f:
+        original = Image.open(f)
+        original.load()
+    names = {
+        label: _store(make_derivative(original, size), f'{label}-{size}')
+        for label, size in DERIVATIVE_SIZES.items()
+    }
+
+    # Only record them if the picture hasn't been replaced in the meantime
+    updated = Profile.objects.filter(pk=profile_id, profile_picture=source).update(
+        profile_picture_avatar=names['avatar'],
+        profile_picture_source=source,
+    )
+    if updated:
+        delete_unused_derivatives(old_names - set(names.values()))
+
+
+def _run_in_background(profile_id):
+    try:
+        process_profile_picture(profile_id)
+    except Exception:
+        logger.exception('Could not build profile picture derivatives for profile %s', profile_id)
+    finally:
+        # Background threads have to clean up their own DB connection
+        close_old_connections()
+
+
+def schedule_profile_picture(profile):
+    """Queue derivative generation once the current transaction commits"""
+    if getattr(settings, 'IMAGE_PIPELINE_SYNC', False):
+        transaction.on_commit(lambda: process_profile_picture(profile.pk))
+    else:
+        transaction.on_commit(lambda: _executor.submit(_run_in_background, profile.pk))
+
+
+def clear_derivatives(profile):
+    """Forget a removed picture's derivatives (and delete the files if nobody else uses them)"""
+    old_names = {profile.profile_picture_avatar.name}
+    Profile.objects.filter(pk=profile.pk).update(
+        profile_picture_avatar='', profile_picture_source='',
+    )
+    delete_unused_derivatives(old_names)
+
+
+def delete_unused_derivatives(names):
+    """Delete derivative files no profile points at any more (names are shared between identical uploads)"""
+    for name in filter(None, names):
+        in_use = Profile.objects.filter(profile_picture_avatar=name).exists()
+        if not in_use and default_storage.exists(name):
+            default_storage.delete(name)
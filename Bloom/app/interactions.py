@@ -0,0 +1,188 @@
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import feed_versions, like_buffer, live, trending
+from .models import Club, Like, Post, Profile
+
+# Upper bound on operations per batch request
+MAX_BATCH_OPS = 200
+
+POST_OPS = {'like': True, 'unlike': False}
+CLUB_OPS = {'join': True, 'leave': False}
+
+
+# Set while delete_likes() runs: the per-row post_delete counter update stands aside (see signals.py)
+_bulk_deleting = ContextVar('app_bulk_deleting_likes', default=False)
+
+
+class BatchError(ValueError):
+    """The batch as a whole is malformed (nothing is applied)"""
+
+
+def parse_ops(ops):
+    """
+    Collapse a list of {'op': ..., 'post': slug} / {'op': ..., 'club': id} into the
+    desired end state per target. The last op for a target wins, so a replayed
+    burst of clicks (like, unlike, like) ends up where the user left it.
+    Returns ({slug: liked}, {club_id: joined}).
+    """
+    if not isinstance(ops, list):
+        raise BatchError('ops must be a list')
+    if len(ops) > MAX_BATCH_OPS:
+        raise BatchError(f'At most {MAX_BATCH_OPS} operations per batch')
+
+    posts, clubs = {}, {}
+    for op in ops:
+        if not isinstance(op, dict):
+            raise BatchError('Every operation must be an object')
+        name = op.get('op')
+        if name in POST_OPS and isinstance(op.get('post'), str):
+            posts[op['post']] = POST_OPS[name]
+        elif name in CLUB_OPS:
+            try:
+                clubs[int(op.get('club'))] = CLUB_OPS[name]
+            except (TypeError, ValueError):
+                raise BatchError(f'Invalid club in {op}')
+        else:
+            raise BatchError(f'Invalid operation {op}')
+    return posts, clubs
+
+
+def _like_count_subquery():
+    counts = (
+        Like.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount_likes(post_ids, club_ids=None):
+    """
+    Recount like_count of `post_ids` from the Like rows, for bulk writes that skip the
+    counter signals (bulk_create never sends them, delete_likes holds them back).
+    The trending score moves by the difference (every SET reads the old like_count).
+    Pass the posts' `club_ids` if known (saves the lookups behind the live / feed updates).
+    """
+    if post_ids:
+        Post.objects.filter(pk__in=post_ids).update(
+            like_count=_like_count_subquery(), render_version=F('render_version') + 1,
+            hot_score=trending.bump(trending.LIKE_WEIGHT, times=_like_count_subquery() - F('like_count')),
+        )
+        live.counts_changed(post_ids, club_ids)
+        feed_versions.posts_changed(post_ids, club_ids)
+
+
+def bulk_deleting():
+    """Whether the likes being deleted right now will be recounted by the caller"""
+    return _bulk_deleting.get()
+
+
+def delete_likes(likes):
+    """likes.delete() without a counter UPDATE per row: recount_likes the posts afterwards"""
+    token = _bulk_deleting.set(True)
+    try:
+        likes.delete()
+    finally:
+        _bulk_deleting.reset(token)
+
+
+def apply_likes(user, wanted):
+    """Like / unlike a set of posts with one insert, one delete and one counter update"""
+    # .order_by(): no point sorting lookups by the models' default ordering
+    rows = list(Post.objects.filter(slug__in=wanted).order_by().values_list('slug', 'id', 'club_id'))
+    id_to_slug = {post_id: slug for slug, post_id, _ in rows}
+    id_to_club = {post_id: club_id for _, post_id, club_id in rows}
+    if not id_to_slug:
+        return {}
+    if like_buffer.enabled():
+        return _buffer_likes(user, wanted, id_to_slug, set(id_to_club.values()))
+
+    existing = set(
+        Like.objects.filter(user=user, post_id__in=id_to_slug).order_by().values_list('post_id', flat=True)
+    )
+
+    to_like = [post_id for post_id, slug in id_to_slug.items() if wanted[slug] and post_id not in existing]
+    to_unlike = [post_id for post_id, slug in id_to_slug.items() if not wanted[slug] and post_id in existing]
+
+    if to_like:
+        Like.objects.bulk_create([Like(post_id=post_id, user=user) for post_id in to_like], ignore_conflicts=True)
+    if to_unlike:
+        # The counters are recomputed right below
+        delete_likes(Like.objects.filter(user=user, post_id__in=to_unlike))
+
+    recount_likes(to_like + to_unlike, {id_to_club[post_id] for post_id in to_like + to_unlike})
+
+    counts = Post.objects.filter(pk__in=id_to_slug).values_list('id', 'like_count')
+    return {
+        id_to_slug[post_id]: {'liked': wanted[id_to_slug[post_id]], 'like_count': like_count}
+        for post_id, like_count in counts
+    }
+
+
+def _buffer_likes(user, wanted, id_to_slug, club_ids):
+    """apply_likes in write-behind mode: the intents go to the buffer, which answers with estimated counts"""
+    buffer = like_buffer.get_buffer()
+    buffer.set_likes(user.id, {post_id: wanted[slug] for post_id, slug in id_to_slug.items()})
+    # Cached pages / feed ETags move now rather than when the buffer flushes
+    feed_versions.touch(club_ids)
+
+    counts = Post.objects.filter(pk__in=id_to_slug).values_list('id', 'like_count')
+    return {
+        id_to_slug[post_id]: {'liked': wanted[id_to_slug[post_id]], 'like_count': buffer.estimate(post_id, like_count)}
+        for post_id, like_count in counts
+    }
+
+
+def apply_memberships(user, wanted):
+    """Join / leave a set of clubs with one m2m add and one m2m remove"""
+    clubs = Club.objects.in_bulk(list(wanted))
+    if not clubs:
+        return {}
+
+    profile, _ = Profile.objects.get_or_create(user=user)
+    through = Profile.clubs.through
+    current = set(through.objects.filter(profile=profile, club_id__in=clubs).values_list('club_id', flat=True))
+    to_join = [club_id for club_id in clubs if wanted[club_id] and club_id not in current]
+    to_leave = [club_id for club_id in clubs if not wanted[club_id] and club_id in current]
+
+    # add()/remove() with many ids are a single statement each and still send m2m_changed
+    # (timeline backfill / trim, membership cache)
+    if to_join:
+        profile.clubs.add(*to_join)
+    if to_leave:
+        profile.clubs.remove(*to_leave)
+
+    member_counts = dict(
+        through.objects.filter(club_id__in=clubs).order_by()
+        .values('club_id').annotate(total=Count('*')).values_list('club_id', 'total')
+    )
+    return {
+        club_id: {'joined': wanted[club_id], 'member_count': member_counts.get(club_id, 0)}
+        for club_id in clubs
+    }
+
+
+def apply_batch(user, ops):
+    """
+    Apply a batch of like/unlike/join/leave operations in one transaction.
+    Returns the resulting state of every affected post and club, plus the targets
+    that don't exist.
+    """
+    wanted_posts, wanted_clubs = parse_ops(ops)
+    with transaction.atomic():
+        posts = apply_likes(user, wanted_posts) if wanted_posts else {}
+        clubs = apply_memberships(user, wanted_clubs) if wanted_clubs else {}
+    return {
+        'posts': posts,
+        'clubs': {str(club_id): state for club_id, state in clubs.items()},
+        'missing': {
+            'posts': [slug for slug in wanted_posts if slug not in posts],
+            'clubs': [club_id for club_id in wanted_clubs if club_id not in clubs],
+        },
+    }
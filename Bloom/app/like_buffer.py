@@ -0,0 +1,325 @@
+"""
+Write-behind buffer for like toggles (settings.LIKE_WRITE_BEHIND).
+
+like_post and batch_interactions normally write every click to the Like table right away,
+and every click on a hot post queues for the single SQLite writer lock. In write-behind
+mode a click only:
+
+1. appends the intent ({"post", "user", "liked"}) to this process's log file
+   (LIKE_LOG_DIR/likes-<pid>.log, fdatasync'ed unless LIKE_LOG_FSYNC is off)
+2. records it in memory, where the latest intent per (post, user) wins
+
+and the endpoint answers straight away with the intended state and an estimated count
+(the stored like_count plus the buffered changes). Every LIKE_FLUSH_INTERVAL seconds a
+background thread rotates the log into a .flushing segment and applies the coalesced
+intents with one bulk insert, one delete per post and one recount (see interactions.py).
+Segments are deleted only once the transaction commits.
+
+Crash recovery: segments and logs left behind by a process that is no longer running
+(and this process's own unfinished segments) are replayed when the buffer starts, and by
+`manage.py flush_likes`. Applying an intent is idempotent (like = make sure the row
+exists, unlike = make sure it doesn't), so replaying a segment twice is harmless.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+
+from . import interactions
+from .models import Like, Post
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def enabled():
+    return getattr(settings, 'LIKE_WRITE_BEHIND', False)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # someone else's process, but it exists
+    return True
+
+
+def _owner(path):
+    """pid in a likes-<pid>.log / likes-<pid>-<n>.flushing name (None if it isn't one of ours)"""
+    try:
+        return int(path.name.split('.')[0].split('-')[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def read_segment(path):
+    """Intents in a log file, in order. A torn last line (crash mid-write) is skipped"""
+    intents = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                intent = json.loads(line)
+                intents.append(((int(intent['post']), int(intent['user'])), bool(intent['liked'])))
+            except (ValueError, KeyError, TypeError):
+                logger.warning('Skipping unreadable like intent in %s: %r', path, line[:100])
+    return intents
+
+
+def apply_intents(intents):
+    """
+    Write {(post_id, user_id): liked} to the Like table and recount the posts it touched.
+    Intents for posts or users deleted in the meantime are dropped. Returns how many were applied.
+    """
+    if not intents:
+        return 0
+    post_ids = {post_id for post_id, _ in intents}
+    user_ids = {user_id for _, user_id in intents}
+    existing_posts = set(Post.objects.filter(pk__in=post_ids).order_by().values_list('id', flat=True))
+    existing_users = set(get_user_model().objects.filter(pk__in=user_ids).order_by().values_list('id', flat=True))
+
+    to_like = []
+    to_unlike = defaultdict(list)  # post id -> user ids
+    for (post_id, user_id), liked in intents.items():
+        if post_id not in existing_posts or user_id not in existing_users:
+            continue
+        if liked:
+            to_like.append(Like(post_id=post_id, user_id=user_id))
+        else:
+            to_unlike[post_id].append(user_id)
+
+    with transaction.atomic():
+        Like.objects.bulk_create(to_like, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        for post_id, users in to_unlike.items():
+            for first in range(0, len(users), BATCH_SIZE):
+                chunk = users[first:first + BATCH_SIZE]
+                interactions.delete_likes(Like.objects.filter(post_id=post_id, user_id__in=chunk))
+        interactions.recount_likes(sorted({like.post_id for like in to_like} | set(to_unlike)))
+    return len(to_like) + sum(map(len, to_unlike.values()))
+
+
+class LikeBuffer:
+    def __init__(self, directory, interval=1.0, fsync=True):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self.log_path = self.directory / f'likes-{self.pid}.log'
+        self.segment = 0
+
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.fd = None
+        # (post id, user id) -> [liked before the first buffered click, latest intent]
+        self.pending = {}
+        # The same for the segments being flushed right now (still unknown to the database)
+        self.flushing = {}
+        self.thread = None
+        self.stopped = threading.Event()
+
+    # --- RECORDING ---
+
+    def _append(self, post_id, user_id, liked):
+        if self.fd is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        line = json.dumps({'post': post_id, 'user': user_id, 'liked': liked}, separators=(',', ':'))
+        # One write() per intent, so lines from concurrent threads never interleave
+        os.write(self.fd, line.encode() + b'\n')
+        if self.fsync:
+            os.fdatasync(self.fd)
+
+    def _buffered(self, key):
+        entry = self.pending.get(key) or self.flushing.get(key)
+        return entry and entry[1]
+
+    def _record(self, key, liked, was_liked):
+        # Under self.lock
+        self._append(key[0], key[1], liked)
+        entry = self.pending.get(key)
+        if entry is None:
+            earlier = self.flushing.get(key)
+            entry = self.pending[key] = [earlier[1] if earlier else was_liked, liked]
+        entry[1] = liked
+
+    def record(self, post_id, user_id, liked, was_liked):
+        """Buffer an intent. `was_liked` is the database state if nothing is buffered for this pair yet"""
+        with self.lock:
+            self._record((post_id, user_id), liked, was_liked)
+
+    def toggle(self, post_id, user_id, like_count):
+        """Flip a user's like on a post. Returns (liked, estimated like_count)"""
+        key = (post_id, user_id)
+        # The check and the record happen under one lock, so two quick clicks can't both
+        # read the same state and flip it the same way
+        with self.lock:
+            current = self._buffered(key)
+            if current is None:
+                current = Like.objects.filter(post_id=post_id, user_id=user_id).exists()
+            self._record(key, not current, current)
+        return not current, self.estimate(post_id, like_count)
+
+    def set_likes(self, user_id, wanted):
+        """Buffer a user's wanted state {post id: liked} (the batch endpoint), skipping what's already so"""
+        with self.lock:
+            current = {post_id: self._buffered((post_id, user_id)) for post_id in wanted}
+            unknown = [post_id for post_id, liked in current.items() if liked is None]
+            if unknown:
+                liked_in_db = set(
+                    Like.objects.filter(user_id=user_id, post_id__in=unknown).order_by().values_list('post_id', flat=True)
+                )
+                current.update({post_id: post_id in liked_in_db for post_id in unknown})
+            for post_id, liked in wanted.items():
+                if liked != current[post_id]:
+                    self._record((post_id, user_id), liked, current[post_id])
+
+    def estimate(self, post_id, like_count):
+        """like_count as read from the database plus this process's unflushed changes to it"""
+        delta = 0
+        with self.lock:
+            for key in self.flushing.keys() | self.pending.keys():
+                if key[0] == post_id:
+                    before = (self.flushing.get(key) or self.pending[key])[0]
+                    after = (self.pending.get(key) or self.flushing[key])[1]
+                    delta += after - before
+        return max(0, like_count + delta)
+
+    def liked_overrides(self, user_id, post_ids):
+        """{post id: liked} for the posts where the user has an unflushed intent"""
+        with self.lock:
+            overrides = {}
+            for post_id in post_ids:
+                liked = self._buffered((post_id, user_id))
+                if liked is not None:
+                    overrides[post_id] = liked
+            return overrides
+
+    # --- FLUSHING ---
+
+    def _rotate(self):
+        """Close the current log as a .flushing segment and start a fresh one (under self.lock)"""
+        if self.fd is None:
+            return
+        os.close(self.fd)
+        self.fd = None
+        self.segment += 1
+        os.rename(self.log_path, self.directory / f'likes-{self.pid}-{time.time_ns()}-{self.segment}.flushing')
+        for key, entry in self.pending.items():
+            earlier = self.flushing.get(key)
+            self.flushing[key] = [earlier[0] if earlier else entry[0], entry[1]]
+        self.pending = {}
+
+    def _own_segments(self):
+        return sorted(
+            path for path in self.directory.glob(f'likes-{self.pid}-*.flushing')
+        ) if self.directory.exists() else []
+
+    def flush(self):
+        """Write everything buffered so far to the database. Returns how many intents were applied"""
+        with self.flush_lock:
+            with self.lock:
+                self._rotate()
+            segments = self._own_segments()
+            if not segments:
+                return 0
+
+            intents = {}
+            for path in segments:
+                intents.update(read_segment(path))
+            changed = apply_intents(intents)
+            for path in segments:
+                path.unlink()
+            with self.lock:
+                self.flushing = {}
+            return changed
+
+    def recover(self):
+        """Adopt the logs / segments of processes that died before flushing them, then flush"""
+        if self.directory.exists():
+            for path in sorted(self.directory.glob('likes-*')):
+                owner = _owner(path)
+                if owner is None or owner == self.pid or _pid_alive(owner):
+                    continue
+                self.segment += 1
+                try:
+                    # Renaming is the claim: if another process got there first this one fails
+                    os.rename(path, self.directory / f'likes-{self.pid}-{path.stat().st_mtime_ns}-{self.segment}.flushing')
+                except FileNotFoundError:
+                    continue
+                logger.warning('Replaying like intents left behind by process %s (%s)', owner, path.name)
+        return self.flush()
+
+    # --- BACKGROUND THREAD ---
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # The segments stay on disk, the next round retries them
+                logger.exception('Could not flush buffered likes')
+            finally:
+                close_old_connections()
+
+    def start(self):
+        """Replay leftovers and flush every `interval` seconds from a background thread"""
+        self.recover()
+        if self.interval and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='like-buffer', daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush buffered likes, they stay logged for the next start')
+
+
+def buffer_from_settings(**overrides):
+    options = {
+        'directory': getattr(settings, 'LIKE_LOG_DIR', settings.BASE_DIR / 'var' / 'likes'),
+        'interval': getattr(settings, 'LIKE_FLUSH_INTERVAL', 1.0),
+        'fsync': getattr(settings, 'LIKE_LOG_FSYNC', True),
+    }
+    return LikeBuffer(**{**options, **overrides})
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's buffer, started on first use (a forked worker gets a fresh one)"""
+    global _buffer
+    if _buffer is None or _buffer.pid != os.getpid():
+        with _buffer_lock:
+            if _buffer is None or _buffer.pid != os.getpid():
+                buffer = buffer_from_settings()
+                buffer.start()
+                _buffer = buffer
+    return _buffer
+
+
+def shutdown():
+    """Flush and stop this process's buffer (if it was started)"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None and _buffer.pid == os.getpid():
+            atexit.unregister(_buffer.stop)
+            _buffer.stop()
+        _buffer = None
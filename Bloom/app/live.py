@@ -0,0 +1,273 @@
+"""
+Pub/sub for live feed updates (served as server-sent events by async_views.live_events).
+
+Events are published to channels named after clubs ("club:<id>") from the post /
+like / comment signals, once the transaction commits. Each subscriber gets its own
+bounded asyncio queue on the event loop it subscribed from.
+
+The backend decides how a published event reaches the subscribers:
+
+- LocalBackend (default): straight to this process's subscribers.
+- UnixSocketBackend: every process binds a datagram socket in a shared directory and
+  publishing sends the event to all of them, so several workers on one machine see
+  each other's events. A local stand-in for something like Redis pub/sub.
+
+Pick one with settings.LIVE_BROKER = {'BACKEND': 'dotted.path', 'OPTIONS': {...}}.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before the oldest ones are dropped (slow / stalled clients)
+QUEUE_SIZE = 100
+
+
+def club_channel(club_id):
+    return f'club:{club_id}'
+
+
+class Subscription:
+    """One subscriber's queue of (channel, event) pairs. Use as an async iterator"""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.dropped = 0
+
+    def _put(self, item):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    def deliver(self, item):
+        """Hand an event over from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            # Loop already closed, the subscriber is gone
+            self.close()
+
+    async def get(self, timeout=None):
+        """Next (channel, event), or None after `timeout` seconds of silence"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class LocalBackend:
+    """Delivers to this process only"""
+
+    # Only this process's subscribers can get its events
+    local = True
+
+    def __init__(self, **options):
+        self.deliver = None
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+
+class UnixSocketBackend:
+    """
+    Fans events out to every process that bound a socket in `path`
+    (all workers of a deployment share the directory).
+    """
+
+    MAX_DATAGRAM = 64 * 1024
+    # Other processes' subscribers can't be seen from here
+    local = False
+
+    def __init__(self, path=None, **options):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'bloom-live')
+        self.sock = None
+        self.address = None
+
+    def start(self, deliver):
+        os.makedirs(self.path, exist_ok=True)
+        self.address = os.path.join(self.path, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock')
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)
+        threading.Thread(target=self._listen, args=(deliver,), name='live-events', daemon=True).start()
+
+    def _listen(self, deliver):
+        while True:
+            try:
+                data = self.sock.recv(self.MAX_DATAGRAM)
+            except OSError:
+                return  # socket closed
+            try:
+                channel, event = json.loads(data)
+            except ValueError:
+                continue
+            deliver(channel, event)
+
+    def publish(self, channel, event):
+        data = json.dumps([channel, event]).encode()
+        for name in os.listdir(self.path):
+            address = os.path.join(self.path, name)
+            try:
+                self.sender.sendto(data, address)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # That worker is gone, tidy up its socket
+                if address != self.address:
+                    try:
+                        os.unlink(address)
+                    except OSError:
+                        pass
+            except BlockingIOError:
+                # That worker's buffer is full, it will miss this event (like a slow subscriber would)
+                logger.warning('Live event dropped for %s', address)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sender.close()
+            os.unlink(self.address)
+            self.sock = None
+
+
+class Broker:
+    """Keeps track of subscriptions per channel and hands published events to them"""
+
+    def __init__(self, backend):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # channel -> set of Subscription
+        self.backend = backend
+        self.backend.start(self._deliver)
+
+    def subscribe(self, channels):
+        """Subscribe to `channels` (must be called from the event loop that will read it)"""
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+    def listening(self, channels=None):
+        """Whether an event on one of `channels` (None: any channel) could reach a subscriber"""
+        if not getattr(self.backend, 'local', False):
+            return True
+        with self._lock:
+            if channels is None:
+                return bool(self._subscriptions)
+            return any(channel in self._subscriptions for channel in channels)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscriptions.values()))
+
+    def publish(self, channel, event):
+        """Send `event` (a JSON-serializable dict) to everyone subscribed to `channel`"""
+        try:
+            self.backend.publish(channel, event)
+        except Exception:
+            # Live updates are best effort, never break the write that triggered them
+            logger.exception('Could not publish live event to %s', channel)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver((channel, event))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker, built from settings.LIVE_BROKER on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'LIVE_BROKER', {})
+                backend_class = import_string(config.get('BACKEND', 'app.live.LocalBackend'))
+                _broker = Broker(backend_class(**config.get('OPTIONS', {})))
+    return _broker
+
+
+def publish_post(post):
+    """Announce a new post to its club"""
+    if post.club_id and post.slug:
+        get_broker().publish(club_channel(post.club_id), {
+            'type': 'post',
+            'post': post.slug,
+            'club': post.club_id,
+            'user': post.user.username,
+        })
+
+
+def publish_counts(rows):
+    """Announce new like / comment counts, `rows` being Post values() with slug, club_id and both counters"""
+    for row in rows:
+        if row['club_id'] and row['slug']:
+            get_broker().publish(club_channel(row['club_id']), {
+                'type': 'counts',
+                'post': row['slug'],
+                'like_count': row['like_count'],
+                'comment_count': row['comment_count'],
+            })
+
+
+def counts_changed(post_ids, club_ids=None):
+    """
+    Publish the fresh counters of `post_ids` once the current transaction commits.
+    Pass their `club_ids` when known: with nobody subscribed to those clubs, the counters
+    aren't even read (the usual case under WSGI, where nothing subscribes).
+    """
+    from .models import Post
+
+    post_ids = list(post_ids)
+    channels = None if club_ids is None else [club_channel(club_id) for club_id in club_ids if club_id]
+
+    def publish():
+        if (channels is not None and not channels) or not get_broker().listening(channels):
+            return
+        publish_counts(Post.objects.filter(pk__in=post_ids).values('slug', 'club_id', 'like_count', 'comment_count'))
+
+    transaction.on_commit(publish)
+
+
+def post_created(post):
+    """Publish a new post once the current transaction commits"""
+    transaction.on_commit(lambda: publish_post(post))
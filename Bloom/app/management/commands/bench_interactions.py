@@ -0,0 +1,95 @@
+import itertools
+import json
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from app.benchmarks import Call, Session, benchmark_database, run_asgi, run_wsgi, summarize
+from app.models import Club, Post
+
+ENDPOINTS = ['like', 'join', 'follow', 'search', 'create']
+MODES = ['wsgi', 'asgi-sync', 'asgi']
+SEARCH_QUERIES = ['chess', 'club', 'mus', 'chses', 'book', 'art', 'z']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the AJAX interaction endpoints (requests/second and p99 latency) through the '
+        'WSGI handler, the stock ASGI handler (sync views) and Bloom.asgi (async views), '
+        'against a throwaway database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight at once')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--clubs', type=int, default=200)
+        parser.add_argument('--endpoint', choices=ENDPOINTS, action='append', help='Only run these endpoints')
+        parser.add_argument('--mode', choices=MODES, action='append', help='Only run these modes')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = self.run(options)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def run(self, options):
+        sessions, posts, clubs = self.make_data(options['users'], options['clubs'])
+
+        # Imported here so the ASGI app is built against the benchmark settings
+        from Bloom.asgi import application as bloom_asgi
+        applications = {'asgi-sync': get_asgi_application(), 'asgi': bloom_asgi}
+
+        results = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'endpoints': {},
+        }
+        self.stdout.write(f'{"endpoint":<8} {"mode":<10} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"errors":>7}')
+        for endpoint in options['endpoint'] or ENDPOINTS:
+            results['endpoints'][endpoint] = {}
+            for mode in options['mode'] or MODES:
+                calls = self.calls(endpoint, mode, options['requests'], sessions, posts, clubs)
+                if mode == 'wsgi':
+                    run = run_wsgi(calls, options['concurrency'])
+                else:
+                    run = run_asgi(calls, options['concurrency'], applications[mode])
+                summary = summarize(*run)
+                results['endpoints'][endpoint][mode] = summary
+                self.stdout.write(
+                    f'{endpoint:<8} {mode:<10} {summary["rps"]:>9} {summary["p50_ms"]:>9} '
+                    f'{summary["p99_ms"]:>9} {summary["errors"]:>7}'
+                )
+        return results
+
+    def make_data(self, user_count, club_count):
+        users = [User.objects.create_user(f'bench{i}', password=None) for i in range(user_count)]
+        names = ['Chess Club', 'Speed Chess', 'Music Club', 'Book Club', 'Art Club']
+        names += [f'Club {i}' for i in range(club_count - len(names))]
+        clubs = Club.objects.bulk_create([Club(name=name) for name in names])
+        posts = [
+            Post.objects.create(user=users[i % user_count], club=clubs[i % len(clubs)],
+                                title=f'Post {i}', content='benchmark post', slug=f'bench-post-{i}')
+            for i in range(100)
+        ]
+        return [Session(user) for user in users], posts, clubs
+
+    def calls(self, endpoint, mode, count, sessions, posts, clubs):
+        """`count` requests to `endpoint`, spread over every user"""
+        users = itertools.cycle(sessions)
+        if endpoint == 'like':
+            return [Call('POST', f'/like-post/{posts[i % len(posts)].slug}/', next(users)) for i in range(count)]
+        if endpoint == 'join':
+            return [Call('POST', '/join_club/', next(users), data={'club_id': clubs[i % len(clubs)].id})
+                    for i in range(count)]
+        if endpoint == 'follow':
+            return [Call('POST', f'/follow-club/{clubs[i % len(clubs)].id}/', next(users)) for i in range(count)]
+        if endpoint == 'search':
+            return [Call('GET', '/search-clubs/', next(users), query={'q': SEARCH_QUERIES[i % len(SEARCH_QUERIES)]})
+                    for i in range(count)]
+        return [Call('POST', '/create-club/', next(users), json_body={'name': f'Bench {mode} {i}'})
+                for i in range(count)]
@@ -0,0 +1,143 @@
+import asyncio
+import gc
+import json
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from app import live
+from app.benchmarks import Call, Session, asgi_scope, benchmark_database, summarize
+from app.models import Club
+
+
+def _rss_kb():
+    """Current resident set size in KB (Linux), falling back to the peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Stream:
+    """One idle SSE client driving the ASGI app in-process"""
+
+    def __init__(self, application, call):
+        self.application = application
+        self.call = call
+        self.chunks = asyncio.Queue()
+        self.disconnect = asyncio.Event()
+        self.task = None
+
+    async def receive(self):
+        if not hasattr(self, '_sent'):
+            self._sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            self.chunks.put_nowait(message['body'])
+
+    def open(self):
+        self.task = asyncio.ensure_future(self.application(asgi_scope(self.call), self.receive, self.send))
+
+    async def close(self):
+        self.disconnect.set()
+        try:
+            await asyncio.wait_for(self.task, 5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.task.cancel()
+
+
+class Command(BaseCommand):
+    help = (
+        'Opens many idle live-update (SSE) streams through Bloom.asgi in one process and reports '
+        'how many it holds, the memory each costs and how long a broadcast takes to reach them all'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=1000, help='Concurrent idle streams to open')
+        parser.add_argument('--batch', type=int, default=200, help='Streams opened at a time')
+        parser.add_argument('--broadcasts', type=int, default=20, help='Events published once all streams are open')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = asyncio.run(self.run(options))
+
+        for key, value in results.items():
+            self.stdout.write(f'{key:<28} {value}')
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    async def run(self, options):
+        from asgiref.sync import sync_to_async
+        from Bloom.asgi import application
+
+        club, session = await sync_to_async(self.make_data)()
+        call = Call('GET', '/live/', session)
+        broker = live.get_broker()
+
+        # Warm up (imports, URL resolver, session cache) before measuring
+        warm = Stream(application, call)
+        warm.open()
+        await warm.chunks.get()
+        await warm.close()
+
+        gc.collect()
+        tracemalloc.start()
+        python_before = tracemalloc.get_traced_memory()[0]
+        rss_before = _rss_kb()
+
+        # Note: open time includes tracemalloc's overhead, it's slower than real-world connects
+        streams = []
+        start = time.perf_counter()
+        for first in range(0, options['streams'], options['batch']):
+            batch = [Stream(application, call) for _ in range(min(options['batch'], options['streams'] - first))]
+            for stream in batch:
+                stream.open()
+            # The first chunk ("retry: ...") means the stream is subscribed
+            await asyncio.gather(*(stream.chunks.get() for stream in batch))
+            streams.extend(batch)
+        open_seconds = time.perf_counter() - start
+
+        gc.collect()
+        python_per_stream = (tracemalloc.get_traced_memory()[0] - python_before) / len(streams)
+        rss_per_stream = (_rss_kb() - rss_before) * 1024 / len(streams)
+        tracemalloc.stop()
+
+        # Fan one event out to every stream and time until the last one has it
+        latencies = []
+        for i in range(options['broadcasts']):
+            start = time.perf_counter()
+            broker.publish(live.club_channel(club.id), {'type': 'counts', 'post': f'post-{i}',
+                                                         'like_count': i, 'comment_count': 0})
+            await asyncio.gather(*(stream.chunks.get() for stream in streams))
+            latencies.append(time.perf_counter() - start)
+        broadcast = summarize(latencies, [200] * len(latencies), sum(latencies))
+
+        held = broker.subscriber_count()
+        await asyncio.gather(*(stream.close() for stream in streams))
+
+        return {
+            'streams': len(streams),
+            'subscribers_held': held,
+            'open_seconds': round(open_seconds, 2),
+            'python_bytes_per_stream': round(python_per_stream),
+            'rss_bytes_per_stream': round(rss_per_stream),
+            'broadcast_p50_ms': broadcast['p50_ms'],
+            'broadcast_p99_ms': broadcast['p99_ms'],
+            'subscribers_after_close': broker.subscriber_count(),
+        }
+
+    def make_data(self):
+        user = User.objects.create_user('bench', password=None)
+        club = Club.objects.create(name='Chess Club')
+        user.profile.clubs.add(club)
+        return club, Session(user)
@@ -0,0 +1,87 @@
+import itertools
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.test.utils import override_settings
+from app.benchmarks import Call, Session, benchmark_database, run_wsgi, summarize
+from app.datagen import SCALES, Generator
+from app.models import Club
+
+PAGES = ['club_page', 'search_clubs', 'aboutus']
+MODES = ['uncached', 'cached']
+SEARCH_QUERIES = ['chess', 'club', 'mus', 'chses', 'book', 'late night', 'z']
+# What a browser sends
+BROWSER_HEADERS = {'accept-encoding': 'gzip, deflate, br'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the page cache (app/http_cache.py): requests/second and latency of club pages, '
+        'club search and about us with PAGE_CACHE_ENABLED off and on, against a throwaway database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='tiny', help='Dataset generated into the throwaway database')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per page and mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+        parser.add_argument('--users', type=int, default=20, help='Distinct logged-in viewers of the club pages')
+        parser.add_argument('--clubs', type=int, default=5, help='Distinct club pages visited')
+        parser.add_argument('--page', choices=PAGES, action='append', help='Only run these pages')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.stdout.write(f'Generating the {options["scale"]} dataset...')
+            Generator(**SCALES[options['scale']]).run()
+            results = self.run(options)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def run(self, options):
+        users = User.objects.order_by('id')[:options['users']]
+        sessions = [Session(user) for user in users]
+        # The busiest clubs, i.e. the heaviest pages
+        clubs = list(Club.objects.annotate(n=Count('posts')).order_by('-n', 'id')
+                     .values_list('id', flat=True)[:options['clubs']])
+
+        results = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'pages': {},
+        }
+        self.stdout.write(f'{"page":<13} {"mode":<9} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"errors":>7}')
+        for page in options['page'] or PAGES:
+            results['pages'][page] = {}
+            calls = self.calls(page, options['requests'], sessions, clubs)
+            for mode in MODES:
+                with override_settings(PAGE_CACHE_ENABLED=mode == 'cached'):
+                    if mode == 'cached':
+                        # Warm it: one request per distinct URL / viewer, as after a few minutes of traffic
+                        distinct = len(set(SEARCH_QUERIES)) if page == 'search_clubs' else len(sessions) * len(clubs)
+                        run_wsgi(calls[:distinct], options['concurrency'])
+                    summary = summarize(*run_wsgi(calls, options['concurrency']))
+                results['pages'][page][mode] = summary
+                self.stdout.write(
+                    f'{page:<13} {mode:<9} {summary["rps"]:>9} {summary["p50_ms"]:>9} '
+                    f'{summary["p99_ms"]:>9} {summary["errors"]:>7}'
+                )
+            uncached, cached = results['pages'][page]['uncached'], results['pages'][page]['cached']
+            if uncached['rps']:
+                self.stdout.write(f'{"":<13} {"speedup":<9} {cached["rps"] / uncached["rps"]:>8.1f}x')
+        return results
+
+    def calls(self, page, count, sessions, clubs):
+        """`count` requests to `page`; club pages cycle through every (viewer, club) pair"""
+        if page == 'club_page':
+            pairs = itertools.cycle(itertools.product(clubs, sessions))
+            return [Call('GET', f'/club/{club_id}/', session, extra_headers=BROWSER_HEADERS)
+                    for club_id, session in itertools.islice(pairs, count)]
+        if page == 'search_clubs':
+            return [Call('GET', '/search-clubs/', query={'q': SEARCH_QUERIES[i % len(SEARCH_QUERIES)]},
+                         extra_headers=BROWSER_HEADERS) for i in range(count)]
+        return [Call('GET', '/aboutus/', extra_headers=BROWSER_HEADERS) for i in range(count)]
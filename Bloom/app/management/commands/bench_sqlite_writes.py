@@ -0,0 +1,88 @@
+import itertools
+import json
+
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from app.benchmarks import Call, Session, benchmark_database, run_wsgi, summarize
+from app.models import Club, Post
+from Bloom.database import PROFILES
+
+WORKLOADS = ['like', 'post', 'join', 'mixed']
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent write benchmark (likes, new posts, joins) through the WSGI handler, once per '
+        'SQLite connection profile (Bloom/database.py), reporting write throughput, tail latency '
+        'and failed ("database is locked") requests'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=600, help='Requests per workload and profile')
+        parser.add_argument('--concurrency', type=int, default=16, help='Worker threads')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20,
+                            help='Posts the likes are spread over (fewer = more contention on the same rows)')
+        parser.add_argument('--workload', choices=WORKLOADS, action='append', help='Only run these workloads')
+        parser.add_argument('--profile', choices=PROFILES, action='append', help='Only run these profiles')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        results = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'profiles': {},
+        }
+        self.stdout.write(f'{"profile":<11} {"workload":<8} {"writes/s":>9} {"p50 ms":>9} '
+                          f'{"p95 ms":>9} {"p99 ms":>9} {"errors":>7}')
+        for profile in options['profile'] or PROFILES:
+            with benchmark_database(profile):
+                results['profiles'][profile] = self.run(profile, options)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def run(self, profile, options):
+        sessions, posts, clubs = self.make_data(options['users'], options['posts'])
+        with connection.cursor() as cursor:
+            journal = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+
+        handler = WSGIHandler()
+        results = {'journal_mode': journal}
+        for workload in options['workload'] or WORKLOADS:
+            calls = self.calls(workload, options['requests'], sessions, posts, clubs)
+            summary = summarize(*run_wsgi(calls, options['concurrency'], handler))
+            results[workload] = summary
+            self.stdout.write(
+                f'{profile:<11} {workload:<8} {summary["rps"]:>9} {summary["p50_ms"]:>9} '
+                f'{summary["p95_ms"]:>9} {summary["p99_ms"]:>9} {summary["errors"]:>7}'
+            )
+        return results
+
+    def make_data(self, user_count, post_count):
+        users = [User.objects.create_user(f'bench{i}', password=None) for i in range(user_count)]
+        clubs = Club.objects.bulk_create([Club(name=f'Club {i}') for i in range(20)])
+        posts = [
+            Post.objects.create(user=users[i % user_count], club=clubs[i % len(clubs)],
+                                content='benchmark post', slug=f'bench-post-{i}')
+            for i in range(post_count)
+        ]
+        return [Session(user) for user in users], posts, clubs
+
+    def calls(self, workload, count, sessions, posts, clubs):
+        """`count` write requests, spread over every user"""
+        users = itertools.cycle(sessions)
+        make = {
+            # Read-then-write transactions on a few hot rows (the lock upgrade case)
+            'like': lambda i: Call('POST', f'/like-post/{posts[i % len(posts)].slug}/', next(users)),
+            # Inserts, with the timeline fan-out
+            'post': lambda i: Call('POST', '/', next(users), data={'content': f'Benchmark post number {i}'}),
+            # m2m add / remove and the member count
+            'join': lambda i: Call('POST', '/join_club/', next(users), data={'club_id': clubs[i % len(clubs)].id}),
+        }
+        kinds = itertools.cycle(['like', 'post', 'join'])
+        return [make[workload if workload != 'mixed' else next(kinds)](i) for i in range(count)]
@@ -0,0 +1,151 @@
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from app.benchmarks import benchmark_database, summarize
+from app.datagen import SCALES, Generator
+from app.models import Club, Post
+
+SCENARIOS = ['home_all', 'home_following', 'club_page', 'search_clubs', 'like_post', 'join_club']
+SEARCH_QUERIES = ['chess', 'club', 'mus', 'chses', 'book', 'late night', 'z']
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency and query counts of the main views (feed, club page, club search, '
+        'like, join) and writes the results as JSON so runs can be compared'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small',
+                            help='Dataset generated into a throwaway database')
+        parser.add_argument('--existing', action='store_true',
+                            help='Run against the configured database instead (like/join are toggled back)')
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario first')
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append', help='Only run these scenarios')
+        parser.add_argument('--output', help='Where to write the JSON results (default: bench_results/views-<time>.json)')
+        parser.add_argument('--compare', help='Earlier results file to print the differences against')
+
+    def handle(self, *args, **options):
+        # Even counts, so every like / join is undone by the next request
+        options['iterations'] += options['iterations'] % 2
+        options['warmup'] += options['warmup'] % 2
+
+        if options['existing']:
+            database = override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'])
+        else:
+            database = benchmark_database()
+
+        with database:
+            if not options['existing']:
+                self.stdout.write(f'Generating the {options["scale"]} dataset...')
+                Generator(**SCALES[options['scale']]).run()
+            results = {'meta': self.meta(options), 'scenarios': {}}
+            self.run(options, results['scenarios'])
+
+        output = options['output'] or str(
+            settings.BASE_DIR / 'bench_results' / f'views-{datetime.now():%Y%m%d-%H%M%S}.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def meta(self, options):
+        """What was measured where, so result files stay comparable"""
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, cwd=settings.BASE_DIR).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit,
+            'dataset': 'existing' if options['existing'] else options['scale'],
+            'rows': {
+                'users': User.objects.count(),
+                'clubs': Club.objects.count(),
+                'posts': Post.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'sqlite': sqlite3.sqlite_version if connection.vendor == 'sqlite' else None,
+        }
+
+    def run(self, options, results):
+        # The most connected user is the heaviest "following" feed; the biggest club the heaviest club page
+        user = User.objects.annotate(n=Count('profile__clubs')).order_by('-n', 'id').first()
+        club = Club.objects.annotate(n=Count('posts')).order_by('-n', 'id').first()
+        post = Post.objects.exclude(slug='').order_by('-like_count', 'id').first()
+        if user is None or club is None or post is None:
+            raise CommandError('Need at least one user, club and post (run generate_data first)')
+
+        client = Client()
+        client.force_login(user)
+        requests = {
+            'home_all': lambda i: client.get(reverse('home')),
+            'home_following': lambda i: client.get(reverse('home'), {'feed': 'following'}),
+            'club_page': lambda i: client.get(reverse('club_page', args=[club.id])),
+            'search_clubs': lambda i: client.get(reverse('search_clubs'), {'q': SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}),
+            'like_post': lambda i: client.post(reverse('like_post', args=[post.slug])),
+            'join_club': lambda i: client.post(reverse('join_club'), {'club_id': club.id}),
+        }
+
+        self.stdout.write(f'{"scenario":<16} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"errors":>7}')
+        for name in options['scenario'] or SCENARIOS:
+            make_request = requests[name]
+            for i in range(options['warmup']):
+                make_request(i)
+
+            latencies, statuses, queries = [], [], []
+            for i in range(options['iterations']):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = make_request(i)
+                    latencies.append(time.perf_counter() - start)
+                statuses.append(response.status_code)
+                queries.append(len(captured))
+
+            summary = summarize(latencies, statuses, sum(latencies))
+            del summary['rps']  # sequential requests, throughput isn't meaningful here
+            summary['queries_median'] = sorted(queries)[len(queries) // 2]
+            summary['queries_max'] = max(queries)
+            results[name] = summary
+            self.stdout.write(
+                f'{name:<16} {summary["p50_ms"]:>8} {summary["p95_ms"]:>8} {summary["p99_ms"]:>8} '
+                f'{summary["queries_median"]:>8} {summary["errors"]:>7}'
+            )
+
+    def compare(self, path, results):
+        with open(path) as f:
+            before = json.load(f)
+        self.stdout.write(f'\nCompared to {path} ({before["meta"].get("commit")}, {before["meta"].get("dataset")}):')
+        self.stdout.write(f'{"scenario":<16} {"p50 ms":>18} {"queries":>12}')
+        for name, now in results['scenarios'].items():
+            old = before['scenarios'].get(name)
+            if old is None:
+                continue
+            change = (now['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            self.stdout.write(
+                f'{name:<16} {old["p50_ms"]:>7} -> {now["p50_ms"]:<7} ({change:+.0f}%) '
+                f'{old["queries_median"]:>4} -> {now["queries_median"]:<4}'
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from app import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Applies the time decay to the trending hot scores (moves their epoch up to now). '
+        'Run it periodically, e.g. hourly from cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every score from the like / comment counters instead')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            scored = trending.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt hot scores, {scored} posts are trending'))
+            return
+        zeroed = trending.compact()
+        self.stdout.write(self.style.SUCCESS(f'Compacted hot scores, {zeroed} posts decayed out of trending'))
@@ -0,0 +1,94 @@
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from app.models import Club, ClubAffinity, Like, Post, Profile, TimelineEntry
+from app.feeds import (
+    comment_queryset, encode_cursor, feed_queryset, page_queryset, trending_queryset, with_card_data,
+)
+
+
+def canonical_queries():
+    """
+    (name, queryset) for every query the hot views run, built the same way the views build them.
+    The ids are placeholders, only the shape of the query matters to the planner.
+    """
+    user = User(pk=1)
+    club = Club(pk=1)
+    cursor = encode_cursor(datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+    timeline = TimelineEntry.objects.filter(user=user)
+    by_post = ('date_posted', 'post_id')
+    by_comment = ('date_commented', 'id')
+
+    return [
+        ('feed_all', page_queryset(feed_queryset(user))),
+        ('feed_all_next_page', page_queryset(feed_queryset(user), cursor)),
+        ('feed_club', page_queryset(feed_queryset(user, club=club))),
+        ('feed_club_next_page', page_queryset(feed_queryset(user, club=club), cursor)),
+        ('feed_following', page_queryset(timeline, key=by_post)),
+        ('feed_following_next_page', page_queryset(timeline, cursor, key=by_post)),
+        ('feed_trending', trending_queryset(user)),
+        ('feed_trending_next_page', trending_queryset(user, offset=40)),
+        # in_bulk() drops the default ordering
+        ('feed_following_posts', with_card_data(Post.objects.filter(pk__in=[1, 2, 3]), user).order_by()),
+        ('post_by_slug', Post.objects.filter(slug='some-post')),
+        ('slug_probe', Post.objects.filter(slug__in=['a', 'b']).order_by().values_list('slug', flat=True)),
+        ('like_by_user', Like.objects.filter(post_id=1, user=user).order_by('-created_at')[:1]),
+        ('likes_of_user', Like.objects.filter(user=user, post_id__in=[1, 2, 3]).order_by().values_list('post_id', flat=True)),
+        ('post_comments', page_queryset(comment_queryset(1), key=by_comment)),
+        ('post_comments_next_page', page_queryset(comment_queryset(1), cursor, key=by_comment)),
+        ('club_directory', Club.objects.order_by('name').values('id', 'name')),
+        ('user_club_ids', Profile.clubs.through.objects.filter(profile__user_id=1).values_list('club_id', flat=True)),
+        ('club_members', Profile.clubs.through.objects.filter(club_id__in=[1, 2]).values_list('club_id', flat=True)),
+        ('similar_clubs', ClubAffinity.objects.filter(club_id=1).exclude(other_id=1)
+                          .order_by('-score').values_list('other_id', 'score')[:20]),
+    ]
+
+
+def plan_problems(plan):
+    """The lines of an EXPLAIN QUERY PLAN that mean a full table scan or a sort in a temp B-tree"""
+    problems = []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE'):
+            problems.append(detail)
+        # "SCAN x USING [COVERING] INDEX" walks an index in order (and stops at the LIMIT), that's fine
+        elif detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail \
+                and detail != 'SCAN CONSTANT ROW':
+            problems.append(detail)
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs EXPLAIN QUERY PLAN on the queries the hot views make and fails if any of them '
+        'does a full table scan or sorts in a temporary B-tree'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just the bad ones')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN checks are written for SQLite')
+
+        failures = 0
+        for name, queryset in canonical_queries():
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[3] for row in cursor.fetchall()]
+
+            problems = plan_problems(plan)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{name}: {"; ".join(problems)}'))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if problems or options['verbose_plans']:
+                for detail in plan:
+                    self.stdout.write(f'    {detail}')
+
+        if failures:
+            raise CommandError(f'{failures} queries scan a whole table or sort in a temp B-tree')
+        self.stdout.write(self.style.SUCCESS('All query plans use indexes'))
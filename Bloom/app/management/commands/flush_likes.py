@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from app.like_buffer import buffer_from_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays like intents that the write-behind buffer logged but never wrote to the '
+        'database, from web processes that are no longer running (e.g. after a crash)'
+    )
+
+    def handle(self, *args, **options):
+        changed = buffer_from_settings(interval=0).recover()
+        self.stdout.write(self.style.SUCCESS(f'Replayed {changed} buffered like intents'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.datagen import SCALES, TIMELINE_DEPTH, Generator
+
+class Command(BaseCommand):
+    help = 'Bulk-generates a synthetic dataset (users, clubs, memberships, posts, likes, comments) with skewed popularity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help='Preset sizes, the options below override them')
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--clubs', type=int)
+        parser.add_argument('--posts', type=int)
+        parser.add_argument('--likes-per-post', type=int, help='Average likes per post (heavy-tailed)')
+        parser.add_argument('--comments-per-post', type=int, help='Average comments per post (heavy-tailed)')
+        parser.add_argument('--memberships-per-user', type=int, default=5)
+        parser.add_argument('--days', type=int, default=365, help='Spread posts over this many days')
+        parser.add_argument('--timeline-depth', type=int, default=TIMELINE_DEPTH,
+                            help='Newest posts per club copied into members\' following timelines')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='gen', help='Username prefix (generated users are <prefix>_<n>)')
+        parser.add_argument('--password', default='bloom-password', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        sizes = dict(SCALES[options['scale']])
+        for name in sizes:
+            if options[name] is not None:
+                sizes[name] = options[name]
+
+        generator = Generator(
+            **sizes,
+            memberships_per_user=options['memberships_per_user'],
+            days=options['days'],
+            timeline_depth=options['timeline_depth'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+        try:
+            totals = generator.run()
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.stdout.write(
+            self.style.SUCCESS('Generated ' + ', '.join(f'{count} {name}' for name, count in totals.items()))
+        )
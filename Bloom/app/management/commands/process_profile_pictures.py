@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from app.images import process_profile_picture
+from app.models import Profile
+
+class Command(BaseCommand):
+    help = 'Builds the resized profile picture derivatives that are missing or out of date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every profile picture, not just stale ones')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        if not options['all']:
+            profiles = profiles.exclude(profile_picture_source=F('profile_picture'))
+
+        processed = 0
+        for profile_id in profiles.values_list('id', flat=True).iterator():
+            try:
+                process_profile_picture(profile_id)
+                processed += 1
+            except (OSError, ValueError) as e:
+                self.stdout.write(
+                    self.style.WARNING(f'Skipped profile {profile_id}: {e}')
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Processed {processed} profile pictures')
+        )
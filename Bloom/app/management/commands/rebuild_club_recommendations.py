@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from app import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the club co-membership table behind "clubs you might like" from every '
+        'membership (joins and leaves keep it up to date after that)'
+    )
+
+    def handle(self, *args, **options):
+        pairs = recommendations.rebuild(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt club recommendations, {pairs} club pairs'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from app.models import Post, Like, Comment
+
+class Command(BaseCommand):
+    help = 'Recomputes Post.like_count and Post.comment_count from the Like and Comment tables'
+
+    def handle(self, *args, **options):
+        def count_of(model):
+            counts = (
+                model.objects.filter(post=OuterRef('pk'))
+                .order_by()
+                .values('post')
+                .annotate(total=Count('*'))
+                .values('total')
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        like_total = count_of(Like)
+        comment_total = count_of(Comment)
+
+        with transaction.atomic():
+            # Only touch the rows that actually drifted
+            drifted = Post.objects.annotate(
+                real_likes=like_total,
+                real_comments=comment_total,
+            ).exclude(like_count=F('real_likes'), comment_count=F('real_comments'))
+            updated = Post.objects.filter(pk__in=drifted.values('pk')).update(
+                like_count=like_total,
+                comment_count=comment_total,
+                render_version=F('render_version') + 1,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt counters, fixed {updated} drifted posts')
+        )
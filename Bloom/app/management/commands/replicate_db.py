@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from app.replication import sync_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Keeps the read replica SQLite file in sync with the primary (a stand-in for real '
+        'replication when running everything on one machine)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between copies (keep it well under REPLICA_PIN_SECONDS)')
+        parser.add_argument('--once', action='store_true', help='Copy once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                seconds = sync_replica()
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'Replica synced in {seconds * 1000:.0f} ms')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
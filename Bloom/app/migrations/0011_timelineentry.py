@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    Post = apps.get_model('app', 'Post')
+    Profile = apps.get_model('app', 'Profile')
+    TimelineEntry = apps.get_model('app', 'TimelineEntry')
+
+    for profile in Profile.objects.prefetch_related('clubs'):
+        club_ids = [club.id for club in profile.clubs.all()]
+        posts = Post.objects.filter(club_id__in=club_ids).exclude(slug='').values_list('id', 'club_id', 'date_posted')
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=profile.user_id, post_id=post_id, club_id=club_id, date_posted=date_posted)
+                for post_id, club_id, date_posted in posts
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_post_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_posted', models.DateTimeField()),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.club')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='app.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Timeline Entry',
+                'verbose_name_plural': 'Timeline Entries',
+                'indexes': [models.Index(fields=['user', '-date_posted', '-post'], name='timeline_user_recent_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# FTS5 index over Post.title / Post.content. It's an "external content" table, so the
+# text lives only in app_post; the triggers keep the index in sync on every insert,
+# delete and title/content edit (counter updates don't touch it). Schema changes to Post
+# drop the triggers on SQLite; they're recreated after every migrate (post_search.ensure_fts_triggers).
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE app_post_fts USING fts5(
+        title, content, content='app_post', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER app_post_fts_insert AFTER INSERT ON app_post BEGIN
+        INSERT INTO app_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER app_post_fts_delete AFTER DELETE ON app_post BEGIN
+        INSERT INTO app_post_fts(app_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER app_post_fts_update AFTER UPDATE OF title, content ON app_post BEGIN
+        INSERT INTO app_post_fts(app_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO app_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    # Index the posts that already exist
+    "INSERT INTO app_post_fts(app_post_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS app_post_fts_update',
+    'DROP TRIGGER IF EXISTS app_post_fts_delete',
+    'DROP TRIGGER IF EXISTS app_post_fts_insert',
+    'DROP TABLE IF EXISTS app_post_fts',
+]
+
+
+def run_sqlite_only(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite only; other databases fall back to LIKE search (see app/post_search.py)
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite_only(CREATE_SQL), run_sqlite_only(DROP_SQL)),
+    ]
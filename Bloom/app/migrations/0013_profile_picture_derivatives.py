@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_post_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_avatar',
+            field=models.ImageField(blank=True, default='', editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_large',
+            field=models.ImageField(blank=True, default='', editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_source',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+    ]
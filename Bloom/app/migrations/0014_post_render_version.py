@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+# AddField rebuilds app_post on SQLite, which drops the FTS triggers from 0012_post_fts
+from app.migrations._fts_triggers import restore_fts_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_profile_picture_derivatives'),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards (RemoveField rebuilds the table too)
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='render_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:11
+
+import time
+
+from django.conf import settings
+from django.db import migrations, models
+
+# AddField rebuilds app_post on SQLite, which drops the FTS triggers (see 0014_post_render_version)
+from app.migrations._fts_triggers import restore_fts_triggers
+
+# Same weights and half life as trending.py at the time of writing, run `manage.py compact_hot_scores --rebuild`
+# after changing them
+POST_WEIGHT, LIKE_WEIGHT, COMMENT_WEIGHT = 1.0, 1.0, 2.0
+HALF_LIFE_SECONDS = 12 * 3600
+
+
+def score_existing_posts(apps, schema_editor):
+    """Create the epoch row and score the posts there are, as if every like / comment came in with the post"""
+    TrendingState = apps.get_model('app', 'TrendingState')
+    now = time.time()
+    TrendingState.objects.create(pk=1, epoch=now)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'UPDATE app_post SET hot_score = (%s + like_count * %s + comment_count * %s)'
+        ' * power(2, ((julianday(date_posted) - 2440587.5) * 86400 - %s) / %s)',
+        [POST_WEIGHT, LIKE_WEIGHT, COMMENT_WEIGHT, now, HALF_LIFE_SECONDS],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Trending State',
+            },
+        ),
+        # Runs last when migrating backwards (RemoveField rebuilds the table too)
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ),
+        migrations.RunPython(score_existing_posts, migrations.RunPython.noop),
+    ]
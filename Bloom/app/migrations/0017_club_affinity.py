@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Sqrt
+
+
+def backfill_affinity(apps, schema_editor):
+    """Count the existing memberships (later changes are counted by the membership signal)"""
+    Profile = apps.get_model('app', 'Profile')
+    ClubAffinity = apps.get_model('app', 'ClubAffinity')
+    Membership = Profile.clubs.through
+
+    pairs = (
+        Membership.objects.filter(profile__clubs__isnull=False)
+        .values('club_id', 'profile__clubs')
+        .annotate(members=Count('*'))
+        .values_list('club_id', 'profile__clubs', 'members')
+    )
+    ClubAffinity.objects.bulk_create(
+        [ClubAffinity(club_id=club_id, other_id=other_id, members=members) for club_id, other_id, members in pairs],
+        batch_size=500,
+    )
+
+    def size(column):
+        return Subquery(ClubAffinity.objects.filter(club=OuterRef(column), other=OuterRef(column)).values('members')[:1])
+    ClubAffinity.objects.update(score=F('members') / Sqrt(size('club') * size('other')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_post_hot_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClubAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('members', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.club')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.club')),
+            ],
+            options={
+                'verbose_name': 'Club Affinity',
+                'verbose_name_plural': 'Club Affinities',
+                'indexes': [models.Index(fields=['club', '-score'], name='club_affinity_top_idx')],
+                'unique_together': {('club', 'other')},
+            },
+        ),
+        migrations.RunPython(backfill_affinity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_club_affinity'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profile',
+            name='profile_picture_large',
+        ),
+    ]
@@ -0,0 +1,34 @@
+"""
+The FTS triggers as 0012_post_fts created them, frozen for migrations that rebuild app_post
+(the leading underscore keeps Django from loading this as a migration). Don't import app
+code from here: migrations must keep running whatever happens to it.
+"""
+
+# Adding a column makes SQLite rebuild app_post (create a copy, drop the old table,
+# rename), and dropping the old table drops the triggers with it. The FTS rows themselves
+# survive (ids don't change), so only the triggers need restoring.
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS app_post_fts_insert AFTER INSERT ON app_post BEGIN
+        INSERT INTO app_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_post_fts_delete AFTER DELETE ON app_post BEGIN
+        INSERT INTO app_post_fts(app_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_post_fts_update AFTER UPDATE OF title, content ON app_post BEGIN
+        INSERT INTO app_post_fts(app_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO app_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+
+def restore_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in TRIGGERS_SQL:
+        schema_editor.execute(statement)
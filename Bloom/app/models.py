@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, router
+from django.db.models import F
 from django.contrib.auth import get_user_model # To be able to identify the user making the post
 
 User = get_user_model()     # Get the active User model for the project
@@ -27,21 +28,67 @@ class Post(models.Model):
     # TIMESTAMP
     date_posted = models.DateTimeField(auto_now_add=True)
 
+    # COUNTERS
+    # Denormalized so feeds never have to COUNT(*) likes/comments.
+    # Kept in sync by the Like/Comment signals in signals.py (rebuild with `manage.py rebuild_counters`)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Bumped on every edit and counter change, it's part of the cached post card key (see fragments.py)
+    render_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # TRENDING
+    # Decaying popularity, scaled to TrendingState.epoch (see trending.py). Kept up to date by the
+    # same signal UPDATEs as the counters, decayed by `manage.py compact_hot_scores`
+    hot_score = models.FloatField(default=0, editable=False)
+
     # METADATA
     class Meta:
         # Orders posts by date, newest first (descending order)
         ordering = ['-date_posted'] 
+        indexes = [
+            # The "all" feed and a club page, newest first with the id tiebreak (see feeds.paginate)
+            models.Index(fields=['-date_posted', '-id'], name='post_recent_idx'),
+            models.Index(fields=['club', '-date_posted', '-id'], name='post_club_recent_idx'),
+            # The trending feed, top N by score
+            models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ]
         verbose_name = "Social Post"
 
     def __str__(self):
         # Displays the username and the start of the content
         return f"{self.user.username}: {self.content[:20]}..."
 
+    def save(self, *args, **kwargs):
+        """
+        Never write the counters (or hot_score) back from a (possibly stale) instance, only the signals touch them.
+        New posts start with the trending score of one post made now.
+        Edits bump render_version in the database so cached post cards get re-rendered, and the instance
+        has the new number before the post_save receivers see it.
+        """
+        skip = ('like_count', 'comment_count', 'hot_score', 'render_version')
+        if self._state.adding:
+            from .trending import starting_score
+            self.hot_score = starting_score()
+        else:
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    f.name for f in self._meta.concrete_fields
+                    if not f.primary_key and f.name not in skip
+                ]
+            else:
+                kwargs['update_fields'] = [f for f in kwargs['update_fields'] if f != 'render_version']
+            # Read back rather than += 1: likes may have bumped it since this instance was loaded
+            using = kwargs.get('using') or router.db_for_write(Post, instance=self)
+            Post.objects.using(using).filter(pk=self.pk).update(render_version=F('render_version') + 1)
+            self.refresh_from_db(using=using, fields=['render_version'])
+        super().save(*args, **kwargs)
+
   # trying to add like and comment functionality (edgar)
 
     def get_like_count(self):
         """Get the total number of likes for this post"""
-        return self.likes.count()
+        return self.like_count
     
     def is_liked_by_user(self, user):
         """Check if a specific user has liked this post"""
@@ -51,7 +98,7 @@ class Post(models.Model):
     
     def get_comment_count(self):
         """Get the total number of comments for this post"""
-        return self.post_comments.count()
+        return self.comment_count
 
 class Like(models.Model):
     """Model to track which users liked which posts"""
@@ -76,6 +123,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['date_commented']
+        indexes = [
+            # A post's comments in the order they're shown
+            models.Index(fields=['post', 'date_commented'], name='comment_post_date_idx'),
+        ]
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
 
@@ -96,10 +147,19 @@ class Club(models.Model):
     def __str__(self):
         return self.name
 
+# Profile columns owned by app/images.py
+DERIVED_PICTURE_FIELDS = ('profile_picture_avatar', 'profile_picture_source')
+
 class Profile(models.Model):
     """Extended user profile with profile picture"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True, default=None)
+
+    # Resized, metadata-free WebP copy of profile_picture (made off the request path by app/images.py).
+    # Names are content hashes so they can be cached forever.
+    profile_picture_avatar = models.ImageField(blank=True, default='', editable=False)
+    # Which profile_picture the derivatives were made from (so a re-upload gets new ones)
+    profile_picture_source = models.CharField(max_length=255, blank=True, default='', editable=False)
     
     clubs = models.ManyToManyField(Club, blank=True, related_name='members')
 
@@ -109,9 +169,76 @@ class Profile(models.Model):
     
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+    def save(self, *args, **kwargs):
+        """Leave the derivative columns alone, they're written by the background image pipeline"""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in DERIVED_PICTURE_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     def get_profile_picture_url(self):
-        """Get the profile picture URL or a default"""
-        if self.profile_picture:
-            return self.profile_picture.url
-        return None  # Return None to use default placeholder in template
\ No newline at end of file
+        """Get the (avatar sized) profile picture URL or a default"""
+        if not self.profile_picture:
+            return None  # Return None to use default placeholder in template
+        # The derivative only exists for the picture it was made from; until then serve the original
+        if self.profile_picture_avatar and self.profile_picture_source == self.profile_picture.name:
+            return self.profile_picture_avatar.url
+        return self.profile_picture.url
+
+class TimelineEntry(models.Model):
+    """Precomputed "Groups you follow" feed: one row per (member, post in one of their clubs)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='+')
+    # Copied from the post so reading a page is a single index range scan
+    date_posted = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', '-date_posted', '-post'], name='timeline_user_recent_idx'),
+        ]
+        verbose_name = "Timeline Entry"
+        verbose_name_plural = "Timeline Entries"
+
+    def __str__(self):
+        return f"{self.post.slug} in {self.user.username}'s timeline"
+
+class ClubAffinity(models.Model):
+    """
+    How many members two clubs share, for "clubs you might like" (see recommendations.py).
+    The row with club == other holds the club's member count. Kept up to date by the membership signal.
+    """
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='+')
+    members = models.PositiveIntegerField(default=0)
+    # Cosine similarity of the two clubs' member vectors: members / sqrt(size(club) * size(other))
+    score = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ['club', 'other']
+        indexes = [
+            # A club's most similar clubs
+            models.Index(fields=['club', '-score'], name='club_affinity_top_idx'),
+        ]
+        verbose_name = "Club Affinity"
+        verbose_name_plural = "Club Affinities"
+
+    def __str__(self):
+        return f"{self.club_id} ~ {self.other_id}: {self.score:.2f}"
+
+class TrendingState(models.Model):
+    """Single row holding the epoch every Post.hot_score is scaled to (see trending.py)"""
+    SINGLETON = 1
+
+    # Unix time
+    epoch = models.FloatField()
+
+    class Meta:
+        verbose_name = "Trending State"
+
+    def __str__(self):
+        return f"Hot scores scaled to {self.epoch:.0f}"
@@ -0,0 +1,231 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware counts SQL queries and database time (an execute wrapper on
+every connection, added as it's opened), template render time (TimedDjangoTemplates,
+the template backend in settings.TEMPLATES) and wall time for every request. The
+numbers go out as a Server-Timing header and a structured log line on the
+'app.perf' logger, are aggregated per URL name for /stats/requests/, and are
+checked against settings.PERF_QUERY_BUDGETS.
+
+The hooks only do work while a request is being measured (a ContextVar holds the
+current request's counters, which also follows async views into sync_to_async
+threads), so the overhead is a couple of perf_counter() calls per query / render.
+
+Server-Timing goes by settings.PERF_SERVER_TIMING: 'staff' (the default) only sends it
+to staff users, or to everyone when DEBUG is on; True always, False never.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template as DjangoTemplate
+
+logger = logging.getLogger('app.perf')
+
+_current = ContextVar('app_perf_request', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than its budget (only raised with PERF_BUDGET_ACTION = 'raise')"""
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'template_time', 'rendering')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+
+# --- HOOKS ---
+
+def _timed_execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def _add_execute_wrapper(connection, **kwargs):
+    # The wrapper list belongs to the connection object and outlives reconnects, so only add it once
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class TimedTemplate(DjangoTemplate):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        # Nested renders (render_to_string inside a tag) are part of the outer one
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+            stats.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time counted (settings.TEMPLATES BACKEND)"""
+    # Not the template_rendered signal: it's only sent under the test runner, and before the render
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def install_hooks():
+    """Time queries on every connection: the ones opened from now on, and this thread's open ones"""
+    connection_created.connect(_add_execute_wrapper, dispatch_uid='app.perf')
+    for connection in connections.all(initialized_only=True):
+        _add_execute_wrapper(connection)
+
+
+# --- PER-VIEW AGGREGATES ---
+
+_totals_lock = threading.Lock()
+_totals = {}
+
+
+def _aggregate(view, stats, total):
+    with _totals_lock:
+        row = _totals.setdefault(view, {
+            'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'db_ms': 0.0,
+            'template_ms': 0.0, 'queries': 0, 'max_queries': 0, 'over_budget': 0,
+        })
+        row['requests'] += 1
+        row['total_ms'] += total * 1000
+        row['max_ms'] = max(row['max_ms'], total * 1000)
+        row['db_ms'] += stats.db_time * 1000
+        row['template_ms'] += stats.template_time * 1000
+        row['queries'] += stats.queries
+        row['max_queries'] = max(row['max_queries'], stats.queries)
+    return row
+
+
+def view_stats():
+    """Averages and maxima per URL name since the process started (or the last reset)"""
+    with _totals_lock:
+        rows = {view: dict(row) for view, row in _totals.items()}
+    for row in rows.values():
+        count = row['requests']
+        for key in ('total_ms', 'db_ms', 'template_ms'):
+            row[f'avg_{key}'] = round(row.pop(key) / count, 2)
+        row['avg_queries'] = round(row.pop('queries') / count, 2)
+        row['max_ms'] = round(row['max_ms'], 2)
+    return rows
+
+
+def reset_view_stats():
+    with _totals_lock:
+        _totals.clear()
+
+
+# --- MIDDLEWARE ---
+
+def _staff_only():
+    return getattr(settings, 'PERF_SERVER_TIMING', 'staff') == 'staff' and not settings.DEBUG
+
+
+class PerformanceMiddleware:
+    """Measure every request (put it first in MIDDLEWARE so the timing covers the whole stack)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        install_hooks()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        # request.user is lazy: only loaded if the Server-Timing check needs it
+        self.finish(request, response, stats, time.perf_counter() - start, getattr(request, 'user', None))
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+        # request.user can't be loaded lazily from here
+        user = await request.auser() if _staff_only() and hasattr(request, 'auser') else None
+        self.finish(request, response, stats, total, user)
+        return response
+
+    def finish(self, request, response, stats, total, user):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+
+        self.add_server_timing(response, stats, total, user)
+        _aggregate(view, stats, total)
+        logger.info(
+            'view=%s method=%s status=%s queries=%d db_ms=%.1f template_ms=%.1f total_ms=%.1f',
+            view, request.method, response.status_code, stats.queries,
+            stats.db_time * 1000, stats.template_time * 1000, total * 1000,
+            extra={'perf': {
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': stats.queries,
+                'db_ms': round(stats.db_time * 1000, 2),
+                'template_ms': round(stats.template_time * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+            }},
+        )
+        self.check_budget(view, stats)
+
+    def add_server_timing(self, response, stats, total, user):
+        if not getattr(settings, 'PERF_SERVER_TIMING', 'staff'):
+            return
+        if _staff_only() and not (user and user.is_staff):
+            return
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+            f'tpl;dur={stats.template_time * 1000:.1f};desc="templates", '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+    def check_budget(self, view, stats):
+        budget = getattr(settings, 'PERF_QUERY_BUDGETS', {}).get(view)
+        if budget is None or stats.queries <= budget:
+            return
+        with _totals_lock:
+            _totals[view]['over_budget'] += 1
+        message = f'{view} ran {stats.queries} queries (budget {budget})'
+        action = getattr(settings, 'PERF_BUDGET_ACTION', 'warn')
+        if action == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.log(logging.ERROR if action == 'error' else logging.WARNING, message)
@@ -0,0 +1,130 @@
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .feeds import with_card_data
+from .models import Post
+
+SEARCH_PAGE_SIZE = 20
+
+_WORD_RE = re.compile(r'\w+')
+
+# The triggers that keep app_post_fts in sync with app_post (see 0012_post_fts). SQLite rebuilds
+# app_post for most schema changes to Post (AddField etc.) and the triggers go with the old table,
+# so they're put back after every migrate (see signals.restore_fts_triggers).
+FTS_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS app_post_fts_insert AFTER INSERT ON app_post BEGIN
+        INSERT INTO app_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_post_fts_delete AFTER DELETE ON app_post BEGIN
+        INSERT INTO app_post_fts(app_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_post_fts_update AFTER UPDATE OF title, content ON app_post BEGIN
+        INSERT INTO app_post_fts(app_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO app_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+
+def fts_available():
+    """True when the app_post_fts index exists (SQLite with FTS5)"""
+    return connection.vendor == 'sqlite'
+
+
+def ensure_fts_triggers(using='default'):
+    """Create whichever FTS triggers are missing (nothing to do off SQLite or before 0012_post_fts)"""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        if 'app_post_fts' not in conn.introspection.table_names(cursor):
+            return
+        for statement in FTS_TRIGGERS_SQL:
+            cursor.execute(statement)
+
+
+def match_expression(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+    Every word is quoted (so FTS operators / punctuation in user input can't break the
+    query) and the last one is a prefix match, so results show up while typing.
+    """
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_ids(query):
+    """
+    RawSQL of post ids matching `query`, for use in `pk__in` filters (e.g. the admin).
+    None if the query has nothing searchable in it.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return None
+    return RawSQL('SELECT rowid FROM app_post_fts WHERE app_post_fts MATCH %s', [expression])
+
+
+def search_posts(query, user, club_id=None, start=None, end=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    BM25-ranked posts matching `query`, optionally only in one club and/or posted in [start, end).
+    Returns (posts for this page, whether there's a next page).
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], False
+
+    if not fts_available():
+        return _search_posts_like(query, user, club_id, start, end, page, page_size)
+
+    sql = [
+        'SELECT p.id FROM app_post_fts f JOIN app_post p ON p.id = f.rowid',
+        'WHERE app_post_fts MATCH %s',
+    ]
+    params = [expression]
+    if club_id:
+        sql.append('AND p.club_id = %s')
+        params.append(club_id)
+    if start:
+        sql.append('AND p.date_posted >= %s')
+        params.append(connection.ops.adapt_datetimefield_value(start))
+    if end:
+        sql.append('AND p.date_posted < %s')
+        params.append(connection.ops.adapt_datetimefield_value(end))
+    # bm25() is "lower is better"; title hits count double
+    sql.append('ORDER BY bm25(app_post_fts, 2.0, 1.0) LIMIT %s OFFSET %s')
+    params += [page_size + 1, (page - 1) * page_size]
+
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        post_ids = [row[0] for row in cursor.fetchall()]
+
+    has_next = len(post_ids) > page_size
+    post_ids = post_ids[:page_size]
+    posts = with_card_data(Post.objects.filter(pk__in=post_ids), user).in_bulk()
+    return [posts[pk] for pk in post_ids if pk in posts], has_next
+
+
+def _search_posts_like(query, user, club_id, start, end, page, page_size):
+    """Unranked LIKE search for databases without FTS5"""
+    posts = Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query))
+    if club_id:
+        posts = posts.filter(club_id=club_id)
+    if start:
+        posts = posts.filter(date_posted__gte=start)
+    if end:
+        posts = posts.filter(date_posted__lt=end)
+    offset = (page - 1) * page_size
+    results = list(with_card_data(posts, user).order_by('-date_posted')[offset:offset + page_size + 1])
+    return results[:page_size], len(results) > page_size
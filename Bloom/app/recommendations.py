@@ -0,0 +1,198 @@
+"""
+"Clubs you might like" (left bar), from item-to-item similarity on co-membership.
+
+Every club is a sparse vector over users (1 = member). Two clubs are similar when their
+vectors point the same way: cosine = shared members / sqrt(size(a) * size(b)).
+ClubAffinity stores the shared member counts for every pair of clubs that have any, the
+club sizes on the diagonal (club == other), and the resulting score, so reading a
+club's most similar clubs is an index range scan on (club, -score).
+
+- `manage.py rebuild_club_recommendations` (and generate_data) recomputes the table from
+  the membership matrix, walking it a batch of profiles at a time
+- joining / leaving (join_club, follow_club, batch_interactions, the admin) adjusts the
+  counts of the pairs involving the changed clubs and rescores their rows, in the same
+  transaction (see signals.py)
+- each club's top NEIGHBORS list is cached. Changing a club's members drops the lists of
+  that club and the member's other clubs; other clubs' lists catch up when they expire.
+
+Serving a user only merges the cached lists of the clubs they're in, no similarity is
+computed in the request.
+"""
+import heapq
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Sqrt
+
+from .club_directory import get_user_club_ids
+from .models import ClubAffinity, Profile
+
+# Cached similar clubs per club
+NEIGHBORS = 20
+NEIGHBORS_TIMEOUT = 60 * 60
+# Shown to people who haven't joined anything yet
+POPULAR_TIMEOUT = 60 * 10
+
+# Profiles per batch when rebuilding, and rows per INSERT
+BATCH_SIZE = 1000
+
+VERSION_KEY = 'clubs:similar:version'
+
+
+def _version():
+    """Bumped by rebuild(), so every cached list goes at once"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _neighbors_key(version, club_id):
+    return f'clubs:similar:{version}:{club_id}'
+
+
+# --- MAINTENANCE ---
+
+def _cosine():
+    """Expression for a row's score, from its count and the two clubs' sizes (their diagonal rows)"""
+    def size(column):
+        return Subquery(
+            ClubAffinity.objects.filter(club=OuterRef(column), other=OuterRef(column)).values('members')[:1]
+        )
+    return F('members') / Sqrt(size('club') * size('other'))
+
+
+def _rescore(club_ids):
+    """Recompute the score of every row involving `club_ids` (their sizes changed)"""
+    ClubAffinity.objects.filter(Q(club__in=club_ids) | Q(other__in=club_ids)).update(score=_cosine())
+
+
+def forget(club_ids):
+    """Drop the cached similar clubs of `club_ids` (once the current transaction commits)"""
+    keys = [_neighbors_key(_version(), club_id) for club_id in club_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@transaction.atomic
+def membership_changed(profile_id, club_ids, joined):
+    """
+    A profile joined (or left) `club_ids`. Counts the pairs that changed: the changed
+    clubs with each other (and themselves) and with the profile's other clubs.
+    """
+    changed = set(club_ids)
+    if not changed:
+        return
+    others = set(
+        Profile.clubs.through.objects.filter(profile_id=profile_id).values_list('club_id', flat=True)
+    ) - changed
+
+    pairs = Q()
+    for club_id in changed:
+        pairs |= Q(club_id=club_id, other_id__in=changed | others) | Q(other_id=club_id, club_id__in=others)
+
+    if joined:
+        ClubAffinity.objects.bulk_create([
+            ClubAffinity(club_id=club_id, other_id=other_id)
+            for club_id in changed for other_id in changed | others
+        ] + [
+            ClubAffinity(club_id=other_id, other_id=club_id)
+            for club_id in changed for other_id in others
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        ClubAffinity.objects.filter(pairs).update(members=F('members') + 1)
+    else:
+        ClubAffinity.objects.filter(pairs, members__gt=0).update(members=F('members') - 1)
+        # Keep the table sparse (and the scores' denominators non-zero)
+        ClubAffinity.objects.filter(pairs, members=0).delete()
+
+    _rescore(changed)
+    forget(changed | others)
+
+
+@transaction.atomic
+def rebuild(log=None):
+    """Recompute ClubAffinity from the memberships, a batch of profiles at a time. Returns the number of pairs"""
+    log = log or (lambda message: None)
+    through = Profile.clubs.through
+    counts = Counter()
+    last_profile = 0
+    while True:
+        profile_ids = list(
+            Profile.objects.filter(pk__gt=last_profile).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not profile_ids:
+            break
+        last_profile = profile_ids[-1]
+
+        vectors = defaultdict(list)  # profile id -> club ids, i.e. this batch's slice of the matrix
+        rows = through.objects.filter(profile_id__gte=profile_ids[0], profile_id__lte=last_profile)
+        for profile_id, club_id in rows.order_by().values_list('profile_id', 'club_id'):
+            vectors[profile_id].append(club_id)
+        for clubs in vectors.values():
+            for club_id in clubs:
+                for other_id in clubs:
+                    counts[club_id, other_id] += 1
+        log(f'{len(counts)} club pairs after profile {last_profile}')
+
+    ClubAffinity.objects.all().delete()
+    ClubAffinity.objects.bulk_create(
+        (ClubAffinity(club_id=club_id, other_id=other_id, members=members)
+         for (club_id, other_id), members in counts.items()),
+        batch_size=BATCH_SIZE,
+    )
+    ClubAffinity.objects.update(score=_cosine())
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), timeout=None))
+    return len(counts)
+
+
+# --- SERVING ---
+
+def similar_clubs(club_ids):
+    """{club id: [(similar club id, score), ...]} with the NEIGHBORS most similar clubs of each, cached"""
+    version = _version()
+    keys = {_neighbors_key(version, club_id): club_id for club_id in club_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: neighbors for key, neighbors in cached.items()}
+    for key, club_id in keys.items():
+        if key not in cached:
+            # Cache fills read the primary: a lagging replica must never end up cached for everyone
+            result[club_id] = list(
+                ClubAffinity.objects.using(DEFAULT_DB_ALIAS)
+                .filter(club_id=club_id).exclude(other_id=club_id)
+                .order_by('-score').values_list('other_id', 'score')[:NEIGHBORS]
+            )
+            cache.set(key, result[club_id], NEIGHBORS_TIMEOUT)
+    return result
+
+
+def popular_clubs(limit):
+    """Ids of the clubs with the most members, cached"""
+    key = f'clubs:popular:{limit}'
+    club_ids = cache.get(key)
+    if club_ids is None:
+        club_ids = list(
+            Profile.clubs.through.objects.using(DEFAULT_DB_ALIAS)
+            .values('club_id').annotate(members=Count('*')).order_by('-members', 'club_id')
+            .values_list('club_id', flat=True)[:limit]
+        )
+        cache.set(key, club_ids, POPULAR_TIMEOUT)
+    return club_ids
+
+
+def recommend_clubs(user_id, limit=5):
+    """
+    Ids of the clubs a user isn't in that are most similar to the ones they are in
+    (summed over their clubs), best first. The most popular clubs if they haven't joined any.
+    """
+    joined = get_user_club_ids(user_id)
+    if not joined:
+        return popular_clubs(limit)
+    scores = defaultdict(float)
+    for neighbors in similar_clubs(joined).values():
+        for club_id, score in neighbors:
+            if club_id not in joined:
+                scores[club_id] += score
+    return [club_id for club_id, _ in heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))]
@@ -0,0 +1,38 @@
+"""
+Replication stand-in for running the read replica on one machine (see `manage.py replicate_db`).
+
+Copies the primary SQLite file over the replica with SQLite's online backup API,
+page by page in small steps, so neither side is locked for long and open replica
+connections (persistent ones included) see the new data on their next transaction.
+A real deployment would use streaming replication (Litestream, LiteFS, a server
+database's replicas...) instead; the router doesn't care how the copy gets there.
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+
+from .db_routing import REPLICA_DB_ALIAS
+
+PAGES_PER_STEP = 1024
+
+
+def copy_database(source_path, target_path, pages=PAGES_PER_STEP):
+    """One full copy of `source_path` into `target_path`. Returns the seconds it took"""
+    start = time.perf_counter()
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages)
+    finally:
+        target.close()
+        source.close()
+    return time.perf_counter() - start
+
+
+def sync_replica():
+    """Bring the configured replica up to date with the primary"""
+    databases = settings.DATABASES
+    if REPLICA_DB_ALIAS not in databases:
+        raise ValueError('No replica database configured (set BLOOM_READ_REPLICA)')
+    return copy_database(str(databases['default']['NAME']), str(databases[REPLICA_DB_ALIAS]['NAME']))
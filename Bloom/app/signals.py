@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed, post_migrate
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Profile
+from .models import Profile, Post, Like, Comment, Club
+from . import club_search, feed_versions, images, interactions, live, post_search, recommendations, timeline, trending
+from .club_directory import bump_directory_version, invalidate_user_club_ids
 
 User = get_user_model()
 
@@ -17,3 +21,194 @@ def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
         instance.profile.save()
 
+# --- POST COUNTERS ---
+# Each change is a single UPDATE ... SET x = x +/- 1 so concurrent likes never lose updates.
+# post_delete also fires for admin bulk deletes and cascades (e.g. deleting a user).
+# Batch unlikes (interactions.delete_likes) skip the per-row update and recount instead.
+# The new counts are pushed to live streams after commit (see live.py), and render_version
+# moves so the cached post card is re-rendered (see fragments.py). The trending score rides
+# along in the same UPDATE (see trending.py), and the feed API's ETags move (see feed_versions.py).
+
+def _loaded_club_ids(instance):
+    """
+    [club id] of a like / comment's post when the post is already loaded (the views create them
+    through post.likes / post.post_comments), else None: reading it would cost a query
+    """
+    if type(instance).post.is_cached(instance):
+        return [instance.post.club_id]
+    return None
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    """Bump the post's like counter when a like is created"""
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            like_count=F('like_count') + 1, render_version=F('render_version') + 1,
+            hot_score=trending.bump(trending.LIKE_WEIGHT),
+        )
+        club_ids = _loaded_club_ids(instance)
+        live.counts_changed([instance.post_id], club_ids)
+        feed_versions.posts_changed([instance.post_id], club_ids)
+
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, **kwargs):
+    """Drop the post's like counter when a like is removed"""
+    if interactions.bulk_deleting():
+        return
+    Post.objects.filter(pk=instance.post_id, like_count__gt=0).update(
+        like_count=F('like_count') - 1, render_version=F('render_version') + 1,
+        hot_score=trending.bump(-trending.LIKE_WEIGHT),
+    )
+    club_ids = _loaded_club_ids(instance)
+    live.counts_changed([instance.post_id], club_ids)
+    feed_versions.posts_changed([instance.post_id], club_ids)
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    """Bump the post's comment counter when a comment is created"""
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1, render_version=F('render_version') + 1,
+            hot_score=trending.bump(trending.COMMENT_WEIGHT),
+        )
+        club_ids = _loaded_club_ids(instance)
+        live.counts_changed([instance.post_id], club_ids)
+        feed_versions.posts_changed([instance.post_id], club_ids)
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    """Drop the post's comment counter when a comment is removed"""
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1, render_version=F('render_version') + 1,
+        hot_score=trending.bump(-trending.COMMENT_WEIGHT),
+    )
+    club_ids = _loaded_club_ids(instance)
+    live.counts_changed([instance.post_id], club_ids)
+    feed_versions.posts_changed([instance.post_id], club_ids)
+
+# --- FEED API STAMPS (see feed_versions.py) ---
+
+@receiver(post_save, sender=Post)
+def post_saved_touch_feeds(sender, instance, **kwargs):
+    """New or edited post: its feeds changed"""
+    feed_versions.touch([instance.club_id])
+
+@receiver(post_delete, sender=Post)
+def post_deleted_touch_feeds(sender, instance, **kwargs):
+    """Deleted post: its feeds changed"""
+    feed_versions.touch([instance.club_id])
+
+@receiver(post_save, sender=Profile)
+def profile_saved_touch_pages(sender, instance, **kwargs):
+    """New picture / name: cached pages showing this user's navbar are stale"""
+    feed_versions.touch_user(instance.user_id)
+
+# --- FOLLOWING TIMELINE ---
+# Posts are fanned out to club members on write so the following feed is a single range scan.
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Push new posts into the timelines of the club's members (and to their live streams)"""
+    if created:
+        timeline.fan_out_post(instance)
+        live.post_created(instance)
+    else:
+        timeline.refresh_post(instance)
+
+@receiver(m2m_changed, sender=Profile.clubs.through)
+def sync_timeline_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """Backfill on join, trim on leave (works from join_club, follow_club and the admin)"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    # pk_set is None for clear(), which means "everything on the other side"
+    if reverse:
+        # instance is a Club, pk_set holds Profile ids
+        club_ids = [instance.pk]
+        user_ids = None if pk_set is None else list(Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    else:
+        # instance is a Profile, pk_set holds Club ids
+        user_ids = [instance.user_id]
+        club_ids = None if pk_set is None else list(pk_set)
+
+    if action == 'post_add':
+        timeline.backfill(user_ids, club_ids)
+    else:
+        timeline.trim(user_ids, club_ids)
+
+# --- CLUB CACHES (see club_directory.py) ---
+
+# Any club create / rename / delete (view, admin or command) invalidates the directory
+# and is applied to this process's search index in place, once it commits (a rolled back
+# club must not stay in the index, and nobody may re-cache the old directory under the new version)
+
+@receiver(post_save, sender=Club)
+def club_saved(sender, instance, **kwargs):
+    """Bump the directory version and add / rename the club in the search index"""
+    club_id, name = instance.id, instance.name
+
+    def apply():
+        version = bump_directory_version()
+        club_search.index.upsert(club_id, name, version and version - 1, version)
+    transaction.on_commit(apply)
+
+@receiver(post_delete, sender=Club)
+def club_deleted(sender, instance, **kwargs):
+    """Bump the directory version and drop the club from the search index"""
+    club_id = instance.id
+
+    def apply():
+        version = bump_directory_version()
+        club_search.index.remove(club_id, version and version - 1, version)
+    transaction.on_commit(apply)
+
+@receiver(m2m_changed, sender=Profile.clubs.through)
+def invalidate_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop the cached club ids of whoever just joined or left"""
+    if not reverse:
+        # instance is a Profile
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_club_ids([instance.user_id])
+    elif action in ('post_add', 'post_remove'):
+        # instance is a Club, pk_set holds Profile ids
+        invalidate_user_club_ids(Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    elif action == 'pre_clear':
+        # club.members.clear(): grab the members while we still can
+        invalidate_user_club_ids(instance.members.values_list('user_id', flat=True))
+
+# --- CLUB RECOMMENDATIONS (see recommendations.py) ---
+
+@receiver(m2m_changed, sender=Profile.clubs.through)
+def update_club_affinity(sender, instance, action, reverse, pk_set, **kwargs):
+    """Count joins and leaves into the co-membership table behind the club recommendations"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    joined = action == 'post_add'
+    if reverse:
+        # instance is a Club, pk_set holds Profile ids (None for clear(): every member)
+        profile_ids = list(instance.members.values_list('pk', flat=True)) if pk_set is None else pk_set
+        for profile_id in profile_ids:
+            recommendations.membership_changed(profile_id, [instance.pk], joined)
+    else:
+        # instance is a Profile, pk_set holds Club ids
+        club_ids = list(instance.clubs.values_list('pk', flat=True)) if pk_set is None else pk_set
+        recommendations.membership_changed(instance.pk, club_ids, joined)
+
+# --- PROFILE PICTURES ---
+
+@receiver(post_save, sender=Profile)
+def profile_picture_changed(sender, instance, **kwargs):
+    """Build the avatar derivative in the background whenever a new picture is uploaded"""
+    if instance.profile_picture:
+        if instance.profile_picture.name != instance.profile_picture_source:
+            images.schedule_profile_picture(instance)
+    elif instance.profile_picture_avatar:
+        images.clear_derivatives(instance)
+
+# --- POST SEARCH (see post_search.py) ---
+
+@receiver(post_migrate)
+def restore_fts_triggers(sender, using, **kwargs):
+    """Put back the FTS triggers a migration that rebuilt app_post dropped (SQLite only)"""
+    if sender.name == 'app':
+        post_search.ensure_fts_triggers(using)
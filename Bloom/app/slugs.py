@@ -0,0 +1,69 @@
+from django.db import IntegrityError, transaction
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+
+from .models import Post
+
+SLUG_MAX_LENGTH = Post._meta.get_field('slug').max_length
+SUFFIX_LENGTH = 6
+SUFFIX_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+# 36^6 suffixes, so needing more than one retry basically never happens
+MAX_ATTEMPTS = 5
+
+
+def base_slug(text):
+    """Slug for a post before any collision handling (first 50 chars of the content)"""
+    return slugify(text[:50])[:SLUG_MAX_LENGTH].strip('-') or 'post'
+
+
+def suffixed_slug(base):
+    """`base` plus a random suffix, still within the slug column's max_length"""
+    head = base[:SLUG_MAX_LENGTH - SUFFIX_LENGTH - 1].rstrip('-')
+    return f"{head}-{get_random_string(SUFFIX_LENGTH, SUFFIX_CHARS)}"
+
+
+def save_with_unique_slug(post, text):
+    """
+    Give `post` a unique slug based on `text` and save it.
+
+    Instead of probing slug, slug-1, slug-2... (one query per existing collision) we just
+    try the insert and let the unique constraint tell us about a collision, then retry
+    with a random suffix. That's one INSERT in the common case, two when the plain slug
+    is taken, and it's safe when two people submit the same text at the same time.
+    Any other IntegrityError (a missing user, a bad club...) is raised as is.
+    """
+    base = base_slug(text)
+    post.slug = base
+    for _ in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                post.save()
+            return post
+        except IntegrityError:
+            if not Post.objects.filter(slug=post.slug).exists():
+                raise  # not a slug collision
+            post.slug = suffixed_slug(base)
+    raise IntegrityError(f'Could not allocate a unique slug for "{base}"')
+
+
+def allocate_slugs(texts):
+    """
+    Unique slugs for a batch of new posts (for bulk_create / imports) in one query per 500 texts.
+    Collisions with existing rows or within the batch get a random suffix.
+    """
+    bases = [base_slug(text) for text in texts]
+
+    unique_bases = list(set(bases))
+    taken = set()
+    for i in range(0, len(unique_bases), 500):
+        taken.update(Post.objects.filter(slug__in=unique_bases[i:i + 500]).order_by().values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug = base
+        while slug in taken:
+            slug = suffixed_slug(base)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
@@ -0,0 +1,21 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from .. import like_buffer
+from ..fragments import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Render a list of post cards through the fragment cache"""
+    posts = list(posts)
+    request = context.get('request')
+    if like_buffer.enabled() and request is not None and request.user.is_authenticated:
+        # Likes still in the write-behind buffer aren't in liked_by_me yet
+        overrides = like_buffer.get_buffer().liked_overrides(request.user.id, [post.id for post in posts])
+        for post in posts:
+            if post.id in overrides:
+                post.liked_by_me = overrides[post.id]
+    return mark_safe(''.join(render_cards(posts, context.get('current_club_id'))))
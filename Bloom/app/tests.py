@@ -1,3 +1,1344 @@
-from django.test import TestCase
+import gzip
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.core.management import call_command, CommandError
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import IntegrityError, connection, connections, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from PIL import Image
+
+from .models import Post, Club, ClubAffinity, TimelineEntry, Profile, Like, TrendingState
+from .feeds import paginate, feed_queryset, feed_page
+from .slugs import save_with_unique_slug, allocate_slugs, base_slug
+from .post_search import search_posts
+from . import assets, db_routing, fragments, like_buffer, live, perf, recommendations, timeline, trending, views
+from .club_directory import get_user_club_ids
+from .replication import copy_database
+from Bloom.database import sqlite_database
+
+User = get_user_model()
+
+# One INFO line per request would drown the test output
+logging.getLogger('app.perf').setLevel(logging.WARNING)
+
+
+class BloomTestCase(TestCase):
+    """
+    TestCase that also empties the cache, so cached club/feed data never leaks between tests,
+    and drops the like buffer (BLOOM_LIKE_WRITE_BEHIND=1 runs), whose intents would outlive the test's rows
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(like_buffer.shutdown)
+
+
+def make_posts(user, count, club=None, prefix='post'):
+    """Create `count` posts for `user` (all sharing the same timestamp to exercise the id tiebreak)"""
+    posts = [
+        Post.objects.create(user=user, club=club, content=f'{prefix} {i}', slug=f'{prefix}-{i}')
+        for i in range(count)
+    ]
+    Post.objects.filter(id__in=[p.id for p in posts]).update(date_posted=timezone.now())
+    return posts
+
+
+class FeedPaginationTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+
+    def test_pages_cover_every_post_once(self):
+        make_posts(self.user, 7)
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = paginate(feed_queryset(self.user), cursor, page_size=3)
+            seen.extend(p.id for p in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_load_more_returns_next_page_fragment(self):
+        self.client.force_login(self.user)
+        make_posts(self.user, 3, club=self.club)
+        first, cursor = paginate(feed_queryset(self.user, club=self.club), page_size=2)
+
+        response = self.client.get(reverse('load_more_posts'), {'club': self.club.id, 'cursor': cursor})
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertIsNone(data['next_cursor'])
+        self.assertNotIn(first[0].slug, data['html'])
+
+    def test_load_more_rejects_bad_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('load_more_posts'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)  # measures rendering, not the page cache
+class FeedQueryBudgetTests(BloomTestCase):
+    """Rendering a feed page must cost the same number of queries however many posts it shows"""
+
+    # Session, user, feed page (+ liked-by-me), profile lookups in the views / bars.
+    # The club directory and memberships come from the cache once it's warm.
+    QUERY_BUDGET = 5
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        self.user.profile.clubs.add(self.club)
+        self.client.force_login(self.user)
+
+    def _render_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def _check_budget(self, url, budget=QUERY_BUDGET):
+        author = User.objects.create_user(username='bob', password='pw12345!')
+        make_posts(author, 2, club=self.club, prefix='few')
+        self._render_queries(url)  # warm the club caches
+        few = self._render_queries(url)
+
+        make_posts(author, 15, club=self.club, prefix='many')
+        for post in Post.objects.all()[:5]:
+            post.likes.create(user=self.user)
+            post.post_comments.create(user=author, content='hi')
+        many = self._render_queries(url)
+
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, budget)
+
+    def test_home_all_feed(self):
+        self._check_budget(reverse('home'))
+
+    def test_home_following_feed(self):
+        # Plus one on the timeline's last page, for the club posts it never got (see feeds.following_page)
+        self._check_budget(reverse('home') + '?feed=following', budget=self.QUERY_BUDGET + 1)
+
+    def test_club_page(self):
+        self._check_budget(reverse('club_page', args=[self.club.id]))
+
+
+class PostCounterTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.post = make_posts(self.user, 1)[0]
+
+    def test_like_toggle_updates_counter(self):
+        self.client.force_login(self.user)
+        url = reverse('like_post', args=[self.post.slug])
+
+        self.assertEqual(self.client.post(url).json(), {'liked': True, 'like_count': 1})
+        self.assertEqual(self.client.post(url).json(), {'liked': False, 'like_count': 0})
+
+    def test_cascade_delete_updates_counters(self):
+        other = User.objects.create_user(username='bob', password='pw12345!')
+        self.post.likes.create(user=other)
+        self.post.post_comments.create(user=other, content='hi')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        other.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_stale_instance_save_keeps_counter(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        self.post.likes.create(user=self.user)
+        stale.content = 'edited'
+        stale.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+
+    def test_rebuild_counters_repairs_drift(self):
+        self.post.likes.create(user=self.user)
+        Post.objects.filter(pk=self.post.pk).update(like_count=42, comment_count=7)
+
+        call_command('rebuild_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+
+
+class FollowingTimelineTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.author = User.objects.create_user(username='bob', password='pw12345!')
+        self.chess = Club.objects.create(name='Chess Club')
+        self.music = Club.objects.create(name='Music Club')
+
+    def test_join_backfills_and_leave_trims(self):
+        make_posts(self.author, 3, club=self.chess, prefix='chess')
+        make_posts(self.author, 2, club=self.music, prefix='music')
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('join_club'), {'club_id': self.chess.id})
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 3)
+
+        self.client.post(reverse('follow_club', args=[self.music.id]))
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 5)
+
+        self.client.post(reverse('join_club'), {'club_id': self.chess.id})
+        self.assertEqual(set(TimelineEntry.objects.filter(user=self.user).values_list('club_id', flat=True)), {self.music.id})
+
+    def test_backfill_stops_at_the_newest_posts(self):
+        posts = make_posts(self.author, 5, club=self.chess, prefix='chess')
+        with mock.patch.object(timeline, 'TIMELINE_DEPTH', 3):
+            self.user.profile.clubs.add(self.chess)
+        self.assertEqual(set(TimelineEntry.objects.filter(user=self.user).values_list('post_id', flat=True)),
+                         {post.id for post in posts[2:]})
+
+    def test_following_feed_goes_past_the_backfill(self):
+        posts = make_posts(self.author, 5, club=self.chess, prefix='chess')
+        make_posts(self.author, 2, club=self.music, prefix='music')
+        with mock.patch.object(timeline, 'TIMELINE_DEPTH', 2):
+            self.user.profile.clubs.add(self.chess)
+        newest_first = [post.id for post in reversed(posts)]
+
+        for page_size in (2, 3, 5):
+            seen, cursor = [], None
+            while True:
+                page, cursor = feed_page(self.user, 'following', cursor=cursor, page_size=page_size)
+                seen += [post.id for post in page]
+                if cursor is None:
+                    break
+            self.assertEqual(seen, newest_first)
+
+    def test_new_posts_fan_out_to_members(self):
+        self.user.profile.clubs.add(self.chess)
+        chess_posts = make_posts(self.author, 2, club=self.chess, prefix='chess')
+        make_posts(self.author, 2, club=self.music, prefix='music')
+        make_posts(self.author, 1, prefix='general')
+
+        posts, next_cursor = feed_page(self.user, 'following')
+        self.assertEqual([p.id for p in posts], [p.id for p in reversed(chess_posts)])
+        self.assertIsNone(next_cursor)
+
+    def test_moving_a_post_to_another_club_rehomes_it(self):
+        self.user.profile.clubs.add(self.chess)
+        post = make_posts(self.author, 1, club=self.chess)[0]
+        post.club = self.music
+        post.save()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+
+class SlugAllocatorTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+
+    def test_collisions_cost_a_constant_number_of_queries(self):
+        for i in range(10):
+            Post.objects.create(user=self.user, content='x', slug='meeting-tonight' if i == 0 else f'meeting-tonight-{i}')
+
+        # Two savepoint-wrapped INSERTs (the first one collides, which one lookup confirms), each
+        # after reading the trending epoch for the starting score, no matter how many collisions exist
+        with self.assertNumQueries(10):
+            post = save_with_unique_slug(Post(user=self.user, content='Meeting tonight'), 'Meeting tonight')
+        self.assertTrue(post.slug.startswith('meeting-tonight-'))
+        self.assertLessEqual(len(post.slug), 50)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        with mock.patch('app.slugs.suffixed_slug') as suffixed, \
+                self.assertRaisesMessage(IntegrityError, 'NOT NULL'):
+            save_with_unique_slug(Post(content='Meeting tonight'), 'Meeting tonight')
+        suffixed.assert_not_called()
+
+    def test_allocate_slugs_avoids_existing_and_batch_duplicates(self):
+        Post.objects.create(user=self.user, content='x', slug='hello')
+        slugs = allocate_slugs(['Hello', 'Hello', '!!!'])
+        self.assertNotIn('hello', slugs)
+        self.assertEqual(len(set(slugs)), 3)
+        self.assertEqual(slugs[2], 'post')
+
+
+class ClubsContextTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        self.client.force_login(self.user)
+
+    def test_pages_without_club_lists_skip_the_clubs_tables(self):
+        for url in (reverse('aboutus'), reverse('login'), reverse('signup')):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            self.assertFalse([q for q in ctx.captured_queries if 'app_club' in q['sql']], url)
+
+    def test_join_and_new_club_invalidate_the_caches(self):
+        self.client.get(reverse('home'))
+        self.client.post(reverse('join_club'), {'club_id': self.club.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            Club.objects.create(name='Art Club')
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual({c['name'] for c in response.context['user_clubs']()}, {'Chess Club'})
+        self.assertEqual(len(response.context['clubs_objects']()), 2)
+
+
+class ClubSearchTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ['Rich Chessboard Fans', 'Chess Club', 'Music Club', 'Art Club', 'Speed Chess']:
+            Club.objects.create(name=name)
+
+    def search(self, q):
+        return [club['name'] for club in self.client.get(reverse('search_clubs'), {'q': q}).json()['clubs']]
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(self.search('chess'), ['Chess Club', 'Speed Chess', 'Rich Chessboard Fans'])
+
+    def test_typos_still_match(self):
+        self.assertEqual(self.search('chses club')[0], 'Chess Club')
+        self.assertIn('Music Club', self.search('musc'))
+
+    def test_index_follows_club_changes(self):
+        self.search('')  # build the index
+        with self.captureOnCommitCallbacks(execute=True):
+            club = Club.objects.create(name='Robotics Club')
+        self.assertEqual(self.search('robot'), ['Robotics Club'])
+        with self.captureOnCommitCallbacks(execute=True):
+            club.delete()
+        self.assertEqual(self.search('robot'), [])
+
+    def test_rolled_back_changes_stay_out_of_the_index(self):
+        self.search('')  # build the index
+        chess = Club.objects.get(name='Chess Club')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Club.objects.create(name='Robotics Club')
+            chess.delete()
+            raise RuntimeError
+        self.assertEqual(self.search('robot'), [])
+        self.assertIn('Chess Club', self.search('chess'))
+
+
+class PostSearchTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!', is_staff=True, is_superuser=True)
+        self.club = Club.objects.create(name='Chess Club')
+        self.titled = Post.objects.create(user=self.user, title='Chess meeting', content='Bring boards', slug='a')
+        self.body = Post.objects.create(user=self.user, club=self.club, content='The chess meeting is tonight', slug='b')
+        Post.objects.create(user=self.user, content='Lunch at the union', slug='c')
+
+    def test_ranked_and_filtered(self):
+        posts, has_next = search_posts('chess meet', self.user)
+        self.assertEqual([p.slug for p in posts], ['a', 'b'])
+        self.assertFalse(has_next)
+
+        posts, _ = search_posts('chess', self.user, club_id=self.club.id)
+        self.assertEqual([p.slug for p in posts], ['b'])
+
+        tomorrow = timezone.now() + timedelta(days=1)
+        self.assertEqual(search_posts('chess', self.user, start=tomorrow), ([], False))
+
+    def test_index_follows_edits_and_deletes(self):
+        self.titled.title = 'Tennis'
+        self.titled.content = 'Courts at noon'
+        self.titled.save()
+        self.body.delete()
+        self.assertEqual(search_posts('chess', self.user), ([], False))
+        self.assertEqual([p.slug for p in search_posts('tennis', self.user)[0]], ['a'])
+
+    def test_migrate_restores_dropped_triggers(self):
+        # What an AddField on Post does to them on SQLite
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER app_post_fts_insert')
+            cursor.execute('DROP TRIGGER app_post_fts_update')
+        emit_post_migrate_signal(0, False, 'default')
+        Post.objects.create(user=self.user, content='Tennis tomorrow', slug='d')
+        self.titled.title = 'Tennis'
+        self.titled.save()
+        self.assertEqual(sorted(p.slug for p in search_posts('tennis', self.user)[0]), ['a', 'd'])
+
+    def test_search_page_and_admin_use_the_index(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search_posts'), {'q': 'lunch"*'})
+        self.assertEqual([p.slug for p in response.context['posts']], ['c'])
+
+        response = self.client.get(reverse('admin:app_post_changelist'), {'q': 'union'})
+        self.assertEqual([p.slug for p in response.context['cl'].result_list], ['c'])
+
+        # Authors by part of their username
+        response = self.client.get(reverse('admin:app_post_changelist'), {'q': 'lic'})
+        self.assertEqual(sorted(p.slug for p in response.context['cl'].result_list), ['a', 'b', 'c'])
+
+
+@override_settings(IMAGE_PIPELINE_SYNC=True)
+class ProfilePictureTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.client.force_login(self.user)
+
+    def upload(self):
+        image = Image.new('RGB', (640, 480), 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'SecretCam'  # camera make
+        data = BytesIO()
+        image.save(data, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('me.jpg', data.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('update_profile_picture'), {'profile_picture': upload})
+        return Profile.objects.get(user=self.user)
+
+    def test_upload_builds_small_metadata_free_derivatives(self):
+        profile = self.upload()
+        self.assertTrue(profile.get_profile_picture_url().endswith('-avatar-80.webp'))
+        self.assertEqual(os.listdir(os.path.dirname(profile.profile_picture_avatar.path)),
+                         [os.path.basename(profile.profile_picture_avatar.name)])
+
+        with profile.profile_picture_avatar.open('rb') as f:
+            avatar = Image.open(f)
+            self.assertEqual((avatar.format, avatar.size), ('WEBP', (80, 80)))
+            self.assertFalse(avatar.getexif())
+
+    def test_remove_clears_derivatives(self):
+        profile = self.upload()
+        avatar_path = profile.profile_picture_avatar.path
+        self.client.post(reverse('remove_profile_picture'))
+
+        profile.refresh_from_db()
+        self.assertIsNone(profile.get_profile_picture_url())
+        self.assertFalse(os.path.exists(avatar_path))
+
+
+@override_settings(ROOT_URLCONF='Bloom.asgi_urls')
+class AsyncInteractionTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        self.post = make_posts(self.user, 1)[0]
+        self.async_client.force_login(self.user)
+
+    def test_interaction_endpoints_resolve_to_async_views(self):
+        from . import async_views
+        match = resolve(reverse('like_post', args=[self.post.slug]))
+        self.assertIs(match.func.__wrapped__, async_views.like_post.__wrapped__)
+
+    async def test_like_toggles_and_matches_sync_json(self):
+        url = reverse('like_post', args=[self.post.slug])
+        response = await self.async_client.post(url)
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        response = await self.async_client.post(url)
+        self.assertEqual(response.json(), {'liked': False, 'like_count': 0})
+
+    async def test_join_and_search(self):
+        response = await self.async_client.post(reverse('join_club'), {'club_id': self.club.id})
+        self.assertEqual(response.json()['action'], 'joined')
+        self.assertTrue(await Profile.clubs.through.objects.filter(club=self.club).aexists())
+
+        response = await self.async_client.get(reverse('search_clubs'), {'q': 'chess'})
+        self.assertEqual(response.json(), {'clubs': [{'id': self.club.id, 'name': 'Chess Club'}]})
+
+
+class BatchInteractionTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.other = User.objects.create_user(username='bob', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        self.posts = make_posts(self.other, 10, club=self.club)
+        self.client.force_login(self.user)
+
+    def batch(self, ops):
+        return self.client.post(reverse('batch_interactions'), {'ops': ops}, content_type='application/json')
+
+    def test_applies_likes_and_joins_and_returns_state(self):
+        Like.objects.create(post=self.posts[1], user=self.other)
+        response = self.batch([
+            {'op': 'like', 'post': 'post-0'},
+            {'op': 'like', 'post': 'post-1'},
+            {'op': 'like', 'post': 'post-2'},
+            {'op': 'unlike', 'post': 'post-2'},  # last op wins
+            {'op': 'join', 'club': self.club.id},
+            {'op': 'like', 'post': 'nope'},
+        ])
+        data = response.json()
+        self.assertEqual(data['posts'], {
+            'post-0': {'liked': True, 'like_count': 1},
+            'post-1': {'liked': True, 'like_count': 2},
+            'post-2': {'liked': False, 'like_count': 0},
+        })
+        self.assertEqual(data['clubs'], {str(self.club.id): {'joined': True, 'member_count': 1}})
+        self.assertEqual(data['missing'], {'posts': ['nope'], 'clubs': []})
+        # Joining went through m2m_changed, so the following timeline was backfilled
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 10)
+
+        data = self.batch([{'op': 'unlike', 'post': 'post-1'}, {'op': 'leave', 'club': self.club.id}]).json()
+        self.assertEqual(data['posts']['post-1'], {'liked': False, 'like_count': 1})
+        self.assertEqual(Post.objects.get(slug='post-1').like_count, 1)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def queries_for(slugs):
+            with CaptureQueriesContext(connection) as ctx:
+                self.batch([{'op': 'like', 'post': slug} for slug in slugs])
+            return len(ctx)
+        self.assertEqual(queries_for(['post-0', 'post-1']), queries_for([f'post-{i}' for i in range(2, 10)]))
+
+    def test_unlikes_are_recounted_not_updated_per_row(self):
+        scores = dict(Post.objects.values_list('slug', 'hot_score'))
+        self.batch([{'op': 'like', 'post': f'post-{i}'} for i in range(10)])
+
+        def queries_for(slugs):
+            with CaptureQueriesContext(connection) as ctx:
+                self.batch([{'op': 'unlike', 'post': slug} for slug in slugs])
+            return len(ctx)
+        self.assertEqual(queries_for(['post-0', 'post-1']), queries_for([f'post-{i}' for i in range(2, 10)]))
+        # Each post lost its like exactly once (the scores only differ by the decay between the clicks)
+        for slug, like_count, hot_score in Post.objects.values_list('slug', 'like_count', 'hot_score'):
+            self.assertEqual(like_count, 0)
+            self.assertAlmostEqual(hot_score, scores[slug], places=3)
+
+    def test_malformed_batch_is_rejected(self):
+        self.assertEqual(self.batch([{'op': 'explode', 'post': 'post-0'}]).status_code, 400)
+        self.assertEqual(self.batch('nope').status_code, 400)
+        self.assertFalse(Like.objects.exists())
+
+
+class LiveUpdateTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        self.user.profile.clubs.add(self.club)
+
+    def test_saves_publish_after_commit(self):
+        channel = live.club_channel(self.club.id)
+        published = []
+        broker = live.get_broker()
+        # Someone has the club's stream open
+        with mock.patch.object(broker, 'publish', lambda channel, event: published.append((channel, event))), \
+                mock.patch.object(broker, 'listening', lambda channels=None: True):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = Post.objects.create(user=self.user, club=self.club, content='hi', slug='hi')
+            with self.captureOnCommitCallbacks(execute=True):
+                Like.objects.create(post=post, user=self.user)
+        self.assertEqual([event['type'] for _, event in published], ['post', 'counts'])
+        self.assertEqual(published[1], (channel, {'type': 'counts', 'post': 'hi', 'like_count': 1, 'comment_count': 0}))
+
+    def test_counts_are_not_read_without_subscribers(self):
+        post = Post.objects.create(user=self.user, club=self.club, content='hi', slug='hi')
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=post, user=self.user)
+        self.assertFalse([q['sql'] for q in ctx if 'comment_count' in q['sql'] and q['sql'].startswith('SELECT')])
+
+    def test_local_broker_knows_who_is_listening(self):
+        broker = live.Broker(live.LocalBackend())
+        self.assertFalse(broker.listening())
+
+        async def subscribed():
+            broker.subscribe(['club:1'])
+            return broker.listening(['club:1']), broker.listening(['club:2']), broker.listening()
+
+        self.assertEqual(async_to_sync(subscribed)(), (True, False, True))
+
+        # Other processes might be subscribed to anything
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = live.Broker(live.UnixSocketBackend(path=directory.name))
+        self.addCleanup(shared.backend.close)
+        self.assertTrue(shared.listening(['club:2']))
+
+    def test_unix_socket_backend_reaches_every_process(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Two brokers sharing a socket directory stand in for two worker processes
+        first = live.Broker(live.UnixSocketBackend(path=directory.name))
+        second = live.Broker(live.UnixSocketBackend(path=directory.name))
+        self.addCleanup(first.backend.close)
+        self.addCleanup(second.backend.close)
+
+        async def roundtrip():
+            subscription = second.subscribe(['club:1'])
+            first.publish('club:1', {'type': 'post', 'post': 'hi'})
+            return await subscription.get(timeout=5)
+
+        self.assertEqual(async_to_sync(roundtrip)(), ('club:1', {'type': 'post', 'post': 'hi'}))
+
+    @override_settings(ROOT_URLCONF='Bloom.asgi_urls')
+    async def test_stream_pushes_events_for_followed_clubs(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+
+        live.get_broker().publish(live.club_channel(self.club.id), {'type': 'post', 'post': 'hi'})
+        self.assertEqual(await anext(chunks), b'event: post\ndata: {"type": "post", "post": "hi"}\n\n')
+        await chunks.aclose()
+
+
+class PostCardCacheTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw12345!')
+        self.bob = User.objects.create_user(username='bob', password='pw12345!')
+        self.posts = make_posts(self.alice, 3)
+        Like.objects.create(post=self.posts[0], user=self.alice)
+
+    def cards(self, user):
+        return fragments.render_cards(feed_page(user)[0])
+
+    def test_cards_are_shared_between_viewers(self):
+        alice_cards = self.cards(self.alice)
+        bob_cards = self.cards(self.bob)
+        self.assertEqual(fragments.stats(), {'hits': 3, 'misses': 3, 'hit_rate': 0.5})
+
+        # Same cached markup, but the liked state is each viewer's own
+        liked = next(card for card in alice_cards if 'id="like-post-0"' in card)
+        not_liked = next(card for card in bob_cards if 'id="like-post-0"' in card)
+        self.assertIn('data-liked="true"', liked)
+        self.assertIn('data-liked="false"', not_liked)
+        self.assertNotIn('<!--@', liked + not_liked)
+
+    def test_edits_likes_and_avatars_invalidate(self):
+        self.cards(self.bob)
+        fragments.reset_stats()
+
+        post = Post.objects.get(pk=self.posts[1].pk)
+        post.title = 'Edited'
+        post.save()
+        Like.objects.create(post=self.posts[2], user=self.bob)
+        cards = self.cards(self.bob)
+        self.assertEqual(fragments.stats()['misses'], 2)
+        self.assertTrue(any('Edited' in card for card in cards))
+
+        Profile.objects.filter(user=self.alice).update(profile_picture='profile_pictures/new.jpg')
+        self.cards(self.bob)
+        self.assertEqual(fragments.stats()['misses'], 5)
+
+    def test_feed_renders_through_the_cache(self):
+        self.client.force_login(self.bob)
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(fragments.stats()['hits'], 3)
+
+
+class GenerateDataTests(BloomTestCase):
+    def test_generates_consistent_skewed_data(self):
+        call_command('generate_data', scale='tiny', posts=300, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='gen_').count(), 50)
+        self.assertEqual(Profile.objects.count(), 50)
+        # Counters were computed up front, rebuild_counters has nothing to fix
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('fixed 0 drifted', out.getvalue())
+
+        # Every member sees their clubs' posts in the following feed
+        member = User.objects.filter(profile__clubs__posts__isnull=False).first()
+        posts, _ = feed_page(member, 'following')
+        self.assertTrue(posts)
+        self.assertTrue(all(post.club_id in get_user_club_ids(member.id) for post in posts))
+
+        # Dates are spread out rather than all "now"
+        oldest = Post.objects.order_by('date_posted').first().date_posted
+        self.assertLess(oldest, timezone.now() - timedelta(days=300))
+
+        # Slugs come from allocate_slugs, like every other bulk import
+        post = Post.objects.order_by('id').first()
+        self.assertEqual(post.slug, base_slug(post.content))
+
+    def test_refuses_to_reuse_a_prefix(self):
+        call_command('generate_data', scale='tiny', posts=10, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_data', scale='tiny', posts=10, stdout=StringIO())
+
+
+class QueryPlanTests(BloomTestCase):
+    def test_hot_queries_use_indexes(self):
+        call_command('explain_queries', stdout=StringIO())
+        # Still true once ANALYZE has statistics about a realistic table
+        call_command('generate_data', scale='tiny', posts=300, stdout=StringIO())
+        call_command('explain_queries', stdout=StringIO())
+
+    def test_scans_and_sorts_are_flagged(self):
+        from .management.commands.explain_queries import plan_problems
+        self.assertEqual(plan_problems(['SCAN app_post', 'USE TEMP B-TREE FOR ORDER BY']),
+                         ['SCAN app_post', 'USE TEMP B-TREE FOR ORDER BY'])
+        self.assertEqual(plan_problems(['SCAN app_post USING INDEX post_recent_idx',
+                                        'SEARCH app_like USING COVERING INDEX x (post_id=?)']), [])
+
+
+class PerformanceMiddlewareTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        perf.reset_view_stats()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.client.force_login(self.user)
+
+    def test_server_timing_header_counts_queries(self):
+        self.user.is_staff = True
+        self.user.save()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('home'))
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(ctx)} queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_server_timing_is_only_sent_to_staff(self):
+        self.assertFalse(self.client.get(reverse('home')).has_header('Server-Timing'))
+        with self.settings(DEBUG=True):
+            self.assertTrue(self.client.get(reverse('home')).has_header('Server-Timing'))
+
+    def test_stats_are_grouped_by_url_name(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'), {'feed': 'following'})
+        stats = perf.view_stats()
+        self.assertEqual(stats['home']['requests'], 2)
+        self.assertGreater(stats['home']['avg_queries'], 0)
+        self.assertGreater(stats['home']['avg_template_ms'], 0)
+
+    @override_settings(PERF_QUERY_BUDGETS={'home': 1}, PERF_BUDGET_ACTION='warn')
+    def test_over_budget_warns(self):
+        with self.assertLogs('app.perf', 'WARNING') as logs:
+            self.client.get(reverse('home'))
+        self.assertIn('home ran', logs.output[0])
+        self.assertEqual(perf.view_stats()['home']['over_budget'], 1)
+
+    @override_settings(PERF_QUERY_BUDGETS={'home': 1}, PERF_BUDGET_ACTION='raise')
+    def test_over_budget_can_raise(self):
+        with self.assertRaises(perf.QueryBudgetExceeded):
+            self.client.get(reverse('home'))
+
+    def test_request_stats_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('request_stats')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('home'))
+        data = self.client.get(reverse('request_stats')).json()
+        self.assertEqual(data['home']['requests'], 1)
+
+
+class RealQueryBudgetTests(TransactionTestCase):
+    """
+    PERF_QUERY_BUDGETS against what the perf middleware really counts. There's no test transaction
+    around the requests, so their on_commit work (live counts, feed versions, ...) runs inside them
+    like in production, where a TestCase would quietly drop it.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(like_buffer.shutdown)
+        perf.reset_view_stats()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        author = User.objects.create_user(username='bob', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        self.user.profile.clubs.add(self.club)
+        self.posts = make_posts(author, 15, club=self.club)
+        for post in self.posts[:5]:
+            post.likes.create(user=author)
+            post.post_comments.create(user=author, content='chess tonight')
+        self.client.force_login(self.user)
+
+    def requests(self):
+        """A few requests per budgeted view, the expensive ones first"""
+        get, post = self.client.get, self.client.post
+        batch = [{'op': 'like', 'post': p.slug} for p in self.posts[:5]] + [
+            {'op': 'unlike', 'post': p.slug} for p in self.posts[5:8]] + [
+            {'op': 'leave', 'club': self.club.id}]
+        like = reverse('like_post', args=[self.posts[0].slug])
+        return {
+            'home': [lambda: get(reverse('home')), lambda: get(reverse('home'), {'feed': 'following'})],
+            'club_page': [lambda: get(reverse('club_page', args=[self.club.id]))],
+            'load_more_posts': [lambda: get(reverse('load_more_posts')),
+                                lambda: get(reverse('load_more_posts'), {'club': self.club.id})],
+            'search_posts': [lambda: get(reverse('search_posts'), {'q': 'chess'})],
+            'search_clubs': [lambda: get(reverse('search_clubs'), {'q': 'chess'})],
+            'like_post': [lambda: post(like), lambda: post(like)],
+            'batch_interactions': [
+                lambda: post(reverse('batch_interactions'), {'ops': batch}, content_type='application/json')],
+        }
+
+    @override_settings(PERF_BUDGET_ACTION='raise')
+    def test_every_budgeted_view_stays_within_its_budget(self):
+        requests = self.requests()
+        self.assertEqual(set(requests), set(settings.PERF_QUERY_BUDGETS))
+        for view, calls in requests.items():
+            for call in calls:
+                cache.clear()  # cold caches cost the most
+                self.assertLess(call().status_code, 400, view)
+
+        stats = perf.view_stats()
+        for view, budget in settings.PERF_QUERY_BUDGETS.items():
+            self.assertLessEqual(stats[view]['max_queries'], budget, view)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_production_profile_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {
+            **connection.settings_dict,
+            **sqlite_database(os.path.join(directory.name, 'db.sqlite3'), 'production'),
+        }
+        production = type(connections['default'])(settings_dict, alias='profile_test')
+        self.addCleanup(production.close)
+
+        with production.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000})
+        self.assertEqual(production.transaction_mode, 'IMMEDIATE')
+
+    def test_default_profile_is_stock_django(self):
+        self.assertEqual(set(sqlite_database('db.sqlite3', 'default')), {'ENGINE', 'NAME'})
+        with self.assertRaises(ValueError):
+            sqlite_database('db.sqlite3', 'fast')
+
+
+class ReadReplicaRoutingTests(TestCase):
+    def setUp(self):
+        # Only the routing decisions are checked here, nothing runs against the replica
+        patcher = mock.patch.object(db_routing, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _read_db(self, request):
+        """Where a read made while handling `request` would go, plus the response"""
+        seen = []
+
+        def view(request):
+            seen.append(Post.objects.all().db)
+            return HttpResponse()
+
+        response = db_routing.ReadReplicaMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_use_the_replica_only_inside_safe_requests(self):
+        self.assertEqual(Post.objects.all().db, 'default')
+        with db_routing.replica_reads():
+            self.assertEqual(Post.objects.all().db, 'replica')
+            self.assertEqual(db_routing.PrimaryReplicaRouter().db_for_write(Post), 'default')
+
+        self.assertEqual(self._read_db(RequestFactory().get('/'))[0], 'replica')
+        self.assertEqual(self._read_db(RequestFactory().post('/'))[0], 'default')
+
+    def test_writers_are_pinned_to_the_primary(self):
+        _, response = self._read_db(RequestFactory().post('/like-post/x/'))
+        cookie = response.cookies[db_routing.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], db_routing.pin_seconds())
+
+        request = RequestFactory().get('/')
+        request.COOKIES[db_routing.PIN_COOKIE] = cookie.value
+        self.assertEqual(self._read_db(request)[0], 'default')
+
+        # Once the window is over the replica is back in use
+        request.COOKIES[db_routing.PIN_COOKIE] = str(int(time.time()) - 1)
+        self.assertEqual(self._read_db(request)[0], 'replica')
+
+    def test_replica_copy_reaches_open_connections(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary_path = os.path.join(directory.name, 'primary.sqlite3')
+        replica_path = os.path.join(directory.name, 'replica.sqlite3')
+
+        primary = sqlite3.connect(primary_path)
+        self.addCleanup(primary.close)
+        primary.execute('CREATE TABLE t (x INTEGER)')
+        primary.execute('INSERT INTO t VALUES (1)')
+        primary.commit()
+        copy_database(primary_path, replica_path)
+
+        reader = sqlite3.connect(replica_path)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM t').fetchone()[0], 1)
+
+        primary.execute('INSERT INTO t VALUES (2)')
+        primary.commit()
+        copy_database(primary_path, replica_path)
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM t').fetchone()[0], 2)
+
+
+class LikeWriteBehindTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.enterContext(override_settings(
+            LIKE_WRITE_BEHIND=True, LIKE_LOG_DIR=self.log_dir.name, LIKE_FLUSH_INTERVAL=0, LIKE_LOG_FSYNC=False,
+        ))
+        self.enterContext(mock.patch.object(like_buffer, '_buffer', None))
+
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.other = User.objects.create_user(username='bob', password='pw12345!')
+        self.post = make_posts(self.other, 1)[0]
+        self.url = reverse('like_post', args=[self.post.slug])
+
+    def _like_as(self, user):
+        self.client.force_login(user)
+        return self.client.post(self.url).json()
+
+    def test_clicks_are_answered_from_the_buffer_and_flushed_in_bulk(self):
+        self.assertEqual(self._like_as(self.user), {'liked': True, 'like_count': 1})
+        self.assertEqual(self._like_as(self.other), {'liked': True, 'like_count': 2})
+        self.assertEqual(self._like_as(self.user), {'liked': False, 'like_count': 1})
+        # Nothing written yet, but every click is in the log
+        self.assertFalse(Like.objects.exists())
+        log = os.path.join(self.log_dir.name, f'likes-{os.getpid()}.log')
+        with open(log) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        # Coalesced to one intent per (post, user)
+        self.assertEqual(like_buffer.get_buffer().flush(), 2)
+        self.assertEqual(list(Like.objects.values_list('user_id', flat=True)), [self.other.id])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(os.listdir(self.log_dir.name), [])
+
+        # After the flush the state comes from the database again
+        self.assertEqual(self._like_as(self.other), {'liked': False, 'like_count': 0})
+
+    def test_feed_shows_buffered_likes(self):
+        self._like_as(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'data-liked="true"')
+
+    def _batch_as(self, user, op):
+        self.client.force_login(user)
+        return self.client.post(reverse('batch_interactions'), {'ops': [{'op': op, 'post': self.post.slug}]},
+                                content_type='application/json').json()
+
+    def test_batch_clicks_go_through_the_buffer(self):
+        self.assertEqual(self._batch_as(self.user, 'like')['posts'][self.post.slug], {'liked': True, 'like_count': 1})
+        self.assertFalse(Like.objects.exists())
+        # Unliking a like that's still buffered must stick, not come back with the flush
+        self.assertEqual(self._batch_as(self.user, 'unlike')['posts'][self.post.slug], {'liked': False, 'like_count': 0})
+        like_buffer.get_buffer().flush()
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_load_more_shows_buffered_likes(self):
+        make_posts(self.other, 25, prefix='more')
+        self._like_as(self.user)
+        cursor = self.client.get(reverse('home')).context['next_cursor']
+        html = self.client.get(reverse('load_more_posts'), {'cursor': cursor}).json()['html']
+        self.assertIn(f'id="like-{self.post.slug}"', html)
+        self.assertIn('data-liked="true"', html)
+
+    def test_logs_of_dead_processes_are_replayed(self):
+        with open(os.path.join(self.log_dir.name, 'likes-999999.log'), 'w') as f:
+            f.write(f'{{"post":{self.post.id},"user":{self.user.id},"liked":true}}\n')
+            f.write(f'{{"post":{self.post.id},"user":{self.other.id},"liked":true}}\n')
+            f.write(f'{{"post":{self.post.id},"user":{self.other.id},"liked":false}}\n')
+            f.write('{"post":1,"us')  # torn by the crash
+
+        with mock.patch.object(like_buffer, '_pid_alive', return_value=False), \
+                self.assertLogs('app.like_buffer', 'WARNING') as logs:
+            call_command('flush_likes', stdout=StringIO())
+        self.assertIn('process 999999', logs.output[0])
+
+        self.assertEqual(list(Like.objects.values_list('user_id', flat=True)), [self.user.id])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(os.listdir(self.log_dir.name), [])
+
+
+class TrendingFeedTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        # Scores grow with the time since the epoch (stamped when the test database was made),
+        # start from it so a slow suite doesn't move them
+        TrendingState.objects.update(epoch=timezone.now().timestamp())
+        self.quiet, self.busy = make_posts(self.user, 2)
+
+    def score(self, post):
+        return Post.objects.get(pk=post.pk).hot_score
+
+    def test_new_posts_likes_and_comments_raise_the_score(self):
+        self.assertAlmostEqual(self.score(self.quiet), trending.POST_WEIGHT, places=2)
+        self.busy.likes.create(user=self.user)
+        self.busy.post_comments.create(user=self.user, content='hi')
+        self.assertAlmostEqual(self.score(self.busy), trending.POST_WEIGHT + trending.LIKE_WEIGHT + trending.COMMENT_WEIGHT, places=2)
+
+        self.busy.likes.all().delete()
+        self.assertAlmostEqual(self.score(self.busy), trending.POST_WEIGHT + trending.COMMENT_WEIGHT, places=2)
+
+    def test_saving_keeps_the_score_without_reading_the_post_back(self):
+        post = Post.objects.create(user=self.user, content='hello', slug='hello')
+        with self.assertNumQueries(0):
+            score = post.hot_score
+        self.assertAlmostEqual(score, self.score(post))
+
+        post.content = 'hello again'
+        with CaptureQueriesContext(connection) as ctx:
+            post.save()
+        # Only render_version is read back, never the score
+        reads = [q['sql'] for q in ctx if q['sql'].startswith('SELECT') and 'FROM "app_post"' in q['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertNotIn('hot_score', reads[0])
+        self.assertEqual(Post.objects.get(pk=post.pk).render_version, 1)
+
+    def test_edits_leave_the_new_render_version_on_the_instance(self):
+        post = Post.objects.get(pk=self.quiet.pk)
+        self.quiet.likes.create(user=self.user)  # bumps it behind this instance's back
+        post.content = 'edited'
+        post.save(update_fields=['content'])
+        self.assertEqual(post.render_version, Post.objects.get(pk=post.pk).render_version)
+        self.assertEqual(post.render_version, 2)
+
+    def test_bulk_recount_moves_the_score(self):
+        like_buffer.apply_intents({(self.busy.id, self.user.id): True})
+        self.assertAlmostEqual(self.score(self.busy), trending.POST_WEIGHT + trending.LIKE_WEIGHT, places=2)
+
+    def test_feed_orders_by_score_and_pages_by_offset(self):
+        self.busy.likes.create(user=self.user)
+        Post.objects.filter(pk=self.quiet.pk).update(hot_score=0)
+        newer = make_posts(self.user, 3, prefix='newer')
+
+        page, cursor = feed_page(self.user, 'trending', page_size=2)
+        self.assertEqual([p.id for p in page], [self.busy.id, newer[2].id])
+        page, cursor = feed_page(self.user, 'trending', cursor=cursor, page_size=2)
+        # Decayed to nothing = not trending
+        self.assertEqual([p.id for p in page], [newer[1].id, newer[0].id])
+        self.assertIsNone(cursor)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('load_more_posts'), {'feed': 'trending', 'cursor': 'bm9wZQ'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_compaction_decays_scores_and_keeps_the_order(self):
+        self.busy.likes.create(user=self.user)
+        Post.objects.filter(pk=self.quiet.pk).update(hot_score=trending.MIN_SCORE * 1.5)
+        epoch = TrendingState.objects.get().epoch
+        half_life = trending.HALF_LIFE.total_seconds()
+
+        self.assertEqual(trending.compact(now=epoch + half_life), 1)
+        self.assertAlmostEqual(self.score(self.busy), (trending.POST_WEIGHT + trending.LIKE_WEIGHT) / 2, places=2)
+        self.assertEqual(self.score(self.quiet), 0)
+
+        # New interactions count at full weight against the new epoch
+        with mock.patch.object(trending, '_now', return_value=epoch + half_life):
+            self.quiet.likes.create(user=self.user)
+        self.assertAlmostEqual(self.score(self.quiet), trending.LIKE_WEIGHT, places=2)
+
+    def test_rebuild_scores_from_counters(self):
+        self.busy.likes.create(user=self.user)
+        Post.objects.update(hot_score=0)
+        call_command('compact_hot_scores', '--rebuild', stdout=StringIO())
+        self.assertAlmostEqual(self.score(self.busy), trending.POST_WEIGHT + trending.LIKE_WEIGHT, places=2)
+
+
+class ClubRecommendationTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chess, self.go, self.art, self.film = (
+            Club.objects.create(name=name) for name in ('Chess Club', 'Go Club', 'Art Club', 'Film Club')
+        )
+        self.users = [User.objects.create_user(username=f'user{i}', password='pw12345!') for i in range(4)]
+        # Board game people are in chess and go, one of them also likes films
+        for user in self.users[:3]:
+            user.profile.clubs.add(self.chess, self.go)
+        self.users[2].profile.clubs.add(self.film)
+        self.users[3].profile.clubs.add(self.art)
+
+    def affinity(self):
+        return sorted(ClubAffinity.objects.values_list('club_id', 'other_id', 'members'))
+
+    def test_recommends_clubs_that_share_members(self):
+        alice = User.objects.create_user(username='alice', password='pw12345!')
+        self.client.force_login(alice)
+        self.client.post(reverse('join_club'), {'club_id': self.chess.id})
+
+        self.assertEqual(recommendations.recommend_clubs(alice.id), [self.go.id, self.film.id])
+        response = self.client.get(reverse('home'))
+        self.assertEqual([c['name'] for c in response.context['recommended_clubs']()], ['Go Club', 'Film Club'])
+
+    def test_serving_from_a_warm_cache_runs_no_queries(self):
+        user = self.users[3]
+        recommendations.recommend_clubs(user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(recommendations.recommend_clubs(user.id), [])
+
+    def test_joins_and_leaves_match_a_full_rebuild(self):
+        user = self.users[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(user)
+            self.client.post(reverse('follow_club', args=[self.art.id]))
+            self.client.post(reverse('join_club'), {'club_id': self.chess.id})
+            self.film.members.add(self.users[3].profile)
+            self.users[1].profile.clubs.clear()
+        incremental = self.affinity()
+
+        recommendations.rebuild()
+        self.assertEqual(incremental, self.affinity())
+        # go and film: 2 members each, 1 in common
+        self.assertAlmostEqual(ClubAffinity.objects.get(club=self.go, other=self.film).score, 0.5)
+        # The next member of art is recommended what the art people are in
+        self.assertIn(self.go.id, recommendations.recommend_clubs(self.users[3].id))
+
+
+class CommentThreadTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.post = make_posts(self.user, 1)[0]
+        self.client.force_login(self.user)
+
+    def make_comments(self, count):
+        commenters = [User.objects.create_user(username=f'commenter{i}', password='pw12345!') for i in range(count)]
+        for i, commenter in enumerate(commenters):
+            self.post.post_comments.create(user=commenter, content=f'comment {i}')
+
+    def test_pages_through_a_thread_newest_first(self):
+        self.make_comments(13)
+        url = reverse('post_comments', args=[self.post.slug])
+
+        with self.assertNumQueries(4):  # session, user, post, page with authors
+            first = self.client.get(url).json()
+        self.assertIn('comment 12', first['html'])
+        self.assertNotIn('comment 2<', first['html'])
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+        self.assertIn('comment 0', second['html'])
+        self.assertIsNone(second['next_cursor'])
+
+        self.assertEqual(self.client.get(url, {'cursor': 'nope'}).status_code, 400)
+
+    def test_add_comment_is_routed(self):
+        response = self.client.post(reverse('add_comment', args=[self.post.slug]), {'content': 'hello'})
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['comment_count'], 1)
+        self.assertIn('hello', data['html'])
+
+    def test_feed_does_not_load_comments(self):
+        self.make_comments(2)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('home'))
+        self.assertFalse([q for q in ctx.captured_queries if 'app_comment' in q['sql']])
+        self.assertContains(response, reverse('post_comments', args=[self.post.slug]))
+        self.assertNotContains(response, 'comment 0')
+
+
+class FeedApiTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.chess = Club.objects.create(name='Chess Club')
+        self.art = Club.objects.create(name='Art Club')
+        self.chess_post = make_posts(self.user, 1, club=self.chess, prefix='chess')[0]
+        self.art_post = make_posts(self.user, 1, club=self.art, prefix='art')[0]
+        self.client.force_login(self.user)
+        self.url = reverse('feed_api')
+
+    def test_compact_json_with_strong_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b', "', response.content)
+        self.assertEqual([p['slug'] for p in response.json()['posts']], [self.art_post.slug, self.chess_post.slug])
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_unchanged_feed_is_not_modified_without_querying_posts(self):
+        etag = self.client.get(self.url, {'club': self.chess.id})['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'club': self.chess.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'app_post' in q['sql']])
+
+    def test_likes_change_only_the_feeds_showing_the_post(self):
+        chess_etag = self.client.get(self.url, {'club': self.chess.id})['ETag']
+        all_etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.art_post.likes.create(user=self.user)
+
+        self.assertEqual(self.client.get(self.url, {'club': self.chess.id}, HTTP_IF_NONE_MATCH=chess_etag).status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=all_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['posts'][0]['liked'])
+
+    def test_likes_stamp_the_club_without_looking_it_up(self):
+        art_etag = self.client.get(self.url, {'club': self.art.id})['ETag']
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.art_post.likes.create(user=self.user)
+            self.client.post(reverse('batch_interactions'), {'ops': [{'op': 'like', 'post': self.chess_post.slug}]},
+                             content_type='application/json')
+        self.assertFalse([q for q in ctx.captured_queries if 'DISTINCT' in q['sql']])
+        self.assertEqual(self.client.get(self.url, {'club': self.art.id}, HTTP_IF_NONE_MATCH=art_etag).status_code, 200)
+
+    def test_joining_a_club_changes_the_following_feed(self):
+        etag = self.client.get(self.url, {'feed': 'following'})['ETag']
+        self.client.post(reverse('join_club'), {'club_id': self.chess.id})
+        response = self.client.get(self.url, {'feed': 'following'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([p['slug'] for p in response.json()['posts']], [self.chess_post.slug])
+
+    def test_body_is_read_from_the_primary(self):
+        seen = []
+        real_feed_page = views.feed_page
+
+        def spy(*args, **kwargs):
+            # Where the feed's reads would go if a replica were configured
+            with mock.patch.object(db_routing, 'replica_configured', return_value=True):
+                seen.append(Post.objects.all().db)
+            return real_feed_page(*args, **kwargs)
+
+        with mock.patch.object(views, 'feed_page', spy):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(seen, ['default'])
+
+    def test_rejects_unknown_feeds(self):
+        self.assertEqual(self.client.get(self.url, {'feed': 'everything'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nope'}).status_code, 400)
+
+
+
+class PageCacheTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        make_posts(self.user, 2, club=self.club, prefix='chess')
+        self.client.force_login(self.user)
+        self.url = reverse('club_page', args=[self.club.id])
+        # Pick up a CSRF cookie first: pages rendered while a new one is being set aren't stored
+        self.client.get(reverse('aboutus'))
+
+    def post_queries(self, url, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **extra)
+        return response, [q for q in ctx.captured_queries if 'app_post' in q['sql']]
+
+    def test_second_view_is_served_from_the_cache(self):
+        first, queries = self.post_queries(self.url)
+        self.assertTrue(queries)
+        second, queries = self.post_queries(self.url)
+        self.assertEqual(queries, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('private', second['Cache-Control'])
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_new_posts_likes_and_memberships_show_up(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_posts(self.user, 1, club=self.club, prefix='fresh')
+        self.assertContains(self.client.get(self.url), 'fresh')
+
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('join_club'), {'club_id': self.club.id})
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_viewers_get_their_own_copy(self):
+        self.client.get(self.url)
+        bob = User.objects.create_user(username='bob', password='pw12345!')
+        self.client.force_login(bob)
+        self.assertContains(self.client.get(self.url), 'Hello, bob!')
+
+    def test_large_pages_are_compressed(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_club_search_is_shared_and_follows_the_directory(self):
+        self.client.logout()
+        url = reverse('search_clubs')
+        first = self.client.get(url, {'q': 'chess'})
+        self.assertIn('public', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.client.get(url, {'q': 'chess'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Club.objects.create(name='Speed Chess')
+        names = [club['name'] for club in self.client.get(url, {'q': 'chess'}).json()['clubs']]
+        self.assertIn('Speed Chess', names)
+
+    def test_anonymous_about_us_sets_no_cookies(self):
+        self.client.logout()
+        response = self.client.get(reverse('aboutus'))
+        self.assertNotIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertContains(self.client.get(reverse('aboutus')), 'Log in')
+
+    def test_pages_are_filled_from_the_primary(self):
+        seen = []
+        real_feed_page = views.feed_page
+
+        def spy(*args, **kwargs):
+            # Where the page's reads would go if a replica were configured
+            with mock.patch.object(db_routing, 'replica_configured', return_value=True):
+                seen.append(Post.objects.all().db)
+            return real_feed_page(*args, **kwargs)
+
+        with mock.patch.object(views, 'feed_page', spy):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(seen, ['default'])
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_can_be_turned_off(self):
+        self.client.get(self.url)
+        _, queries = self.post_queries(self.url)
+        self.assertTrue(queries)
+
+
+class StaticAssetTests(BloomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw12345!')
+        self.club = Club.objects.create(name='Chess Club')
+        make_posts(self.user, 5, club=self.club)
+        self.client.force_login(self.user)
+
+    def test_pages_carry_one_shared_script(self):
+        for url in (reverse('home'), reverse('club_page', args=[self.club.id]), reverse('aboutus')):
+            content = self.client.get(url).content.decode()
+            self.assertEqual(content.count('<script'), 1, url)
+            self.assertIn('js/bloom.js', content)
+
+    def test_collectstatic_writes_hashed_files_with_gzip_variants(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root, STORAGES={
+            **settings.STORAGES, 'staticfiles': {'BACKEND': 'app.assets.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            hashed = staticfiles_storage.stored_name('js/bloom.js')
+            self.assertRegex(hashed, r'^js/bloom\.[0-9a-f]{12}\.js$')
+            with open(os.path.join(root, hashed), 'rb') as f, gzip.open(os.path.join(root, hashed + '.gz')) as gz:
+                self.assertEqual(gz.read(), f.read())
+
+            request = RequestFactory().get('/static/' + hashed, HTTP_ACCEPT_ENCODING='gzip, br')
+            response = assets.serve(request, hashed)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(response['Content-Type'], 'text/javascript')
+            response.close()
+
+            response = assets.serve(RequestFactory().get('/static/js/bloom.js'), 'js/bloom.js')
+            self.assertNotIn('Content-Encoding', response)
+            self.assertIn('no-cache', response['Cache-Control'])
+            response.close()
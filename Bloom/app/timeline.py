@@ -0,0 +1,62 @@
+from itertools import islice
+
+from .models import Post, Profile, TimelineEntry
+
+# Rows per INSERT when fanning out / backfilling
+TIMELINE_BATCH_SIZE = 500
+
+# Newest posts per club copied into a timeline when someone joins (the following feed reads
+# older ones straight from the club's posts, see feeds.following_page)
+TIMELINE_DEPTH = 50
+
+
+def _insert(entries):
+    """Bulk insert timeline rows in batches, skipping any that already exist"""
+    entries = iter(entries)
+    while batch := list(islice(entries, TIMELINE_BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Push a post into the timeline of every member of its club"""
+    if not post.club_id or not post.slug:
+        return
+    member_ids = Profile.objects.filter(clubs=post.club_id).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.id, club_id=post.club_id, date_posted=post.date_posted)
+        for user_id in member_ids.iterator()
+    )
+
+
+def refresh_post(post):
+    """Re-home an edited post if its club changed: drop entries for the old club, fan out to the new one"""
+    removed, _ = TimelineEntry.objects.filter(post=post).exclude(club_id=post.club_id).delete()
+    if removed or not TimelineEntry.objects.filter(post=post).exists():
+        fan_out_post(post)
+
+
+def backfill(user_ids, club_ids):
+    """Copy the newest TIMELINE_DEPTH posts of each club into the timelines of `user_ids` (someone joined)"""
+    posts = []
+    for club_id in club_ids:
+        posts += (
+            Post.objects.filter(club_id=club_id)
+            .exclude(slug__isnull=True).exclude(slug__exact='')
+            .order_by('-date_posted', '-id')
+            .values_list('id', 'club_id', 'date_posted')[:TIMELINE_DEPTH]
+        )
+    for user_id in user_ids:
+        _insert(
+            TimelineEntry(user_id=user_id, post_id=post_id, club_id=club_id, date_posted=date_posted)
+            for post_id, club_id, date_posted in posts
+        )
+
+
+def trim(user_ids=None, club_ids=None):
+    """Remove club posts from timelines (someone left). None means "all" on that side"""
+    entries = TimelineEntry.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    if club_ids is not None:
+        entries = entries.filter(club_id__in=club_ids)
+    entries.delete()
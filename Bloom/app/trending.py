@@ -0,0 +1,114 @@
+"""
+Hot scores for the trending feed (feed=trending).
+
+A post's hot score is the sum of the weights of its interactions (being posted, likes,
+comments), each halving every HALF_LIFE:
+
+    score(now) = sum(weight * 2 ** -((now - t) / HALF_LIFE))
+
+Post.hot_score stores every score multiplied by the same factor 2 ** ((now - epoch) / HALF_LIFE),
+i.e. sum(weight * 2 ** ((t - epoch) / HALF_LIFE)). Scaling everything by one factor doesn't
+change the order, so the trending feed is a plain top-N scan of the hot_score index, and a
+new like or comment is a single `hot_score = hot_score + weight * 2 ** ((now - epoch) / HALF_LIFE)`
+folded into the counter UPDATE the signals already run.
+
+That factor doubles every HALF_LIFE, so `manage.py compact_hot_scores` (run it every hour or
+so) moves the epoch up to now and divides the stored scores by the factor, zeroing the ones
+that have decayed to nothing, which also keeps them out of the trending index range.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, FloatField, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest, Power
+from django.utils import timezone
+
+from . import feed_versions
+from .models import Post, TrendingState
+
+HALF_LIFE = timedelta(hours=12)
+
+POST_WEIGHT = 1.0
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+
+# Scores that decayed below this (a hundredth of a like right now) are set to 0 by compaction
+MIN_SCORE = 0.01
+
+# How far down the trending feed goes
+TRENDING_LIMIT = 200
+
+
+def _now():
+    return timezone.now().timestamp()
+
+
+def _growth(now):
+    """2 ** ((now - epoch) / HALF_LIFE), with the epoch read inside the same SQL statement"""
+    epoch = Subquery(TrendingState.objects.filter(pk=TrendingState.SINGLETON).values('epoch'))
+    # No state row (it's made by the migration) would make everything NULL, treat it as epoch = now
+    elapsed = Value(now) - Coalesce(epoch, Value(now))
+    return Power(Value(2.0), elapsed / Value(HALF_LIFE.total_seconds()), output_field=FloatField())
+
+
+def bump(weight, times=None):
+    """
+    Expression for Post.objects.update(hot_score=...) adding `weight` now
+    (`times` times, which can be an expression, e.g. a count difference; negative takes away)
+    """
+    amount = Value(float(weight))
+    if times is not None:
+        amount = amount * times
+    return Greatest(F('hot_score') + amount * _growth(_now()), Value(0.0), output_field=FloatField())
+
+
+def starting_score():
+    """
+    A new post's hot_score (POST_WEIGHT now), set by Post.save() before the INSERT.
+    A compaction landing between reading the epoch and the INSERT leaves that one post a
+    little too high (one compaction's factor) until `compact_hot_scores --rebuild`.
+    """
+    now = _now()
+    epoch = TrendingState.objects.filter(pk=TrendingState.SINGLETON).values_list('epoch', flat=True).first()
+    # No state row (it's made by the migration): treat it as epoch = now, like _growth
+    elapsed = 0.0 if epoch is None else now - epoch
+    return POST_WEIGHT * 2.0 ** (elapsed / HALF_LIFE.total_seconds())
+
+
+@transaction.atomic
+def compact(now=None):
+    """Move the epoch up to `now`, rescaling every score. Returns how many posts decayed to 0"""
+    now = _now() if now is None else now
+    state, _ = TrendingState.objects.select_for_update().get_or_create(
+        pk=TrendingState.SINGLETON, defaults={'epoch': now},
+    )
+    factor = 2.0 ** ((state.epoch - now) / HALF_LIFE.total_seconds())
+    Post.objects.filter(hot_score__gt=0).update(hot_score=F('hot_score') * factor)
+    zeroed = Post.objects.filter(hot_score__gt=0, hot_score__lt=MIN_SCORE).update(hot_score=0.0)
+    state.epoch = now
+    state.save(update_fields=['epoch'])
+    if zeroed:
+        # Posts dropped out of the trending feed
+        feed_versions.touch()
+    return zeroed
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute every score from the counters, as if all likes / comments came in when
+    the post was made (for bulk loaded data, or after changing the weights).
+    Returns how many posts have a non-zero score.
+    """
+    now = _now()
+    TrendingState.objects.update_or_create(pk=TrendingState.SINGLETON, defaults={'epoch': now})
+    # Seconds between the post and now (negative). SQLite has no epoch extraction,
+    # julianday() counts days since 4714 BC and 1970-01-01 is day 2440587.5
+    age = RawSQL('(julianday(date_posted) - 2440587.5) * 86400 - %s', [now], output_field=FloatField())
+    weight = POST_WEIGHT + F('like_count') * LIKE_WEIGHT + F('comment_count') * COMMENT_WEIGHT
+    Post.objects.update(
+        hot_score=weight * Power(Value(2.0), age / Value(HALF_LIFE.total_seconds()), output_field=FloatField()),
+    )
+    Post.objects.filter(hot_score__gt=0, hot_score__lt=MIN_SCORE).update(hot_score=0.0)
+    return Post.objects.filter(hot_score__gt=0).count()
@@ -22,7 +22,15 @@ urlpatterns = [
     path('remove-profile-picture/', views.remove_profile_picture, name='remove_profile_picture'),
     path('aboutus/', views.aboutus, name='aboutus'),
     path('like-post/<slug:slug>/', views.like_post, name='like_post'),
+    path('post/<slug:slug>/comments/', views.post_comments, name='post_comments'),
+    path('post/<slug:slug>/comments/add/', views.add_comment, name='add_comment'),
     path('join_club/', views.join_club, name='join_club'),
     path('club/<int:club_id>/', views.club_page, name='club_page'),
     path('follow-club/<int:club_id>/', views.follow_club, name='follow_club'),
+    path('interactions/', views.batch_interactions, name='batch_interactions'),
+    path('load-more-posts/', views.load_more_posts, name='load_more_posts'),
+    path('api/feed/', views.feed_api, name='feed_api'),
+    path('search/', views.search_posts, name='search_posts'),
+    path('stats/post-cards/', views.post_card_stats, name='post_card_stats'),
+    path('stats/requests/', views.request_stats, name='request_stats'),
 ]
\ No newline at end of file
@@ -1,12 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout
 from .models import Post, Club, Profile, Like, Comment 
 from .forms import PostForm, ProfilePictureForm
-from django.utils.text import slugify # <--- NEW IMPORT
 from django.contrib.auth.forms import UserCreationForm
 from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from django.template.loader import render_to_string
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+from .feeds import comment_page, feed_page, post_json
+from .slugs import save_with_unique_slug
+from .club_directory import directory_version, get_user_club_ids
+from .http_cache import cached_view
+from .interactions import apply_batch, BatchError
+from . import club_search, db_routing, feed_versions, fragments, like_buffer, perf, post_search
 import os
 
 # Create your views here.
@@ -19,44 +32,29 @@ def home(request):
             new_post = form.save(commit=False)
             new_post.user = request.user
             
-            # Slug generation logic
+            # Slug generation logic (one INSERT, retried with a suffix only on collision)
             content = form.cleaned_data.get('content')
-            base_slug = slugify(content[:50])
-            slug = base_slug
-            counter = 1
-            while Post.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            new_post.slug = slug
-            
-            new_post.save()
+            save_with_unique_slug(new_post, content)
             return redirect('home') 
     else:
         form = PostForm()
 
     # --- FETCH DATA FOR THE FEED ---
     # Check for feed type parameter
-    feed_type = request.GET.get('feed', 'all')  # 'all', 'following'
+    feed_type = request.GET.get('feed', 'all')  # 'all', 'following', 'trending'
     
-    if feed_type == 'following':
-        # Show only posts from clubs the user follows
-        profile_obj, _ = Profile.objects.get_or_create(user=request.user)
-        followed_clubs = profile_obj.clubs.all()
-        posts = Post.objects.filter(club__in=followed_clubs).exclude(slug__isnull=True).exclude(slug__exact='').order_by('-date_posted')
-    else:
-        # Default: Show all posts
-        posts = Post.objects.exclude(slug__isnull=True).exclude(slug__exact='').order_by('-date_posted')
+    # Only the first page is rendered here, the rest comes from load_more_posts
+    posts, next_cursor = feed_page(request.user, feed_type)
     
-    # joined club ids for the logged-in user
-    joined_club_ids = []
-    if request.user.is_authenticated and hasattr(request.user, 'profile'):
-        joined_club_ids = list(request.user.profile.clubs.values_list('id', flat=True))
+    # joined club ids for the logged-in user (cached, see club_directory.py)
+    joined_club_ids = list(get_user_club_ids(request.user.id))
 
     # --- RENDER TEMPLATE ---
     context = {
         'posts': posts,  # Pass the list of posts to the template
         'form': form,  # Pass the post creation form to the template
         'feed_type': feed_type,  # Pass the feed type to the template
+        'next_cursor': next_cursor,  # Cursor for the "load more" button (None on the last page)
         'current_club_id': None,  # Not on a club page, so no club ID
         'joined_club_ids': joined_club_ids,  # Pass the list to the template
     }
@@ -121,7 +119,7 @@ def update_profile_picture(request):
             
             return JsonResponse({
                 'success': True,
-                'profile_picture_url': profile_obj.profile_picture.url
+                'profile_picture_url': profile_obj.get_profile_picture_url()
             })
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
@@ -154,18 +152,31 @@ def logout_view(request):
     logout(request)
     return redirect('login')
 
+# --- PAGE CACHE (see http_cache.py) ---
+# What each cached page shows, as versions read from the cache
+
+def _search_versions(request):
+    # Only the club names
+    return [directory_version()]
+
+def _aboutus_versions(request):
+    # Static, apart from the logged-in navbar
+    if not request.user.is_authenticated:
+        return []
+    return sorted(feed_versions.stamps([feed_versions.user_scope(request.user.id)]).items())
+
+def _club_page_versions(request, club_id):
+    # The club, its posts (likes and comments included), the viewer's clubs (bars, buttons) and profile (navbar)
+    current = feed_versions.stamps([feed_versions.club_scope(club_id), feed_versions.user_scope(request.user.id)])
+    return [directory_version(), sorted(get_user_club_ids(request.user.id))] + sorted(current.items())
+
+@cached_view(60 * 5, versions=_search_versions, no_cache=True)
 def search_clubs(request):
     """AJAX endpoint for searching clubs"""
     query = request.GET.get('q', '').strip().lower()
     
-    if query:
-        # Filter clubs that match the search query
-        clubs = Club.objects.filter(name__icontains=query)[:10]
-    else:
-        # Return all clubs if no query
-        clubs = Club.objects.all()[:10]
-    
-    club_list = [{'id': club.id, 'name': club.name} for club in clubs]
+    # Ranked prefix / trigram search from the in-memory index (first 10 clubs by name if no query)
+    club_list = club_search.search(query, limit=10)
     return JsonResponse({'clubs': club_list})
 
 @login_required
@@ -205,6 +216,8 @@ def create_club(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@cached_view(60 * 10, versions=_aboutus_versions, per_user=True, max_age=60 * 5)
+@gzip_page
 def aboutus(request):
     """About Us page with all Bloom information"""
     return render(request, 'aboutus.html')
@@ -220,6 +233,13 @@ def like_post(request, slug):
         
     post = get_object_or_404(Post, slug=slug)
     user = request.user
+
+    if like_buffer.enabled():
+        # Write-behind: log the intent, answer now, the buffer writes it to the database shortly
+        liked, like_count = like_buffer.get_buffer().toggle(post.id, user.id, post.like_count)
+        # Cached pages / feed ETags move now rather than when the buffer flushes
+        feed_versions.touch([post.club_id])
+        return JsonResponse({'liked': liked, 'like_count': like_count})
     
     # Check if the user has already liked the post
     existing_like = post.likes.filter(user=user).first()
@@ -234,6 +254,9 @@ def like_post(request, slug):
         post.likes.create(user=user)
         liked = True
     
+    # The counter was bumped by the Like signals, just re-read the column
+    post.refresh_from_db(fields=['like_count'])
+    
     # Return the updated state
     return JsonResponse({
         'liked': liked,
@@ -253,6 +276,7 @@ def add_comment(request, slug):
                 user=request.user,
                 content=content
             )
+            post.refresh_from_db(fields=['comment_count'])
             
             return JsonResponse({
                 'success': True,
@@ -261,11 +285,29 @@ def add_comment(request, slug):
                     'content': comment.content,
                     'date_commented': comment.date_commented.strftime('%Y-%m-%d %H:%M')
                 },
+                'html': render_to_string('partials/comment.html', {'comment': comment}),
                 'comment_count': post.get_comment_count()
             })
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@login_required
+def post_comments(request, slug):
+    """AJAX endpoint that returns a page of a post's comments (newest first) as rendered HTML"""
+    post = get_object_or_404(Post.objects.only('id'), slug=slug)
+
+    try:
+        comments, next_cursor = comment_page(post.id, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    html = render_to_string('partials/comment_list.html', {'comments': comments})
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 def join_club(request):
     """AJAX endpoint to join or leave a club"""
@@ -290,6 +332,8 @@ def join_club(request):
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 @login_required
+@cached_view(60, versions=_club_page_versions, per_user=True, no_cache=True)
+@gzip_page
 def club_page(request, club_id):
     """View for a specific club's page showing only posts for that club"""
     club = get_object_or_404(Club, id=club_id)
@@ -307,36 +351,23 @@ def club_page(request, club_id):
             # Associate the post with this club
             new_post.club = club
             
-            # ⭐ SLUG GENERATION LOGIC ADDED HERE ⭐
-            
-            # 1. Determine the source text for the slug (use content, as title is optional)
+            # ⭐ SLUG GENERATION LOGIC ⭐
+            # Use the content for the slug (title is optional); the allocator saves the post
             content = form.cleaned_data.get('content')
-            # Use only the first 50 chars of content for a clean slug
-            base_slug = slugify(content[:50])
-            
-            # 2. Check for uniqueness and append a counter if needed
-            slug = base_slug
-            counter = 1
-            while Post.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            
-            new_post.slug = slug
-            # ⭐ END SLUG GENERATION LOGIC ⭐
-
-            new_post.save()
+            save_with_unique_slug(new_post, content)
             # Redirect to the club page to prevent form resubmission
             return redirect('club_page', club_id=club_id) 
     else:
         # HANDLE GET REQUEST (Display the page)
         form = PostForm()
     
-    # Get posts for this specific club
-    posts = Post.objects.filter(club=club).exclude(slug__isnull=True).exclude(slug__exact='').order_by('-date_posted')
+    # Get the first page of posts for this specific club
+    posts, next_cursor = feed_page(request.user, club=club)
     
     context = {
         'club': club,
         'posts': posts,
+        'next_cursor': next_cursor,
         'form': form,   # Pass the post creation form to the template
         'current_club_id': club.id,  # Pass club ID so posts can hide group name on club's own page
     }
@@ -365,3 +396,155 @@ def follow_club(request, club_id):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@login_required
+def batch_interactions(request):
+    """
+    AJAX endpoint applying many like/unlike/join/leave operations at once.
+    Body: {"ops": [{"op": "like", "post": "<slug>"}, {"op": "join", "club": 3}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+
+    import json
+    try:
+        ops = json.loads(request.body).get('ops')
+        result = apply_batch(request.user, ops)
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
+    except BatchError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({'success': True, **result})
+
+@login_required
+def load_more_posts(request):
+    """AJAX endpoint that returns the next page of a feed as rendered post cards"""
+    feed_type = request.GET.get('feed', 'all')
+    club_id = request.GET.get('club')
+    cursor = request.GET.get('cursor')
+
+    club = None
+    if club_id:
+        club = get_object_or_404(Club, id=club_id)
+
+    try:
+        posts, next_cursor = feed_page(request.user, feed_type, club=club, cursor=cursor)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    # With the request, so the cards show likes still in the write-behind buffer (see post_cards)
+    html = render_to_string('partials/post_list.html', {
+        'posts': posts,
+        'current_club_id': club.id if club else None,
+    }, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'next_cursor': next_cursor,
+    })
+
+FEED_TYPES = ('all', 'following', 'trending')
+
+def _feed_api_params(request):
+    """(feed type, club id, cursor) of a feed_api request. Raises ValueError if they're garbage"""
+    feed_type = request.GET.get('feed', 'all')
+    if feed_type not in FEED_TYPES:
+        raise ValueError(feed_type)
+    club_id = request.GET.get('club')
+    return feed_type, int(club_id) if club_id else None, request.GET.get('cursor') or None
+
+def _feed_state(request):
+    """(etag, last modified) of the feed asked for, from the cache only (worked out once per request)"""
+    if not hasattr(request, '_feed_state'):
+        try:
+            feed_type, club_id, cursor = _feed_api_params(request)
+        except ValueError:
+            request._feed_state = (None, None)
+        else:
+            request._feed_state = feed_versions.feed_state(request.user, feed_type, club_id, cursor)
+    return request._feed_state
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lambda request: _feed_state(request)[0],
+           last_modified_func=lambda request: _feed_state(request)[1])
+def feed_api(request):
+    """
+    JSON feed: ?feed=all|following|trending, or ?club=<id>, and ?cursor= for the next pages.
+    Polling with If-None-Match / If-Modified-Since gets a 304 without touching the feed (see feed_versions.py).
+    """
+    try:
+        feed_type, club_id, cursor = _feed_api_params(request)
+        # From the primary: a lagging replica would send stale posts under the current ETag,
+        # and clients would keep getting 304 for them until the feed changed again
+        with db_routing.replica_reads(False):
+            club = get_object_or_404(Club, id=club_id) if club_id else None
+            posts, next_cursor = feed_page(request.user, feed_type, club=club, cursor=cursor)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid feed, club or cursor'}, status=400)
+
+    if like_buffer.enabled():
+        # Likes still in the write-behind buffer aren't in liked_by_me yet
+        overrides = like_buffer.get_buffer().liked_overrides(request.user.id, [post.id for post in posts])
+        for post in posts:
+            if post.id in overrides:
+                post.liked_by_me = overrides[post.id]
+
+    return JsonResponse(
+        {'success': True, 'posts': [post_json(post) for post in posts], 'next_cursor': next_cursor},
+        json_dumps_params={'separators': (',', ':')},
+    )
+
+def _parse_day(value):
+    """'YYYY-MM-DD' from a query string -> date, or None if missing / invalid"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+@login_required
+def search_posts(request):
+    """Full-text post search page (BM25-ranked), filterable by club and date range"""
+    query = request.GET.get('q', '').strip()
+    club_id = request.GET.get('club', '')
+    club_id = int(club_id) if club_id.isdigit() else None
+    date_from = _parse_day(request.GET.get('from'))
+    date_to = _parse_day(request.GET.get('to'))
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    # Dates are whole days: from the start of `from` up to the end of `to`
+    start = timezone.make_aware(datetime.combine(date_from, time.min)) if date_from else None
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)) if date_to else None
+
+    posts, has_next = [], False
+    if query:
+        posts, has_next = post_search.search_posts(query, request.user, club_id, start, end, page)
+
+    context = {
+        'posts': posts,
+        'query': query,
+        'selected_club_id': club_id,
+        'date_from': date_from.isoformat() if date_from else '',
+        'date_to': date_to.isoformat() if date_to else '',
+        'page': page,
+        'has_next': has_next,
+        'current_club_id': None,
+    }
+    return render(request, 'search.html', context)
+
+@staff_member_required
+def post_card_stats(request):
+    """Hit / miss counters of the post card fragment cache (POST resets them)"""
+    if request.method == 'POST':
+        fragments.reset_stats()
+    return JsonResponse(fragments.stats())
+
+@staff_member_required
+def request_stats(request):
+    """Per-view request timings / query counts since the process started (POST resets them)"""
+    if request.method == 'POST':
+        perf.reset_view_stats()
+    return JsonResponse(perf.view_stats())
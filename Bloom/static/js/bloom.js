@@ -0,0 +1,546 @@
+// Bloom's page scripts: navbar (club search, profile picture, create a club), left bar
+// (join / leave), post cards (likes, comments), load more and live updates.
+//
+// Loaded once per page by partials/scripts.html. Every part looks for its markup and does
+// nothing on pages without it; URLs come from data-* attributes, the page-wide ones from
+// the script tag itself.
+(function() {
+    const page = document.currentScript.dataset;
+
+    function getCookie(name) {
+        const match = document.cookie.split(';').map(c => c.trim()).find(c => c.startsWith(name + '='));
+        return match ? decodeURIComponent(match.substring(name.length + 1)) : null;
+    }
+
+    function csrfToken() {
+        return getCookie('csrftoken') || document.querySelector('[name=csrfmiddlewaretoken]')?.value;
+    }
+
+    // --- NAVBAR: CLUB SEARCH ---
+    (function() {
+        const searchInput = document.getElementById('search');
+        if (!searchInput) return;
+        const searchUrl = searchInput.dataset.url;
+        const searchDropdown = document.getElementById('searchDropdown');
+        const recentSearchesList = document.getElementById('recentSearchesList');
+        const searchResultsList = document.getElementById('searchResultsList');
+        const noResults = document.getElementById('noResults');
+        const recentSearchesSection = document.getElementById('recentSearches');
+        let searchTimeout;
+
+        function searchClubs(query) {
+            return fetch(searchUrl + '?q=' + encodeURIComponent(query)).then(response => response.json());
+        }
+
+        // Get recent searches from localStorage
+        function getRecentSearches() {
+            const recent = localStorage.getItem('clubRecentSearches');
+            return recent ? JSON.parse(recent) : [];
+        }
+
+        // Save recent searches to localStorage
+        function saveRecentSearches(searches) {
+            localStorage.setItem('clubRecentSearches', JSON.stringify(searches));
+        }
+
+        // Add a club to the front of recent searches (keep the last 5)
+        function addToRecentSearches(clubName) {
+            const recent = getRecentSearches().filter(c => c !== clubName);
+            recent.unshift(clubName);
+            saveRecentSearches(recent.slice(0, 5));
+            renderRecentSearches();
+        }
+
+        // Remove a club from recent searches
+        function removeRecentSearch(clubName) {
+            saveRecentSearches(getRecentSearches().filter(c => c !== clubName));
+            renderRecentSearches();
+        }
+
+        // Render recent searches
+        function renderRecentSearches() {
+            const recent = getRecentSearches();
+            recentSearchesList.innerHTML = '';
+
+            if (recent.length === 0) {
+                recentSearchesSection.style.display = 'none';
+                return;
+            }
+
+            recentSearchesSection.style.display = 'block';
+            recent.forEach(clubName => {
+                const item = document.createElement('div');
+                item.className = 'flex items-center justify-between p-2 hover:bg-gray-50 rounded cursor-pointer group';
+
+                const span = document.createElement('span');
+                span.className = 'text-sm text-gray-700 flex-1';
+                span.textContent = clubName; // Use textContent to prevent XSS
+                span.addEventListener('click', function() {
+                    // For recent searches, we need to fetch the club ID
+                    searchClubs(clubName)
+                        .then(data => selectClub(clubName, data.clubs.length > 0 ? data.clubs[0].id : null))
+                        .catch(() => selectClub(clubName, null));
+                });
+
+                const removeBtn = document.createElement('button');
+                removeBtn.className = 'opacity-0 group-hover:opacity-100 transition-opacity p-1 hover:bg-gray-200 rounded';
+                removeBtn.innerHTML = `
+                    <svg class="w-4 h-4 text-gray-500" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M6 18L18 6M6 6l12 12"></path>
+                    </svg>
+                `;
+                removeBtn.addEventListener('click', function(event) {
+                    event.stopPropagation();
+                    removeRecentSearch(clubName);
+                });
+
+                item.appendChild(span);
+                item.appendChild(removeBtn);
+                recentSearchesList.appendChild(item);
+            });
+        }
+
+        // Render search results
+        function renderSearchResults(query) {
+            searchClubs(query)
+                .then(data => {
+                    searchResultsList.innerHTML = '';
+
+                    if (data.clubs.length === 0) {
+                        noResults.classList.remove('hidden');
+                        searchResultsList.classList.add('hidden');
+                        return;
+                    }
+                    noResults.classList.add('hidden');
+                    searchResultsList.classList.remove('hidden');
+                    data.clubs.forEach(club => {
+                        const item = document.createElement('div');
+                        item.className = 'p-2 hover:bg-gray-50 rounded cursor-pointer';
+
+                        const span = document.createElement('span');
+                        span.className = 'text-sm text-gray-700';
+                        span.textContent = club.name; // Use textContent to prevent XSS
+                        span.addEventListener('click', function() {
+                            selectClub(club.name, club.id);
+                        });
+
+                        item.appendChild(span);
+                        searchResultsList.appendChild(item);
+                    });
+                })
+                .catch(error => console.error('Error fetching clubs:', error));
+        }
+
+        // Search results while typing, recent searches when the box is empty
+        function handleSearch() {
+            const query = searchInput.value.trim();
+
+            if (query) {
+                recentSearchesSection.style.display = 'none';
+                renderSearchResults(query);
+            } else {
+                recentSearchesSection.style.display = 'block';
+                searchResultsList.innerHTML = '';
+                noResults.classList.add('hidden');
+                renderRecentSearches();
+            }
+        }
+
+        // Select a club (and go to its page if we know its ID)
+        function selectClub(clubName, clubId) {
+            searchInput.value = clubName;
+            addToRecentSearches(clubName);
+            searchDropdown.classList.add('hidden');
+            if (clubId) {
+                window.location.href = '/club/' + clubId + '/';
+            }
+        }
+
+        searchInput.addEventListener('focus', function() {
+            searchDropdown.classList.remove('hidden');
+            handleSearch();
+        });
+
+        // Hide dropdown when clicking outside
+        document.addEventListener('click', function(event) {
+            const isClickInside = searchInput.contains(event.target) || searchDropdown.contains(event.target);
+            if (!isClickInside) {
+                searchDropdown.classList.add('hidden');
+            }
+        });
+
+        // Handle search input with debounce
+        searchInput.addEventListener('input', function() {
+            clearTimeout(searchTimeout);
+            searchTimeout = setTimeout(handleSearch, 150);
+        });
+
+        renderRecentSearches();
+    })();
+
+    // --- NAVBAR: PROFILE PICTURE ---
+    (function() {
+        const profilePicBtn = document.getElementById('profilePicBtn');
+        const profileDropdown = document.getElementById('profileDropdown');
+        const profilePicUpload = document.getElementById('profile-picture-upload');
+        const removeProfilePictureBtn = document.getElementById('remove-profile-picture');
+        if (!profilePicBtn || !profileDropdown) return;
+
+        // Toggle dropdown on profile picture click
+        profilePicBtn.addEventListener('click', function(event) {
+            event.stopPropagation();
+            profileDropdown.classList.toggle('hidden');
+        });
+
+        // Hide dropdown when clicking outside
+        document.addEventListener('click', function(event) {
+            const isClickInside = profilePicBtn.contains(event.target) || profileDropdown.contains(event.target);
+            if (!isClickInside) {
+                profileDropdown.classList.add('hidden');
+            }
+        });
+
+        if (profilePicUpload) {
+            profilePicUpload.addEventListener('change', function(event) {
+                const file = event.target.files[0];
+                if (!file) return;
+
+                const formData = new FormData();
+                formData.append('profile_picture', file);
+                fetch(profilePicUpload.dataset.url, {
+                    method: 'POST',
+                    body: formData,
+                    headers: {'X-CSRFToken': csrfToken()}
+                })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        // Reload page to update profile picture everywhere
+                        window.location.reload();
+                    }
+                })
+                .catch(error => {
+                    console.error('Error uploading profile picture:', error);
+                    alert('Error uploading profile picture. Please try again.');
+                });
+            });
+        }
+
+        if (removeProfilePictureBtn) {
+            removeProfilePictureBtn.addEventListener('click', function(event) {
+                event.preventDefault();
+
+                fetch(removeProfilePictureBtn.dataset.url, {
+                    method: 'POST',
+                    headers: {'X-CSRFToken': csrfToken(), 'Content-Type': 'application/json'}
+                })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        window.location.reload();
+                    } else {
+                        alert('Error removing profile picture. Please try again.');
+                    }
+                })
+                .catch(error => {
+                    console.error('Error removing profile picture:', error);
+                    alert('Error removing profile picture. Please try again.');
+                });
+            });
+        }
+    })();
+
+    // --- NAVBAR: CREATE A CLUB ---
+    (function() {
+        const createClubBtn = document.getElementById('createClubBtn');
+        const createClubModal = document.getElementById('createClubModal');
+        if (!createClubBtn || !createClubModal) return;
+        const createClubForm = document.getElementById('createClubForm');
+        const clubNameInput = document.getElementById('clubName');
+        const clubNameError = document.getElementById('clubNameError');
+
+        function showError(message) {
+            clubNameError.textContent = message;
+            clubNameError.classList.remove('hidden');
+        }
+
+        function closeModal() {
+            createClubModal.classList.add('hidden');
+            createClubForm.reset();
+            clubNameError.classList.add('hidden');
+            clubNameError.textContent = '';
+        }
+
+        createClubBtn.addEventListener('click', function() {
+            createClubModal.classList.remove('hidden');
+            clubNameInput.focus();
+        });
+        document.getElementById('closeClubModal').addEventListener('click', closeModal);
+        document.getElementById('cancelClubBtn').addEventListener('click', closeModal);
+
+        // Close modal when clicking outside
+        createClubModal.addEventListener('click', function(event) {
+            if (event.target === createClubModal) {
+                closeModal();
+            }
+        });
+
+        createClubForm.addEventListener('submit', function(event) {
+            event.preventDefault();
+
+            const clubName = clubNameInput.value.trim();
+            if (!clubName) {
+                showError('Club name is required');
+                return;
+            }
+
+            fetch(createClubForm.dataset.url, {
+                method: 'POST',
+                headers: {'X-CSRFToken': csrfToken(), 'Content-Type': 'application/json'},
+                body: JSON.stringify({'name': clubName})
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    closeModal();
+                    // Reload page to show new club in left bar
+                    window.location.reload();
+                } else {
+                    showError(data.error || 'An error occurred');
+                }
+            })
+            .catch(error => {
+                console.error('Error creating club:', error);
+                showError('An error occurred. Please try again.');
+            });
+        });
+    })();
+
+    // --- LEFT BAR: JOIN / LEAVE ---
+    document.addEventListener('click', function(event) {
+        const button = event.target.closest('.join-leave-btn');
+        if (!button) return;
+
+        const formData = new FormData();
+        formData.append('club_id', button.dataset.clubId);
+        fetch(button.closest('[data-join-url]').dataset.joinUrl, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken()},
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                window.location.reload();
+            } else {
+                alert('Error: ' + (data.error || 'Unknown error occurred'));
+            }
+        })
+        .catch(error => console.error('Fetch Error:', error));
+    });
+
+    // --- LIKES: clicks are queued and sent together to the batch endpoint ---
+    (function() {
+        const batchUrl = page.batchUrl;
+        if (!batchUrl) return;
+        const pending = new Map();  // post slug -> 'like' / 'unlike' (last click wins)
+        let timer = null;
+
+        function showLike(slug, liked, count) {
+            const button = document.getElementById('like-' + slug);
+            if (!button) return;
+            button.dataset.liked = liked ? 'true' : 'false';
+            button.classList.toggle('text-blue-600', liked);
+            if (count !== undefined) {
+                document.getElementById('count-' + slug).textContent = count;
+            }
+        }
+
+        function flush() {
+            timer = null;
+            if (!pending.size || !navigator.onLine) return;  // offline: keep the queue until we're back
+
+            const ops = Array.from(pending, ([slug, op]) => ({op: op, post: slug}));
+            pending.clear();
+            fetch(batchUrl, {
+                method: 'POST',
+                headers: {'X-CSRFToken': csrfToken(), 'Content-Type': 'application/json'},
+                body: JSON.stringify({ops: ops})
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) return;
+                for (const [slug, state] of Object.entries(data.posts)) {
+                    // A newer click may already be queued for this post, don't flicker back
+                    if (!pending.has(slug)) showLike(slug, state.liked, state.like_count);
+                }
+            })
+            .catch(error => {
+                console.error('Error sending interactions:', error);
+                // Put the ops back (unless clicked again since) and retry later
+                ops.forEach(o => { if (!pending.has(o.post)) pending.set(o.post, o.op); });
+                schedule(2000);
+            });
+        }
+
+        function schedule(delay) {
+            if (!timer) timer = setTimeout(flush, delay);
+        }
+
+        document.addEventListener('click', function(event) {
+            const button = event.target.closest('button[data-slug][data-liked]');
+            if (!button) return;
+
+            // Optimistic update, the batch response has the real counts
+            const liked = button.dataset.liked !== 'true';
+            const countEl = document.getElementById('count-' + button.dataset.slug);
+            showLike(button.dataset.slug, liked, Math.max(0, parseInt(countEl.textContent, 10) + (liked ? 1 : -1)));
+            pending.set(button.dataset.slug, liked ? 'like' : 'unlike');
+            schedule(400);
+        });
+
+        window.addEventListener('online', () => schedule(0));
+        // Don't lose clicks made right before leaving the page
+        window.addEventListener('pagehide', function() {
+            if (!pending.size) return;
+            const ops = Array.from(pending, ([slug, op]) => ({op: op, post: slug}));
+            fetch(batchUrl, {
+                method: 'POST',
+                keepalive: true,
+                headers: {'X-CSRFToken': csrfToken(), 'Content-Type': 'application/json'},
+                body: JSON.stringify({ops: ops})
+            });
+        });
+    })();
+
+    // --- COMMENTS: a post's thread is fetched a page at a time, and only once it's opened ---
+    (function() {
+        function loadPage(thread) {
+            const more = thread.querySelector('.comment-more');
+            const params = thread.dataset.cursor ? '?' + new URLSearchParams({cursor: thread.dataset.cursor}) : '';
+            more.disabled = true;
+            return fetch(thread.dataset.url + params)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) return;
+                    thread.querySelector('.comment-list').insertAdjacentHTML('beforeend', data.html);
+                    thread.dataset.cursor = data.next_cursor || '';
+                    more.hidden = !data.next_cursor;
+                })
+                .catch(error => console.error('Error loading comments:', error))
+                .finally(() => { more.disabled = false; });
+        }
+
+        document.addEventListener('click', function(event) {
+            const toggle = event.target.closest('button[data-thread]');
+            if (toggle) {
+                const thread = document.getElementById(toggle.dataset.thread);
+                thread.hidden = !thread.hidden;
+                if (!thread.hidden && !thread.dataset.loaded) {
+                    thread.dataset.loaded = 'true';
+                    loadPage(thread);
+                }
+                return;
+            }
+            const more = event.target.closest('.comment-more');
+            if (more) loadPage(more.closest('[data-add-url]'));
+        });
+
+        document.addEventListener('submit', function(event) {
+            const form = event.target.closest('.comment-form');
+            if (!form) return;
+            event.preventDefault();
+
+            const thread = form.closest('[data-add-url]');
+            const button = form.querySelector('button');
+            button.disabled = true;
+            fetch(thread.dataset.addUrl, {
+                method: 'POST',
+                headers: {'X-CSRFToken': csrfToken()},
+                body: new FormData(form)
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) return;
+                // Newest first, like the pages
+                thread.querySelector('.comment-list').insertAdjacentHTML('afterbegin', data.html);
+                const count = document.getElementById('comments-' + thread.id.substring('thread-'.length));
+                if (count) count.textContent = ' ' + data.comment_count;
+                form.reset();
+            })
+            .catch(error => console.error('Error adding comment:', error))
+            .finally(() => { button.disabled = false; });
+        });
+    })();
+
+    // --- LOAD MORE: fetches the next page of post cards using the cursor from the last page ---
+    (function() {
+        const loadMoreBtn = document.getElementById('loadMoreBtn');
+        const postList = document.getElementById('post-list');
+        if (!loadMoreBtn) return;
+
+        loadMoreBtn.addEventListener('click', function() {
+            const params = new URLSearchParams({
+                feed: loadMoreBtn.dataset.feed,
+                cursor: loadMoreBtn.dataset.cursor
+            });
+            if (loadMoreBtn.dataset.club) {
+                params.append('club', loadMoreBtn.dataset.club);
+            }
+
+            loadMoreBtn.disabled = true;
+            fetch(loadMoreBtn.dataset.url + '?' + params.toString())
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) return;
+                    postList.insertAdjacentHTML('beforeend', data.html);
+                    if (data.next_cursor) {
+                        loadMoreBtn.dataset.cursor = data.next_cursor;
+                        loadMoreBtn.disabled = false;
+                    } else {
+                        // Last page, nothing left to load
+                        loadMoreBtn.remove();
+                    }
+                })
+                .catch(error => {
+                    console.error('Error loading more posts:', error);
+                    loadMoreBtn.disabled = false;
+                });
+        });
+    })();
+
+    // --- LIVE UPDATES: server-sent events for new posts and like / comment counts (only under Bloom/asgi.py) ---
+    (function() {
+        if (!page.liveUrl) return;
+        const params = new URLSearchParams();
+        if (page.club) params.append('club', page.club);
+        const source = new EventSource(page.liveUrl + '?' + params.toString());
+        const postList = document.getElementById('post-list');
+        let newPosts = 0;
+
+        source.addEventListener('counts', function(event) {
+            const data = JSON.parse(event.data);
+            const likes = document.getElementById('count-' + data.post);
+            if (likes) likes.textContent = data.like_count;
+            const comments = document.getElementById('comments-' + data.post);
+            if (comments) comments.textContent = ' ' + data.comment_count;
+        });
+
+        source.addEventListener('post', function(event) {
+            const data = JSON.parse(event.data);
+            if (!postList || document.getElementById('like-' + data.post)) return;  // already on the page
+
+            // Don't shove posts in under the reader, offer to show them instead
+            newPosts += 1;
+            let banner = document.getElementById('new-posts-banner');
+            if (!banner) {
+                banner = document.createElement('button');
+                banner.id = 'new-posts-banner';
+                banner.className = 'w-full mb-4 px-4 py-2 bg-blue-500 hover:bg-blue-700 text-white text-sm font-medium rounded-full transition-colors';
+                banner.addEventListener('click', () => window.location.reload());
+                postList.prepend(banner);
+            }
+            banner.textContent = newPosts === 1 ? 'Show 1 new post' : 'Show ' + newPosts + ' new posts';
+        });
+    })();
+})();